@@ -20,8 +20,9 @@ from app import models  # noqa - ensure all models are imported
 # access to the values within the .ini file in use.
 config = context.config
 
-# Override sqlalchemy.url with our DATABASE_URL from settings
-config.set_main_option("sqlalchemy.url", settings.database_url)
+# Override sqlalchemy.url with our DATABASE_URL from settings (or the shard
+# app.startup.migrate() is upgrading)
+config.set_main_option("sqlalchemy.url", config.attributes.get("database_url", settings.database_url))
 
 # Interpret the config file for Python logging.
 # This line sets up loggers basically.
@@ -0,0 +1,58 @@
+"""unaccent plant search indexes
+
+Revision ID: 3f8a6d2c9e71
+Revises: e4a9c7b2d105
+Create Date: 2026-10-21 10:18:06.552391
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '3f8a6d2c9e71'
+down_revision: Union[str, Sequence[str], None] = 'e4a9c7b2d105'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+COLUMNS = ('name', 'species', 'notes')
+
+# unaccent() is only STABLE, so an IMMUTABLE wrapper is what can be indexed
+SEARCH_UNACCENT_FUNCTION = """
+CREATE OR REPLACE FUNCTION search_unaccent(text) RETURNS text
+LANGUAGE sql IMMUTABLE PARALLEL SAFE STRICT
+AS $$ SELECT public.unaccent('public.unaccent'::regdictionary, $1) $$
+"""
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    if op.get_bind().dialect.name != 'postgresql':
+        return
+    op.execute('CREATE EXTENSION IF NOT EXISTS unaccent')
+    op.execute(SEARCH_UNACCENT_FUNCTION)
+
+    # Rebuilt without locking plants against writes; searches fall back to a scan in between
+    with op.get_context().autocommit_block():
+        for column in COLUMNS:
+            op.execute(f'DROP INDEX CONCURRENTLY IF EXISTS idx_plants_{column}_trgm')
+            op.execute(
+                f'CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_plants_{column}_trgm'
+                f' ON plants USING gin (search_unaccent({column}) gin_trgm_ops)'
+            )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    if op.get_bind().dialect.name != 'postgresql':
+        return
+    with op.get_context().autocommit_block():
+        for column in COLUMNS:
+            op.execute(f'DROP INDEX CONCURRENTLY IF EXISTS idx_plants_{column}_trgm')
+            op.execute(
+                f'CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_plants_{column}_trgm'
+                f' ON plants USING gin ({column} gin_trgm_ops)'
+            )
+    op.execute('DROP FUNCTION IF EXISTS search_unaccent(text)')
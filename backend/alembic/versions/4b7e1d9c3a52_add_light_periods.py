@@ -0,0 +1,212 @@
+"""add light periods
+
+Revision ID: 4b7e1d9c3a52
+Revises: 9d4e6a2b7f13
+Create Date: 2026-10-19 22:41:37.204118
+
+"""
+import re
+from datetime import datetime, time, timedelta, timezone
+from typing import Sequence, Union
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
+
+from alembic import context, op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '4b7e1d9c3a52'
+down_revision: Union[str, Sequence[str], None] = '9d4e6a2b7f13'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('light_periods',
+    sa.Column('indoor_id', sa.UUID(), nullable=False),
+    sa.Column('starts_at', sa.DateTime(timezone=True), nullable=False),
+    sa.Column('schedule', sa.Text(), nullable=True),
+    sa.Column('on_minutes', sa.Integer(), nullable=True),
+    sa.Column('off_minutes', sa.Integer(), nullable=True),
+    sa.Column('cycle_start', sa.DateTime(timezone=True), nullable=True),
+    sa.Column('power_pct', sa.Integer(), nullable=True),
+    sa.Column('light_hours', sa.Numeric(precision=14, scale=4), nullable=False),
+    sa.Column('light_dli', sa.Numeric(precision=14, scale=4), nullable=False),
+    sa.ForeignKeyConstraint(['indoor_id'], ['indoors.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('indoor_id', 'starts_at')
+    )
+
+    # One period per indoor (more with light power changes in history): skip with
+    # `alembic -x skip_backfill=true upgrade head` and run
+    # `python -m app.services.light_service backfill` afterwards
+    if context.get_x_argument(as_dictionary=True).get('skip_backfill') != 'true':
+        backfill(op.get_bind())
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_table('light_periods')
+
+
+# ---- Backfill: a frozen copy of app.services.light_service as of this revision ----
+
+HOURS_SCHEDULE = re.compile(
+    r"^\s*(\d{1,2}(?:[.,]\d+)?)\s*h?\s*[/-]\s*(\d{1,2}(?:[.,]\d+)?)\s*h?"
+    r"(?:\s*(?:desde|de|a|on|@)?\s*(?:las\s*)?(\d{1,2})(?::(\d{2}))?\s*(?:hs|h)?)?\s*$",
+    re.IGNORECASE,
+)
+TIMES_SCHEDULE = re.compile(r"^\s*(\d{1,2}):(\d{2})\s*(?:-|a|to)\s*(\d{1,2}):(\d{2})\s*$", re.IGNORECASE)
+
+users = sa.table('users', sa.column('id', sa.UUID()), sa.column('timezone', sa.Text()))
+indoors = sa.table(
+    'indoors',
+    sa.column('id', sa.UUID()),
+    sa.column('user_id', sa.UUID()),
+    sa.column('created_at', sa.DateTime(timezone=True)),
+    sa.column('light_schedule', sa.Text()),
+    sa.column('light_power_pct', sa.Integer()),
+)
+indoor_history = sa.table(
+    'indoor_history',
+    sa.column('indoor_id', sa.UUID()),
+    sa.column('event_ts', sa.DateTime(timezone=True)),
+    sa.column('message', sa.Text()),
+)
+light_periods = sa.table(
+    'light_periods',
+    sa.column('indoor_id', sa.UUID()),
+    sa.column('starts_at', sa.DateTime(timezone=True)),
+    sa.column('schedule', sa.Text()),
+    sa.column('on_minutes', sa.Integer()),
+    sa.column('off_minutes', sa.Integer()),
+    sa.column('cycle_start', sa.DateTime(timezone=True)),
+    sa.column('power_pct', sa.Integer()),
+    sa.column('light_hours', sa.Numeric(14, 4)),
+    sa.column('light_dli', sa.Numeric(14, 4)),
+)
+
+
+def _minutes(hours: str) -> int:
+    return round(float(hours.replace(",", ".")) * 60)
+
+
+def _parse(text: str | None) -> tuple[int, int, time] | None:
+    """(on minutes, off minutes, local time lights go on) of a schedule"""
+    if not text:
+        return None
+    match = TIMES_SCHEDULE.match(text)
+    if match:
+        on_h, on_m, off_h, off_m = (int(group) for group in match.groups())
+        if on_h > 24 or off_h > 24 or on_m > 59 or off_m > 59:
+            return None
+        on_at, off_at = (on_h % 24) * 60 + on_m, (off_h % 24) * 60 + off_m
+        on_minutes = (off_at - on_at) % 1440 or 1440
+        return on_minutes, 1440 - on_minutes, time(on_at // 60, on_at % 60)
+    match = HOURS_SCHEDULE.match(text)
+    if not match:
+        return None
+    on, off, hour, minute = match.groups()
+    on_minutes, off_minutes = _minutes(on), _minutes(off)
+    if on_minutes + off_minutes == 0 or on_minutes > 1440 * 2 or off_minutes > 1440 * 2:
+        return None
+    on_at = time(0, 0)
+    if hour is not None:
+        hour, minute = int(hour), int(minute or 0)
+        if hour > 24 or minute > 59:
+            return None
+        on_at = time(hour % 24, minute)
+    return on_minutes, off_minutes, on_at
+
+
+def _aware(ts: datetime) -> datetime:
+    return ts if ts.tzinfo is not None else ts.replace(tzinfo=timezone.utc)
+
+
+def _zone(name: str | None):
+    try:
+        return ZoneInfo(name) if name else None
+    except (ZoneInfoNotFoundError, ValueError):
+        return None
+
+
+def _cycle_start(parsed: tuple, at: datetime, tz: str | None) -> datetime:
+    on_minutes, off_minutes, on_at = parsed
+    local = _aware(at).astimezone(_zone(tz))
+    anchor = datetime.combine(local.date(), on_at, local.tzinfo)
+    if anchor > local:
+        cycle = timedelta(minutes=on_minutes + off_minutes)
+        anchor -= cycle * -(-(anchor - local) // cycle)
+    return anchor.astimezone(timezone.utc)
+
+
+def _lit_seconds(period: dict, at: datetime) -> float:
+    cycle = (period['on_minutes'] + period['off_minutes']) * 60
+    full, rest = divmod((at - period['cycle_start']).total_seconds(), cycle)
+    return full * period['on_minutes'] * 60 + min(rest, period['on_minutes'] * 60)
+
+
+def backfill(connection) -> int:
+    """
+    Open the first period of indoors that have none: from their creation,
+    with the current schedule and the power of each light power change
+    still in indoor_history. Returns the number of periods created.
+    """
+    rows = connection.execute(
+        sa.select(
+            indoors.c.id, indoors.c.created_at, indoors.c.light_schedule, indoors.c.light_power_pct,
+            users.c.timezone,
+        )
+        .select_from(indoors.join(users, users.c.id == indoors.c.user_id))
+        .where(~sa.select(light_periods.c.indoor_id).where(light_periods.c.indoor_id == indoors.c.id).exists())
+        .order_by(indoors.c.id)
+    ).all()
+
+    created = 0
+    for indoor in rows:
+        # History was written with the server's naive local time: astimezone() reads it so
+        changes = [
+            (row.event_ts.astimezone(timezone.utc), int(match.group(1)))
+            for row in connection.execute(
+                sa.select(indoor_history.c.event_ts, indoor_history.c.message)
+                .where(
+                    indoor_history.c.indoor_id == indoor.id,
+                    indoor_history.c.message.like("%potencia de la luz a %"),
+                )
+                .order_by(indoor_history.c.event_ts)
+            )
+            if (match := re.search(r"(\d+)%", row.message))
+        ]
+        if not indoor.light_schedule and not changes and indoor.light_power_pct is None:
+            continue
+
+        parsed = _parse(indoor.light_schedule)
+        last = None
+        # Before the first recorded change the power is unknown: counted as full power
+        for at, power in [(indoor.created_at, None if changes else indoor.light_power_pct), *changes]:
+            at = _aware(at)
+            if last is not None:
+                if last['power_pct'] == power:
+                    continue
+                at = max(at, last['starts_at'] + timedelta(microseconds=1))
+                light_hours, light_dli = last['light_hours'], last['light_dli']
+                if parsed:
+                    hours = (_lit_seconds(last, at) - _lit_seconds(last, last['starts_at'])) / 3600
+                    weight = (last['power_pct'] if last['power_pct'] is not None else 100) / 100
+                    light_hours, light_dli = light_hours + hours, light_dli + hours * weight
+            else:
+                light_hours = light_dli = 0.0
+            last = {
+                'indoor_id': indoor.id,
+                'starts_at': at,
+                'schedule': indoor.light_schedule,
+                'on_minutes': parsed[0] if parsed else None,
+                'off_minutes': parsed[1] if parsed else None,
+                'cycle_start': _cycle_start(parsed, at, indoor.timezone) if parsed else None,
+                'power_pct': power,
+                'light_hours': round(light_hours, 4),
+                'light_dli': round(light_dli, 4),
+            }
+            connection.execute(sa.insert(light_periods).values(last))
+            created += 1
+    return created
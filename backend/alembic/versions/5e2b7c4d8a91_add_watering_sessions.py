@@ -0,0 +1,77 @@
+"""add watering sessions
+
+Revision ID: 5e2b7c4d8a91
+Revises: a3c51f7e9b20
+Create Date: 2026-10-19 18:11:47.230118
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision: str = '5e2b7c4d8a91'
+down_revision: Union[str, Sequence[str], None] = 'a3c51f7e9b20'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('watering_sessions',
+    sa.Column('id', sa.UUID(), nullable=False),
+    sa.Column('user_id', sa.UUID(), nullable=False),
+    sa.Column('indoor_id', sa.UUID(), nullable=True),
+    sa.Column('event_ts', sa.DateTime(timezone=True), nullable=False),
+    sa.Column('total_liters', sa.Numeric(precision=8, scale=3), nullable=False),
+    sa.Column('note', sa.Text(), nullable=True),
+    sa.Column('ferts', postgresql.JSONB(astext_type=sa.Text()), nullable=True),
+    sa.ForeignKeyConstraint(['indoor_id'], ['indoors.id'], ondelete='SET NULL'),
+    sa.ForeignKeyConstraint(['user_id'], ['users.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index('idx_watering_sessions_user_ts', 'watering_sessions', ['user_id', sa.text('event_ts DESC')], unique=False)
+
+    # Batch blocks: plain ALTERs on Postgres, a table copy on SQLite (no ALTER of constraints there)
+    with op.batch_alter_table('watering_history') as batch_op:
+        batch_op.add_column(sa.Column('session_id', sa.UUID(), nullable=True))
+        batch_op.create_index(batch_op.f('ix_watering_history_session_id'), ['session_id'], unique=False)
+        batch_op.create_foreign_key(
+            'watering_history_session_id_fkey', 'watering_sessions', ['session_id'], ['id'], ondelete='CASCADE'
+        )
+
+    with op.batch_alter_table('watering_fertilizers') as batch_op:
+        batch_op.alter_column('watering_id', existing_type=sa.UUID(), nullable=True)
+        batch_op.add_column(sa.Column('session_id', sa.UUID(), nullable=True))
+        batch_op.create_index(batch_op.f('ix_watering_fertilizers_session_id'), ['session_id'], unique=False)
+        batch_op.create_foreign_key(
+            'watering_fertilizers_session_id_fkey', 'watering_sessions', ['session_id'], ['id'], ondelete='CASCADE'
+        )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.execute('DELETE FROM watering_fertilizers WHERE watering_id IS NULL')
+    with op.batch_alter_table('watering_fertilizers') as batch_op:
+        batch_op.drop_constraint('watering_fertilizers_session_id_fkey', type_='foreignkey')
+        batch_op.drop_index(batch_op.f('ix_watering_fertilizers_session_id'))
+        batch_op.drop_column('session_id')
+        batch_op.alter_column('watering_id', existing_type=sa.UUID(), nullable=False)
+
+    # Give session waterings their own copy of the mix again
+    op.execute(
+        'UPDATE watering_history SET '
+        'note = (SELECT s.note FROM watering_sessions s WHERE s.id = watering_history.session_id), '
+        'ferts = (SELECT s.ferts FROM watering_sessions s WHERE s.id = watering_history.session_id) '
+        'WHERE session_id IS NOT NULL'
+    )
+    with op.batch_alter_table('watering_history') as batch_op:
+        batch_op.drop_constraint('watering_history_session_id_fkey', type_='foreignkey')
+        batch_op.drop_index(batch_op.f('ix_watering_history_session_id'))
+        batch_op.drop_column('session_id')
+
+    op.drop_index('idx_watering_sessions_user_ts', table_name='watering_sessions')
+    op.drop_table('watering_sessions')
@@ -0,0 +1,139 @@
+"""add counter caches
+
+Revision ID: 7c3f9a1e5b28
+Revises: 4b7e1d9c3a52
+Create Date: 2026-10-20 09:12:45.318207
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '7c3f9a1e5b28'
+down_revision: Union[str, Sequence[str], None] = '4b7e1d9c3a52'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+# Trigger DDL as of this revision (app.counters may change later)
+POSTGRES_TRIGGERS = (
+    """
+    CREATE OR REPLACE FUNCTION plants_counters() RETURNS trigger AS $$
+    BEGIN
+        IF TG_OP IN ('UPDATE', 'DELETE') THEN
+            UPDATE indoors SET plants_count = plants_count - 1 WHERE id = OLD.indoor_id;
+            UPDATE users SET plants_total = plants_total - 1 WHERE id = OLD.user_id;
+        END IF;
+        IF TG_OP IN ('UPDATE', 'INSERT') THEN
+            UPDATE indoors SET plants_count = plants_count + 1 WHERE id = NEW.indoor_id;
+            UPDATE users SET plants_total = plants_total + 1 WHERE id = NEW.user_id;
+        END IF;
+        RETURN NULL;
+    END
+    $$ LANGUAGE plpgsql
+    """,
+    """
+    CREATE OR REPLACE FUNCTION indoors_counters() RETURNS trigger AS $$
+    BEGIN
+        IF TG_OP = 'DELETE' THEN
+            UPDATE users SET indoors_total = indoors_total - 1 WHERE id = OLD.user_id;
+        ELSE
+            UPDATE users SET indoors_total = indoors_total + 1 WHERE id = NEW.user_id;
+        END IF;
+        RETURN NULL;
+    END
+    $$ LANGUAGE plpgsql
+    """,
+    """
+    CREATE TRIGGER plants_counters AFTER INSERT OR DELETE ON plants
+    FOR EACH ROW EXECUTE FUNCTION plants_counters()
+    """,
+    """
+    CREATE TRIGGER plants_counters_move AFTER UPDATE OF indoor_id, user_id ON plants
+    FOR EACH ROW WHEN (OLD.indoor_id IS DISTINCT FROM NEW.indoor_id OR OLD.user_id IS DISTINCT FROM NEW.user_id)
+    EXECUTE FUNCTION plants_counters()
+    """,
+    """
+    CREATE TRIGGER indoors_counters AFTER INSERT OR DELETE ON indoors
+    FOR EACH ROW EXECUTE FUNCTION indoors_counters()
+    """,
+)
+
+POSTGRES_DROP = (
+    "DROP TRIGGER IF EXISTS indoors_counters ON indoors",
+    "DROP TRIGGER IF EXISTS plants_counters_move ON plants",
+    "DROP TRIGGER IF EXISTS plants_counters ON plants",
+    "DROP FUNCTION IF EXISTS indoors_counters()",
+    "DROP FUNCTION IF EXISTS plants_counters()",
+)
+
+_SQLITE_PLANT_OUT = """
+    UPDATE indoors SET plants_count = plants_count - 1 WHERE id = OLD.indoor_id;
+    UPDATE users SET plants_total = plants_total - 1 WHERE id = OLD.user_id;
+"""
+_SQLITE_PLANT_IN = """
+    UPDATE indoors SET plants_count = plants_count + 1 WHERE id = NEW.indoor_id;
+    UPDATE users SET plants_total = plants_total + 1 WHERE id = NEW.user_id;
+"""
+
+SQLITE_TRIGGERS = (
+    f"CREATE TRIGGER IF NOT EXISTS plants_counters_insert AFTER INSERT ON plants BEGIN {_SQLITE_PLANT_IN} END",
+    f"CREATE TRIGGER IF NOT EXISTS plants_counters_delete AFTER DELETE ON plants BEGIN {_SQLITE_PLANT_OUT} END",
+    f"""
+    CREATE TRIGGER IF NOT EXISTS plants_counters_move AFTER UPDATE OF indoor_id, user_id ON plants
+    WHEN OLD.indoor_id IS NOT NEW.indoor_id OR OLD.user_id IS NOT NEW.user_id
+    BEGIN {_SQLITE_PLANT_OUT} {_SQLITE_PLANT_IN} END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS indoors_counters_insert AFTER INSERT ON indoors BEGIN
+        UPDATE users SET indoors_total = indoors_total + 1 WHERE id = NEW.user_id;
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS indoors_counters_delete AFTER DELETE ON indoors BEGIN
+        UPDATE users SET indoors_total = indoors_total - 1 WHERE id = OLD.user_id;
+    END
+    """,
+)
+
+SQLITE_DROP = (
+    "DROP TRIGGER IF EXISTS indoors_counters_delete",
+    "DROP TRIGGER IF EXISTS indoors_counters_insert",
+    "DROP TRIGGER IF EXISTS plants_counters_move",
+    "DROP TRIGGER IF EXISTS plants_counters_delete",
+    "DROP TRIGGER IF EXISTS plants_counters_insert",
+)
+
+TRIGGERS = {"postgresql": POSTGRES_TRIGGERS, "sqlite": SQLITE_TRIGGERS}
+DROP = {"postgresql": POSTGRES_DROP, "sqlite": SQLITE_DROP}
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('indoors', sa.Column('plants_count', sa.Integer(), server_default='0', nullable=False))
+    op.add_column('users', sa.Column('indoors_total', sa.Integer(), server_default='0', nullable=False))
+    op.add_column('users', sa.Column('plants_total', sa.Integer(), server_default='0', nullable=False))
+
+    # The ALTERs keep both tables locked until commit, so no write lands between the counts and the triggers
+    op.execute(
+        "UPDATE indoors SET plants_count = (SELECT count(*) FROM plants WHERE plants.indoor_id = indoors.id)"
+    )
+    op.execute(
+        "UPDATE users SET"
+        " indoors_total = (SELECT count(*) FROM indoors WHERE indoors.user_id = users.id),"
+        " plants_total = (SELECT count(*) FROM plants WHERE plants.user_id = users.id)"
+    )
+    for statement in TRIGGERS.get(op.get_bind().dialect.name, ()):
+        op.execute(statement)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    for statement in DROP.get(op.get_bind().dialect.name, ()):
+        op.execute(statement)
+    op.drop_column('users', 'plants_total')
+    op.drop_column('users', 'indoors_total')
+    op.drop_column('indoors', 'plants_count')
@@ -0,0 +1,79 @@
+"""add fertilizer catalog
+
+Revision ID: a3c51f7e9b20
+Revises: ef734d0f28e4
+Create Date: 2026-10-19 17:02:11.604215
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'a3c51f7e9b20'
+down_revision: Union[str, Sequence[str], None] = 'ef734d0f28e4'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('fertilizers',
+    sa.Column('id', sa.UUID(), nullable=False),
+    sa.Column('user_id', sa.UUID(), nullable=False),
+    sa.Column('name', sa.Text(), nullable=False),
+    sa.Column('name_key', sa.Text(), nullable=False),
+    sa.Column('default_unit', sa.Text(), nullable=True),
+    sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.func.now(), nullable=False),
+    sa.ForeignKeyConstraint(['user_id'], ['users.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index('idx_fertilizers_user_name', 'fertilizers', ['user_id', 'name_key'], unique=True)
+    op.create_table('watering_fertilizers',
+    sa.Column('id', sa.UUID(), nullable=False),
+    sa.Column('watering_id', sa.UUID(), nullable=False),
+    sa.Column('fertilizer_id', sa.UUID(), nullable=False),
+    sa.Column('user_id', sa.UUID(), nullable=False),
+    sa.Column('indoor_id', sa.UUID(), nullable=True),
+    sa.Column('event_ts', sa.DateTime(timezone=True), nullable=False),
+    sa.Column('amount', sa.Numeric(precision=10, scale=3), nullable=False),
+    sa.Column('unit', sa.Text(), nullable=False),
+    sa.Column('total_amount', sa.Numeric(precision=12, scale=3), nullable=False),
+    sa.Column('total_unit', sa.Text(), nullable=False),
+    sa.ForeignKeyConstraint(['fertilizer_id'], ['fertilizers.id'], ondelete='CASCADE'),
+    sa.ForeignKeyConstraint(['indoor_id'], ['indoors.id'], ondelete='SET NULL'),
+    sa.ForeignKeyConstraint(['user_id'], ['users.id'], ondelete='CASCADE'),
+    sa.ForeignKeyConstraint(['watering_id'], ['watering_history.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(op.f('ix_watering_fertilizers_watering_id'), 'watering_fertilizers', ['watering_id'], unique=False)
+    op.create_index('idx_watering_fertilizers_usage', 'watering_fertilizers', ['user_id', 'fertilizer_id', 'event_ts'], unique=False)
+
+    # Existing ferts are normalized outside the migration, in batches that
+    # each commit: `python -m app.services.fertilizer_service backfill`
+
+    # Built without locking watering_history against waterings (GIN: Postgres only)
+    if op.get_bind().dialect.name != 'postgresql':
+        return
+    with op.get_context().autocommit_block():
+        op.create_index(
+            'idx_watering_history_ferts', 'watering_history', ['ferts'],
+            unique=False, postgresql_using='gin', postgresql_concurrently=True, if_not_exists=True
+        )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    if op.get_bind().dialect.name == 'postgresql':
+        with op.get_context().autocommit_block():
+            op.drop_index(
+                'idx_watering_history_ferts', table_name='watering_history',
+                postgresql_concurrently=True, if_exists=True
+            )
+    op.drop_index('idx_watering_fertilizers_usage', table_name='watering_fertilizers')
+    op.drop_index(op.f('ix_watering_fertilizers_watering_id'), table_name='watering_fertilizers')
+    op.drop_table('watering_fertilizers')
+    op.drop_index('idx_fertilizers_user_name', table_name='fertilizers')
+    op.drop_table('fertilizers')
@@ -0,0 +1,48 @@
+"""add plant search indexes
+
+Revision ID: b5d2e8f4c617
+Revises: 7c3f9a1e5b28
+Create Date: 2026-10-20 11:03:22.906514
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'b5d2e8f4c617'
+down_revision: Union[str, Sequence[str], None] = '7c3f9a1e5b28'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+COLUMNS = ('name', 'species', 'notes')
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    if op.get_bind().dialect.name != 'postgresql':
+        return  # pg_trgm only; elsewhere searches not answered in memory use LIKE
+    op.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+
+    # Built without locking plants against writes
+    with op.get_context().autocommit_block():
+        for column in COLUMNS:
+            op.create_index(
+                f'idx_plants_{column}_trgm', 'plants', [column],
+                unique=False, postgresql_using='gin', postgresql_ops={column: 'gin_trgm_ops'},
+                postgresql_concurrently=True, if_not_exists=True
+            )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    if op.get_bind().dialect.name != 'postgresql':
+        return
+    with op.get_context().autocommit_block():
+        for column in COLUMNS:
+            op.drop_index(
+                f'idx_plants_{column}_trgm', table_name='plants',
+                postgresql_concurrently=True, if_exists=True
+            )
@@ -0,0 +1,48 @@
+"""add history retention
+
+Revision ID: c81f03a6d2e4
+Revises: 5e2b7c4d8a91
+Create Date: 2026-10-19 19:05:32.918402
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c81f03a6d2e4'
+down_revision: Union[str, Sequence[str], None] = '5e2b7c4d8a91'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('users', sa.Column('tier', sa.Text(), server_default='free', nullable=False))
+    op.create_table('indoor_history_daily',
+    sa.Column('indoor_id', sa.UUID(), nullable=False),
+    sa.Column('day', sa.Date(), nullable=False),
+    sa.Column('events', sa.Integer(), nullable=False),
+    sa.Column('first_ts', sa.DateTime(timezone=True), nullable=False),
+    sa.Column('last_ts', sa.DateTime(timezone=True), nullable=False),
+    sa.Column('last_message', sa.Text(), nullable=True),
+    sa.ForeignKeyConstraint(['indoor_id'], ['indoors.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('indoor_id', 'day')
+    )
+    op.create_table('watering_daily',
+    sa.Column('plant_id', sa.UUID(), nullable=False),
+    sa.Column('day', sa.Date(), nullable=False),
+    sa.Column('waterings', sa.Integer(), nullable=False),
+    sa.Column('liters', sa.Numeric(precision=10, scale=3), nullable=False),
+    sa.ForeignKeyConstraint(['plant_id'], ['plants.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('plant_id', 'day')
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_table('watering_daily')
+    op.drop_table('indoor_history_daily')
+    op.drop_column('users', 'tier')
@@ -0,0 +1,28 @@
+"""add user timezone
+
+Revision ID: d6b8e016f806
+Revises: ce812b509193
+Create Date: 2026-10-19 15:26:27.999014
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'd6b8e016f806'
+down_revision: Union[str, Sequence[str], None] = 'ce812b509193'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('users', sa.Column('timezone', sa.Text(), nullable=True))
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_column('users', 'timezone')
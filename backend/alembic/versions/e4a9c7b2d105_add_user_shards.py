@@ -0,0 +1,36 @@
+"""add user shards
+
+Revision ID: e4a9c7b2d105
+Revises: b5d2e8f4c617
+Create Date: 2026-10-20 14:27:51.604118
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e4a9c7b2d105'
+down_revision: Union[str, Sequence[str], None] = 'b5d2e8f4c617'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Created on every shard, only shard 0's is used. Users without an entry
+    # are looked up on the shards when first seen, so there is no backfill
+    op.create_table('user_shards',
+    sa.Column('telegram_user_id', sa.BigInteger(), autoincrement=False, nullable=False),
+    sa.Column('shard', sa.Integer(), nullable=False),
+    sa.Column('moving_to', sa.Integer(), nullable=True),
+    sa.Column('updated_at', sa.DateTime(timezone=True), server_default=sa.func.now(), nullable=False),
+    sa.PrimaryKeyConstraint('telegram_user_id')
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_table('user_shards')
@@ -0,0 +1,225 @@
+"""
+Admission control and request deadlines.
+
+When the database slows down, requests pile up and every client times out
+together. Instead, each worker:
+
+- sheds requests with 503 + Retry-After once too many are in flight or the
+  connection pool wait grows too long: the wait EWMA, or the time the oldest
+  request still queued for a connection has waited (no lag when the queue
+  suddenly grows). Reads (dashboard polls, lists) are shed at a lower bar
+  than writes (watering, updates), which keep a reserved share of the
+  in-flight slots and tolerate a longer pool wait. Pools are tracked per
+  lane: writes only look at the primary's (on SQLite, the single writer),
+  reads at every lane, so they also give way (threads, CPU) while writes
+  queue for the primary. That only orders who is shed first: beyond what
+  the primary can write, most writes are shed too.
+- gives every request a deadline (per route, see `deadline()`), which the
+  DB session turns into `SET LOCAL statement_timeout` for each transaction,
+  so a request never keeps Postgres busy after its client gave up.
+
+Both are off by default: ADMISSION_MAX_INFLIGHT turns shedding on, the
+*_DEADLINE_SECONDS settings the deadlines.
+"""
+import math
+import threading
+import time
+
+from fastapi import Request
+from starlette.responses import JSONResponse
+
+from app.config import settings
+
+# Never shed: probes, metrics and long-lived SSE streams
+EXEMPT_PATHS = ("/", "/api/health", "/api/metrics")
+WRITE_METHODS = ("POST", "PATCH", "PUT", "DELETE")
+
+# Pool wait EWMA: weight of a new sample, and decay time constant (seconds)
+# so the estimate recovers even when shedding stops new samples
+EWMA_WEIGHT = 0.2
+EWMA_DECAY_SECONDS = 1.0
+
+# Connection pools: the primary (writes, and reads without replicas) and
+# read-only ones (replicas, the SQLite reader pool)
+LANES = ("primary", "replica")
+
+# Wait for a pooled connection when no deadline is set (SQLAlchemy's default)
+DEFAULT_POOL_TIMEOUT_SECONDS = 30.0
+
+
+class DeadlineExceeded(Exception):
+    """The request ran out of time before it could use the database"""
+
+
+class AdmissionController:
+    def __init__(self, max_inflight: int, read_share: float, pool_wait_seconds: float, retry_after: int):
+        self.max_inflight = max_inflight
+        self.read_limit = max(1, int(max_inflight * read_share))
+        self.pool_wait_seconds = pool_wait_seconds
+        self.retry_after = retry_after
+        self.inflight = 0
+        self.admitted = 0
+        self.shed = {"read": 0, "write": 0}
+        self.deadline_exceeded = 0
+        self._waiting_since = {lane: [] for lane in LANES}
+        self._pool_wait = dict.fromkeys(LANES, 0.0)
+        self._pool_wait_at = dict.fromkeys(LANES, time.monotonic())
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_inflight > 0
+
+    @property
+    def pool_waiting(self) -> int:
+        return sum(len(waiting) for waiting in self._waiting_since.values())
+
+    def checkout_started(self, lane: str) -> float:
+        """Returns the start to pass to checkout_finished"""
+        started = time.monotonic()
+        with self._lock:
+            self._waiting_since[lane].append(started)
+        return started
+
+    def checkout_finished(self, lane: str, started: float) -> None:
+        now = time.monotonic()
+        with self._lock:
+            self._waiting_since[lane].remove(started)
+            self._pool_wait[lane] = (1 - EWMA_WEIGHT) * self.pool_wait(lane) + EWMA_WEIGHT * (now - started)
+            self._pool_wait_at[lane] = now
+
+    def pool_wait(self, lane: str) -> float:
+        elapsed = time.monotonic() - self._pool_wait_at[lane]
+        return self._pool_wait[lane] * math.exp(-elapsed / EWMA_DECAY_SECONDS)
+
+    def oldest_wait(self, lane: str) -> float:
+        """How long the first request still queued on the lane has waited"""
+        waiting = self._waiting_since[lane]
+        return time.monotonic() - min(waiting) if waiting else 0.0
+
+    def congested(self, lane: str, max_wait: float) -> bool:
+        # Pool pressure only counts while someone is actually queued for a
+        # connection, so the worker opens up again as soon as the queue drains
+        if not self._waiting_since[lane]:
+            return False
+        return self.pool_wait(lane) > max_wait or self.oldest_wait(lane) > max_wait
+
+    def admit(self, priority: str) -> bool:
+        """Take an in-flight slot, or return False if the request must be shed"""
+        if priority == "write":
+            limit, max_wait, lanes = self.max_inflight, self.pool_wait_seconds * 2, ("primary",)
+        else:
+            limit, max_wait, lanes = self.read_limit, self.pool_wait_seconds, LANES
+        congested = any(self.congested(lane, max_wait) for lane in lanes)
+        if self.inflight >= limit or congested:
+            self.shed[priority] += 1
+            return False
+        self.inflight += 1
+        self.admitted += 1
+        return True
+
+    def release(self) -> None:
+        self.inflight -= 1
+
+    def stats(self) -> dict:
+        return {
+            "inflight": self.inflight,
+            "admitted": self.admitted,
+            "shed_reads": self.shed["read"],
+            "shed_writes": self.shed["write"],
+            "deadline_exceeded": self.deadline_exceeded,
+            "pool_waiting": self.pool_waiting,
+            "pool_wait_ms": round(max(self.pool_wait(lane) for lane in LANES) * 1000, 2),
+            "oldest_wait_ms": round(max(self.oldest_wait(lane) for lane in LANES) * 1000, 2),
+        }
+
+    def busy_response(self, detail: str) -> JSONResponse:
+        return JSONResponse(
+            {"detail": detail},
+            status_code=503,
+            headers={"Retry-After": str(self.retry_after)}
+        )
+
+
+admission = AdmissionController(
+    max_inflight=settings.admission_max_inflight,
+    read_share=settings.admission_read_share,
+    pool_wait_seconds=settings.admission_pool_wait_ms / 1000,
+    retry_after=settings.admission_retry_after_seconds,
+)
+
+
+def deadline(seconds: float | None):
+    """
+    Route dependency setting the request deadline, counted from arrival
+    (None leaves the default one):
+
+        @router.get("/dashboard", dependencies=[Depends(deadline(settings.read_deadline_seconds))])
+    """
+    async def set_deadline(request: Request) -> None:
+        if seconds is None:
+            return
+        arrived_at = getattr(request.state, "arrived_at", None) or time.monotonic()
+        request.state.deadline = arrived_at + seconds
+    return set_deadline
+
+
+def request_deadline(request: Request) -> float | None:
+    """Deadline of the route, else the default one; None if unset or outside the middleware"""
+    deadline_at = getattr(request.state, "deadline", None)
+    if deadline_at is None and settings.request_deadline_seconds is not None:
+        arrived_at = getattr(request.state, "arrived_at", None)
+        if arrived_at is not None:
+            deadline_at = arrived_at + settings.request_deadline_seconds
+    return deadline_at
+
+
+def pool_timeout(*deadlines: float | None) -> float:
+    """Longest wait for a pooled connection: the first deadline set, else SQLAlchemy's default"""
+    return next((seconds for seconds in deadlines if seconds is not None), DEFAULT_POOL_TIMEOUT_SECONDS)
+
+
+def longest_request_seconds() -> float:
+    """
+    How long a request may keep going, for what outlives one that died
+    (idempotency claims, shard moves): the longest deadline. Without
+    deadlines this is the pool timeout, which only bounds the connection wait.
+    """
+    default = settings.request_deadline_seconds
+    return max(
+        pool_timeout(seconds, default)
+        for seconds in (settings.read_deadline_seconds, settings.write_deadline_seconds, default)
+    )
+
+
+def is_statement_timeout(exc: Exception) -> bool:
+    """Postgres cancelled the statement (statement_timeout, SQLSTATE 57014)"""
+    return getattr(getattr(exc, "orig", None), "sqlstate", None) == "57014"
+
+
+class AdmissionMiddleware:
+    """ASGI middleware applying the admission controller to API requests"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if (
+            scope["type"] != "http"
+            or not admission.enabled
+            or scope["method"] == "OPTIONS"
+            or scope["path"] in EXEMPT_PATHS
+            or scope["path"].endswith("/events")
+        ):
+            await self.app(scope, receive, send)
+            return
+
+        scope.setdefault("state", {})["arrived_at"] = time.monotonic()
+        priority = "write" if scope["method"] in WRITE_METHODS else "read"
+        if not admission.admit(priority):
+            await admission.busy_response("Server busy, retry later")(scope, receive, send)
+            return
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            admission.release()
@@ -3,41 +3,98 @@ API dependencies
 """
 from fastapi import Depends, Request, HTTPException
 from sqlalchemy.orm import Session
-from app.database import get_db
+from app.cache import cache
+from app.database import get_db, get_read_db
+from app.changefeed import emit_change
 from app.models import User
+from app.queries import fetch_user
+from app.services import get_zone
 
 
-async def get_current_user(
-    request: Request,
-    db: Session = Depends(get_db)
-) -> User:
-    """
-    Get current user from X-Telegram-UserId header.
-    Creates user if doesn't exist.
-    """
+def _get_telegram_user_id(request: Request) -> int:
+    """Parse the X-Telegram-UserId header"""
     telegram_user_id = request.headers.get("X-Telegram-UserId")
-    
+
     if not telegram_user_id:
         raise HTTPException(
             status_code=400,
             detail="Missing X-Telegram-UserId header"
         )
-    
+
     try:
-        telegram_user_id = int(telegram_user_id)
+        return int(telegram_user_id)
     except ValueError:
         raise HTTPException(
             status_code=400,
             detail="X-Telegram-UserId must be an integer"
         )
-    
+
+
+def _get_timezone(request: Request) -> str | None:
+    """Optional X-User-Timezone header (IANA name). Unknown zones are ignored."""
+    timezone = request.headers.get("X-User-Timezone")
+    return timezone if get_zone(timezone) else None
+
+
+def _create_user(db: Session, telegram_user_id: int, timezone: str | None) -> User:
+    user = User(telegram_user_id=telegram_user_id, timezone=timezone)
+    db.add(user)
+    db.commit()
+    db.refresh(user)
+    return user
+
+
+def _sync_timezone(db: Session, user, timezone: str | None):
+    """Store the client's timezone when it changes (write requests only)"""
+    if not timezone or user.timezone == timezone:
+        return user
+    db.query(User).filter(User.id == user.id).update({User.timezone: timezone})
+    emit_change(db, "users", user.id, user.id)
+    db.commit()
+    # Cached read models depend on the user's local date
+    cache.invalidate_user(user.id)
+    return fetch_user(db, user.telegram_user_id)
+
+
+def get_current_user(
+    request: Request,
+    db: Session = Depends(get_db)
+) -> User:
+    """
+    Get current user from X-Telegram-UserId header.
+    Creates user if doesn't exist. Existing users come back as a light
+    (id, telegram_user_id, timezone) row, not an ORM entity.
+    """
+    telegram_user_id = _get_telegram_user_id(request)
+    timezone = _get_timezone(request)
+
     # Get or create user
-    user = db.query(User).filter(User.telegram_user_id == telegram_user_id).first()
-    
+    user = fetch_user(db, telegram_user_id)
+
+    if not user:
+        user = _create_user(db, telegram_user_id, timezone)
+    else:
+        user = _sync_timezone(db, user, timezone)
+
+    return user
+
+
+def get_current_read_user(
+    request: Request,
+    db: Session = Depends(get_read_db),
+    primary_db: Session = Depends(get_db)
+) -> User:
+    """
+    Same as get_current_user but looks the user up through the read session.
+    Only a brand new user touches the primary (the session connects lazily):
+    a changed X-User-Timezone is stored by the user's next write request, so
+    reads never write and stay on the replicas.
+    """
+    telegram_user_id = _get_telegram_user_id(request)
+
+    user = fetch_user(db, telegram_user_id)
+
     if not user:
-        user = User(telegram_user_id=telegram_user_id)
-        db.add(user)
-        db.commit()
-        db.refresh(user)
-    
+        user = _create_user(primary_db, telegram_user_id, _get_timezone(request))
+
     return user
@@ -0,0 +1,75 @@
+"""
+Bootstrap router: everything a client needs on load, in one request
+"""
+from typing import Optional
+from fastapi import APIRouter, Depends, HTTPException, Query
+from sqlalchemy.orm import Session
+from app.config import settings
+from app.database import ReleaseConnectionRoute, get_read_db
+from app.models import User
+from app.queries import fetch_plant_pages
+from app.schemas import BootstrapResponse, IndoorPlantsPage
+from app.api import get_current_read_user
+from app.api.dashboard import load_dashboard
+from app.api.indoors import load_indoor_list, plant_in_indoor
+from app.admission import deadline
+from app.cache import cache
+from app.services import user_today, seconds_until_midnight
+
+router = APIRouter(prefix="/api", tags=["bootstrap"], route_class=ReleaseConnectionRoute)
+
+INCLUDES = ("dashboard", "indoors", "plants")
+
+
+@router.get(
+    "/bootstrap",
+    response_model=BootstrapResponse,
+    response_model_exclude_none=True,
+    dependencies=[Depends(deadline(settings.read_deadline_seconds))]
+)
+async def get_bootstrap(
+    include: Optional[str] = Query(None, description="Comma-separated sections: dashboard,indoors,plants (default all)"),
+    plants_per_indoor: int = Query(20, ge=1, le=100),
+    db: Session = Depends(get_read_db),
+    user: User = Depends(get_current_read_user)
+):
+    """
+    Get dashboard, indoor list and the first page of plants of every indoor
+    in one response. Each section is one cached read model built with a
+    fixed number of queries, all on the same session.
+    """
+    sections = INCLUDES
+    if include:
+        sections = tuple(part.strip() for part in include.split(",") if part.strip())
+        unknown = [part for part in sections if part not in INCLUDES]
+        if unknown:
+            raise HTTPException(status_code=400, detail=f"Unknown include: {', '.join(unknown)}")
+
+    response = BootstrapResponse()
+    if "dashboard" in sections:
+        response.dashboard = await load_dashboard(db, user)
+    if "indoors" in sections:
+        response.indoors = await load_indoor_list(db, user)
+    if "plants" in sections:
+        response.plants = await cache.get_or_load(
+            user.id,
+            f"plant_pages:{plants_per_indoor}",
+            list[IndoorPlantsPage],
+            lambda: build_plant_pages(db, user, plants_per_indoor),
+            # days_since_planted changes at the user's midnight
+            ttl=seconds_until_midnight(user)
+        )
+    return response
+
+
+def build_plant_pages(db: Session, user: User, per_indoor: int) -> list[IndoorPlantsPage]:
+    """First `per_indoor` plants (by name) of every indoor, from one query"""
+    today = user_today(user)
+    return [
+        IndoorPlantsPage(
+            indoor_id=indoor_id,
+            plants=[plant_in_indoor(plant, today) for plant in plants],
+            plants_total=plants_total
+        )
+        for indoor_id, (plants, plants_total) in fetch_plant_pages(db, user.id, per_indoor).items()
+    ]
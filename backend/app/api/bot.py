@@ -0,0 +1,36 @@
+"""
+Bot router
+"""
+from fastapi import APIRouter, Depends
+from sqlalchemy.orm import Session
+from app.database import ReleaseConnectionRoute, get_db
+from app.models import User
+from app.schemas import BotMessageRequest, BotMessageResponse, BotEntity
+from app.api import get_current_user
+from app.admission import deadline
+from app.config import settings
+
+router = APIRouter(prefix="/api/bot", tags=["bot"], route_class=ReleaseConnectionRoute)
+
+
+@router.post("/message", response_model=BotMessageResponse, dependencies=[Depends(deadline(settings.write_deadline_seconds))])
+def bot_message(
+    body: BotMessageRequest,
+    db: Session = Depends(get_db),
+    user: User = Depends(get_current_user)
+):
+    """
+    Run one chat message: register a watering, change an indoor's light or
+    answer what has to be watered. Names the bot couldn't tell apart come
+    back as a question with done=false.
+    """
+    # The grammar is compiled on import: loaded with the first message, not at startup
+    from app.services import bot_service
+
+    reply = bot_service.handle(db, user, body.text)
+    return BotMessageResponse(
+        intent=reply.intent,
+        reply=reply.text,
+        done=reply.done,
+        entities=[BotEntity.model_validate(entity) for entity in reply.entities]
+    )
@@ -0,0 +1,63 @@
+"""
+Calendar router
+"""
+from datetime import date, timedelta
+from typing import Optional
+from fastapi import APIRouter, Depends, HTTPException, Query
+from sqlalchemy.orm import Session
+from app.config import settings
+from app.database import ReleaseConnectionRoute, get_read_db
+from app.models import User
+from app.queries import fetch_plants_calendar
+from app.schemas import CalendarResponse, CalendarPlant, CalendarDay
+from app.api import get_current_read_user
+from app.admission import deadline
+from app.cache import cache
+from app.services import user_today, seconds_until_midnight
+from app.services.calendar_service import project
+
+router = APIRouter(prefix="/api", tags=["calendar"], route_class=ReleaseConnectionRoute)
+
+DEFAULT_DAYS = 31
+MAX_DAYS = 366
+
+
+@router.get("/calendar", response_model=CalendarResponse, dependencies=[Depends(deadline(settings.read_deadline_seconds))])
+async def get_calendar(
+    date_from: Optional[date] = Query(None, alias="from"),
+    date_to: Optional[date] = Query(None, alias="to"),
+    db: Session = Depends(get_read_db),
+    user: User = Depends(get_current_read_user)
+):
+    """
+    Get projected watering dates of all plants between `from` and `to`
+    (inclusive, default the next 31 days), bucketed per day.
+    """
+    today = user_today(user)
+    start = date_from or today
+    end = date_to or start + timedelta(days=DEFAULT_DAYS - 1)
+    if end < start:
+        raise HTTPException(status_code=400, detail="to must not be before from")
+    if (end - start).days >= MAX_DAYS:
+        raise HTTPException(status_code=400, detail=f"Range must be at most {MAX_DAYS} days")
+
+    # Valid until the next mutation or the user's midnight (overdue plants move to the new today)
+    return await cache.get_or_load(
+        user.id,
+        f"calendar:{start}:{end}",
+        CalendarResponse,
+        lambda: build_calendar(db, user, today, start, end),
+        ttl=min(settings.dashboard_cache_ttl_seconds, seconds_until_midnight(user))
+    )
+
+
+def build_calendar(db: Session, user: User, today: date, start: date, end: date) -> CalendarResponse:
+    plants = fetch_plants_calendar(db, user.id)
+    groups, days = project(plants, today, start, end)
+    return CalendarResponse(
+        start=start,
+        end=end,
+        plants=[CalendarPlant(id=plant.id, name=plant.name, indoor_id=plant.indoor_id) for plant in plants],
+        groups=groups,
+        days=[CalendarDay(date=day, groups=day_groups, count=count) for day, day_groups, count in days]
+    )
@@ -3,56 +3,113 @@ Dashboard router
 """
 from datetime import date
 from fastapi import APIRouter, Depends
+from pydantic import BaseModel
 from sqlalchemy.orm import Session
-from app.database import get_db
-from app.models import User, Plant
+from app.config import settings
+from app.database import ReleaseConnectionRoute, get_read_db
+from app.models import User
+from app.queries import fetch_user_counters, fetch_plants_schedule
 from app.schemas import DashboardResponse, PlantUpcomingItem
-from app.api import get_current_user
+from app.api import get_current_read_user
+from app.admission import deadline
+from app.cache import cache
+from app.services import user_today, seconds_until_midnight, watering_status
 
-router = APIRouter(prefix="/api", tags=["dashboard"])
+router = APIRouter(prefix="/api", tags=["dashboard"], route_class=ReleaseConnectionRoute)
 
 
-@router.get("/dashboard", response_model=DashboardResponse)
+class CachedDashboard(BaseModel):
+    """Dashboard plus the local date it was computed for (rebase mode)"""
+    computed_for: date
+    dashboard: DashboardResponse
+
+
+@router.get("/dashboard", response_model=DashboardResponse, dependencies=[Depends(deadline(settings.read_deadline_seconds))])
 async def get_dashboard(
-    db: Session = Depends(get_db),
-    user: User = Depends(get_current_user)
+    db: Session = Depends(get_read_db),
+    user: User = Depends(get_current_read_user)
 ):
     """
     Get dashboard summary: indoors count, plants count, plants needing water.
     """
-    today = date.today()
-    
-    # Count indoors and plants
-    indoors_total = len(user.indoors)
-    plants_total = len(user.plants)
+    return await load_dashboard(db, user)
+
+
+async def load_dashboard(db: Session, user: User) -> DashboardResponse:
+    """Dashboard from the cache, computed on a miss (also used by /api/bootstrap)"""
+    today = user_today(user)
+
+    if settings.dashboard_cache_mode == "rebase":
+        cached = await cache.get_or_load(
+            user.id,
+            "dashboard:rebase",
+            CachedDashboard,
+            lambda: CachedDashboard(computed_for=today, dashboard=build_dashboard(db, user, today)),
+            ttl=settings.dashboard_cache_ttl_seconds
+        )
+        return rebase_dashboard(cached.dashboard, cached.computed_for, today)
+
+    # The dashboard only depends on plant data and the date: it stays valid
+    # until the next mutation (which invalidates it) or the next local midnight
+    return await cache.get_or_load(
+        user.id,
+        "dashboard",
+        DashboardResponse,
+        lambda: build_dashboard(db, user, today),
+        ttl=min(settings.dashboard_cache_ttl_seconds, seconds_until_midnight(user))
+    )
+
+
+def rebase_dashboard(dashboard: DashboardResponse, computed_for: date, today: date) -> DashboardResponse:
+    """
+    Move a dashboard computed on `computed_for` to `today` without hitting the DB.
+    Dates don't change, so due_in_days shifts by the elapsed days and the
+    status and need-water count follow from it.
+    """
+    shift = (today - computed_for).days
+    if shift == 0:
+        return dashboard
+
+    upcoming = []
+    for item in dashboard.upcoming:
+        due_in_days = item.due_in_days - shift
+        upcoming.append(item.model_copy(update={
+            "due_in_days": due_in_days,
+            "status": watering_status(due_in_days)
+        }))
+
+    return dashboard.model_copy(update={
+        "need_water_count": sum(1 for item in upcoming if item.due_in_days <= 0),
+        "upcoming": upcoming
+    })
+
+
+def build_dashboard(db: Session, user: User, today: date) -> DashboardResponse:
+    """Compute the dashboard for a user as of `today` (local date)"""
+    # Counter caches, no COUNT(*)
+    indoors_total, plants_total = fetch_user_counters(db, user.id)
+    plants = fetch_plants_schedule(db, user.id)
     
     # Find plants needing water (next_water_at <= today)
     need_water_count = sum(
-        1 for plant in user.plants
+        1 for plant in plants
         if plant.next_water_at and plant.next_water_at <= today
     )
     
     # Build upcoming list (sorted by next_water_at)
     upcoming = []
-    for plant in user.plants:
+    for plant in plants:
         if plant.next_water_at is None:
             continue
         
         due_in_days = (plant.next_water_at - today).days
         
-        if plant.next_water_at < today:
-            status = "OVERDUE"
-        elif 0 <= due_in_days <= 2:
-            status = "DUE_SOON"
-        else:
-            status = "OK"
-        
         upcoming.append(PlantUpcomingItem(
             plant_id=plant.id,
             name=plant.name,
             next_water_at=plant.next_water_at,
             due_in_days=due_in_days,
-            status=status
+            status=watering_status(due_in_days)
         ))
     
     # Sort by next_water_at ascending
@@ -0,0 +1,63 @@
+"""
+Fertilizers router
+"""
+from datetime import datetime
+from typing import Optional
+from uuid import UUID
+from fastapi import APIRouter, Depends, HTTPException, Query
+from sqlalchemy.orm import Session
+from app.config import settings
+from app.database import ReleaseConnectionRoute, get_read_db
+from app.models import User
+from app.schemas import FertilizerResponse, FertilizerUsageItem, FertilizerUsageResponse
+from app.api import get_current_read_user
+from app.admission import deadline
+from app.services import fertilizer_service
+
+router = APIRouter(prefix="/api/fertilizers", tags=["fertilizers"], route_class=ReleaseConnectionRoute)
+
+
+@router.get("", response_model=list[FertilizerResponse], dependencies=[Depends(deadline(settings.read_deadline_seconds))])
+def list_fertilizers(
+    db: Session = Depends(get_read_db),
+    user: User = Depends(get_current_read_user)
+):
+    """
+    Get the user's fertilizer catalog with usage counts.
+    """
+    return [FertilizerResponse.model_validate(row) for row in fertilizer_service.catalog(db, user.id)]
+
+
+@router.get("/usage", response_model=FertilizerUsageResponse, dependencies=[Depends(deadline(settings.read_deadline_seconds))])
+def fertilizer_usage(
+    period: str = Query("month"),
+    fertilizer_id: Optional[UUID] = None,
+    indoor_id: Optional[UUID] = None,
+    date_from: Optional[datetime] = Query(None, alias="from"),
+    date_to: Optional[datetime] = Query(None, alias="to"),
+    db: Session = Depends(get_read_db),
+    user: User = Depends(get_current_read_user)
+):
+    """
+    Get total fertilizer applied per fertilizer, indoor and period
+    (day, week, month or year in the user's timezone).
+    """
+    if period not in fertilizer_service.PERIODS:
+        raise HTTPException(status_code=400, detail=f"period must be one of {', '.join(fertilizer_service.PERIODS)}")
+
+    fertilizer_name = None
+    if fertilizer_id:
+        # From the catalog: the fertilizer may have no usage rows in the range
+        fertilizer_name = fertilizer_service.fertilizer_name(db, user.id, fertilizer_id)
+        if fertilizer_name is None:
+            raise HTTPException(status_code=404, detail="Fertilizer not found")
+
+    rows = fertilizer_service.usage(
+        db, user.id, user.timezone, period, fertilizer_id, indoor_id, date_from, date_to
+    )
+
+    return FertilizerUsageResponse(
+        period=period,
+        items=[FertilizerUsageItem.model_validate(row) for row in rows],
+        unparsed_waterings=fertilizer_service.unparsed_waterings(db, user.id, fertilizer_name),
+    )
@@ -2,9 +2,14 @@
 Indoors router
 """
 from datetime import date
-from fastapi import APIRouter, Depends, HTTPException
+from dataclasses import replace
+from typing import Optional
+from uuid import UUID
+from fastapi import APIRouter, Depends, HTTPException, Query, Request
+from fastapi.responses import StreamingResponse
+from starlette.concurrency import run_in_threadpool
 from sqlalchemy.orm import Session
-from app.database import get_db
+from app.database import ReleaseConnectionRoute, get_db, get_read_db, user_session
 from app.models import User, Indoor
 from app.schemas import (
     IndoorListItem,
@@ -13,16 +18,28 @@ from app.schemas import (
     PlantInIndoor,
     IndoorHistoryItem,
     IndoorCreateRequest,
-    IndoorUpdateRequest
+    IndoorUpdateRequest,
+    LightResponse,
+    LightScheduleInfo,
+    LightDay
 )
-from app.api import get_current_user
+from app.api import get_current_user, get_current_read_user, _get_telegram_user_id
+from app.cache import cache
+from app.admission import deadline
+from app.config import settings
+from app.events import broker, indoor_channel
+from app.changefeed import emit_change
+from app.services import user_today, get_zone
 from app.services.indoor_service import get_indoor_with_plants, update_indoor
+from app.services.indoor_buffer import indoor_buffer
+from app.services import light_service
+from app.queries import fetch_indoor, fetch_indoor_list
 
-router = APIRouter(prefix="/api/indoors", tags=["indoors"])
+router = APIRouter(prefix="/api/indoors", tags=["indoors"], route_class=ReleaseConnectionRoute)
 
 
-@router.post("", response_model=IndoorDetail, status_code=201)
-async def create_indoor(
+@router.post("", response_model=IndoorDetail, status_code=201, dependencies=[Depends(deadline(settings.write_deadline_seconds))])
+def create_indoor(
     body: IndoorCreateRequest,
     db: Session = Depends(get_db),
     user: User = Depends(get_current_user)
@@ -31,7 +48,7 @@ async def create_indoor(
     Create a new indoor environment.
     """
     from decimal import Decimal
-    from datetime import datetime
+    from datetime import datetime, timezone
     from app.models import IndoorHistory
     
     # Create indoor
@@ -56,12 +73,18 @@ async def create_indoor(
     # Create history entry
     history = IndoorHistory(
         indoor_id=indoor.id,
-        event_ts=datetime.now(),
+        event_ts=datetime.now(timezone.utc),
         message="Indoor creado.",
         payload=None
     )
     db.add(history)
+    if indoor.light_schedule or indoor.light_power_pct is not None:
+        light_service.record_period(
+            db, indoor.id, user.id, indoor.light_schedule, indoor.light_power_pct, indoor.created_at
+        )
+    emit_change(db, "indoors", user.id, indoor.id)
     db.commit()
+    cache.invalidate_user(user.id)
     
     return IndoorDetail(
         id=indoor.id,
@@ -78,31 +101,41 @@ async def create_indoor(
     )
 
 
-@router.get("", response_model=list[IndoorListItem])
+@router.get("", response_model=list[IndoorListItem], dependencies=[Depends(deadline(settings.read_deadline_seconds))])
 async def list_indoors(
-    db: Session = Depends(get_db),
-    user: User = Depends(get_current_user)
+    db: Session = Depends(get_read_db),
+    user: User = Depends(get_current_read_user)
 ):
     """
     Get all indoors for current user with plant counts.
     """
-    indoors = []
-    for indoor in user.indoors:
-        plants_count = len(indoor.plants)
-        indoors.append(IndoorListItem(
+    return await load_indoor_list(db, user)
+
+
+async def load_indoor_list(db: Session, user: User) -> list[IndoorListItem]:
+    """Indoor list from the cache, computed on a miss (also used by /api/bootstrap)"""
+    return await cache.get_or_load(
+        user.id, "indoors", list[IndoorListItem], lambda: build_indoor_list(db, user)
+    )
+
+
+def build_indoor_list(db: Session, user: User) -> list[IndoorListItem]:
+    """Compute the indoor list with plant counts (counted in SQL)"""
+    return [
+        IndoorListItem(
             id=indoor.id,
             name=indoor.name,
-            plants_count=plants_count
-        ))
-    
-    return indoors
+            plants_count=indoor.plants_count
+        )
+        for indoor in fetch_indoor_list(db, user.id)
+    ]
 
 
-@router.get("/{indoor_id}", response_model=IndoorDetailResponse)
+@router.get("/{indoor_id}", response_model=IndoorDetailResponse, dependencies=[Depends(deadline(settings.read_deadline_seconds))])
 async def get_indoor_detail(
     indoor_id: str,
-    db: Session = Depends(get_db),
-    user: User = Depends(get_current_user)
+    db: Session = Depends(get_read_db),
+    user: User = Depends(get_current_read_user)
 ):
     """
     Get indoor detail with plants and history.
@@ -114,28 +147,41 @@ async def get_indoor_detail(
     except ValueError:
         raise HTTPException(status_code=400, detail="Invalid indoor_id format")
     
+    return await cache.get_or_load(
+        user.id,
+        f"indoor:{indoor_uuid}",
+        IndoorDetailResponse,
+        lambda: build_indoor_detail(db, user, indoor_uuid)
+    )
+
+
+def plant_in_indoor(plant, today: date) -> PlantInIndoor:
+    """Plant row of an indoor, with days_since_planted as of `today`"""
+    days_since_planted = None
+    if plant.planted_at:
+        days_since_planted = (today - plant.planted_at).days
+
+    return PlantInIndoor(
+        id=plant.id,
+        name=plant.name,
+        species=plant.species,
+        last_watered_at=plant.last_watered_at,
+        next_water_at=plant.next_water_at,
+        watering_interval_days=plant.watering_interval_days,
+        days_since_planted=days_since_planted
+    )
+
+
+def build_indoor_detail(db: Session, user: User, indoor_uuid: UUID) -> IndoorDetailResponse:
+    """Compute the indoor detail with plants and history"""
     indoor, plants, history = get_indoor_with_plants(db, user.id, indoor_uuid)
     
     if not indoor:
         raise HTTPException(status_code=404, detail="Indoor not found")
     
     # Build plant list with days_since_planted
-    today = date.today()
-    plants_list = []
-    for plant in plants:
-        days_since_planted = None
-        if plant.planted_at:
-            days_since_planted = (today - plant.planted_at).days
-        
-        plants_list.append(PlantInIndoor(
-            id=plant.id,
-            name=plant.name,
-            species=plant.species,
-            last_watered_at=plant.last_watered_at,
-            next_water_at=plant.next_water_at,
-            watering_interval_days=plant.watering_interval_days,
-            days_since_planted=days_since_planted
-        ))
+    today = user_today(user)
+    plants_list = [plant_in_indoor(plant, today) for plant in plants]
     
     # Build history list
     history_list = [
@@ -146,16 +192,22 @@ async def get_indoor_detail(
         for item in history
     ]
     
+    pending = indoor_buffer.overlay(indoor.id)
+    if pending:
+        # Show buffered updates that are not written yet
+        indoor = replace(indoor, **pending)
+    
+    # Numeric columns already come as float from the query
     indoor_detail = IndoorDetail(
         id=indoor.id,
         name=indoor.name,
-        temp_c=float(indoor.temp_c) if indoor.temp_c else None,
-        humidity=float(indoor.humidity) if indoor.humidity else None,
+        temp_c=indoor.temp_c,
+        humidity=indoor.humidity,
         fan_location=indoor.fan_location,
         extractor_top=indoor.extractor_top,
         extractor_bottom=indoor.extractor_bottom,
         fan=indoor.fan,
-        light_height_cm=float(indoor.light_height_cm) if indoor.light_height_cm else None,
+        light_height_cm=indoor.light_height_cm,
         light_power_pct=indoor.light_power_pct,
         light_schedule=indoor.light_schedule
     )
@@ -167,8 +219,112 @@ async def get_indoor_detail(
     )
 
 
-@router.patch("/{indoor_id}", response_model=IndoorDetail)
-async def update_indoor_detail(
+LIGHT_DEFAULT_DAYS = 7
+LIGHT_MAX_DAYS = 366
+
+
+@router.get("/{indoor_id}/light", response_model=LightResponse, dependencies=[Depends(deadline(settings.read_deadline_seconds))])
+def get_indoor_light(
+    indoor_id: str,
+    date_from: Optional[date] = Query(None, alias="from"),
+    date_to: Optional[date] = Query(None, alias="to"),
+    db: Session = Depends(get_read_db),
+    user: User = Depends(get_current_read_user)
+):
+    """
+    Get light hours and relative DLI of an indoor between `from` and `to`
+    (local days, inclusive, default the last 7 days), in total and per day.
+    """
+    from datetime import datetime, time, timedelta, timezone
+
+    try:
+        indoor_uuid = UUID(indoor_id)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid indoor_id format")
+
+    end = date_to or user_today(user)
+    start = date_from or end - timedelta(days=LIGHT_DEFAULT_DAYS - 1)
+    if end < start:
+        raise HTTPException(status_code=400, detail="to must not be before from")
+    if (end - start).days >= LIGHT_MAX_DAYS:
+        raise HTTPException(status_code=400, detail=f"Range must be at most {LIGHT_MAX_DAYS} days")
+
+    indoor = fetch_indoor(db, user.id, indoor_uuid)
+    if not indoor:
+        raise HTTPException(status_code=404, detail="Indoor not found")
+    pending = indoor_buffer.overlay(indoor.id)
+    if pending:
+        indoor = replace(indoor, **pending)
+
+    zone = get_zone(user.timezone)
+    start_at = datetime.combine(start, time(0, 0), zone).astimezone(timezone.utc)
+    end_at = datetime.combine(end + timedelta(days=1), time(0, 0), zone).astimezone(timezone.utc)
+    now = datetime.now(timezone.utc)
+
+    curve = light_service.load_curve(db, indoor.id, start_at, min(end_at, now))
+    days = light_service.daily(curve, start, end, user.timezone, now)
+    parsed = light_service.parse_schedule(indoor.light_schedule)
+
+    return LightResponse(
+        start=start,
+        end=end,
+        current=LightScheduleInfo(
+            schedule=indoor.light_schedule,
+            on_hours=parsed.on_hours if parsed else None,
+            off_hours=parsed.off_hours if parsed else None,
+            on_at=parsed.on_at.strftime("%H:%M") if parsed else None,
+            power_pct=indoor.light_power_pct
+        ),
+        light_hours=round(sum(hours for _, hours, _ in days), 2),
+        dli=round(sum(dli for _, _, dli in days), 2),
+        days=[LightDay(day=day, light_hours=round(hours, 2), dli=round(dli, 2)) for day, hours, dli in days]
+    )
+
+
+def _owns_indoor(telegram_user_id: int, indoor_id: UUID) -> bool:
+    # Short-lived session: an open stream must not hold a DB connection
+    db = user_session(str(telegram_user_id))
+    try:
+        return db.query(Indoor.id).join(User).filter(
+            Indoor.id == indoor_id,
+            User.telegram_user_id == telegram_user_id
+        ).first() is not None
+    finally:
+        db.close()
+
+
+@router.get("/{indoor_id}/events")
+async def indoor_events(
+    indoor_id: str,
+    request: Request,
+    telegram_user_id: int | None = None
+):
+    """
+    Server-sent events with live changes of an indoor: `history`, `watering`,
+    `indoor_updated` and `resync` (client fell behind, refetch).
+    EventSource can't send headers, so the user may also come as a query param.
+    """
+    try:
+        indoor_uuid = UUID(indoor_id)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid indoor_id format")
+    
+    if telegram_user_id is None:
+        telegram_user_id = _get_telegram_user_id(request)
+    
+    # The shard lookup and the query block: off the event loop
+    if not await run_in_threadpool(_owns_indoor, telegram_user_id, indoor_uuid):
+        raise HTTPException(status_code=404, detail="Indoor not found")
+    
+    return StreamingResponse(
+        broker.stream(indoor_channel(indoor_uuid), request),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+
+@router.patch("/{indoor_id}", response_model=IndoorDetail, dependencies=[Depends(deadline(settings.write_deadline_seconds))])
+def update_indoor_detail(
     indoor_id: str,
     body: IndoorUpdateRequest,
     db: Session = Depends(get_db),
@@ -2,19 +2,28 @@
 Plants router
 """
 from datetime import date
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Query
 from sqlalchemy.orm import Session
-from app.database import get_db
+from app.database import ReleaseConnectionRoute, get_db, get_read_db
 from app.models import User
-from app.schemas import PlantWaterRequest, WaterResponseData, PlantResponse, WateringHistoryItem, PlantCreateRequest
-from app.api import get_current_user
+from app.schemas import (
+    PlantWaterRequest, WaterResponseData, PlantResponse, WateringHistoryItem, PlantCreateRequest, PlantWateringItem,
+    PlantSearchResult
+)
+from app.api import get_current_user, get_current_read_user
 from app.services.plant_service import register_watering
+from app.cache import cache
+from app.admission import deadline
+from app.config import settings
+from app.changefeed import emit_change
+from app.services import user_today
+from app.queries import indoor_belongs_to, fetch_plant_waterings
 
-router = APIRouter(prefix="/api/plants", tags=["plants"])
+router = APIRouter(prefix="/api/plants", tags=["plants"], route_class=ReleaseConnectionRoute)
 
 
-@router.post("", response_model=PlantResponse, status_code=201)
-async def create_plant(
+@router.post("", response_model=PlantResponse, status_code=201, dependencies=[Depends(deadline(settings.write_deadline_seconds))])
+def create_plant(
     body: PlantCreateRequest,
     db: Session = Depends(get_db),
     user: User = Depends(get_current_user)
@@ -24,16 +33,12 @@ async def create_plant(
     """
     from uuid import UUID
     from decimal import Decimal
-    from app.models import Plant, Indoor
+    from app.models import Plant
     from app.services import compute_next_water_at
     
     # Validate indoor_id if provided
     if body.indoor_id:
-        indoor = db.query(Indoor).filter(
-            Indoor.id == body.indoor_id,
-            Indoor.user_id == user.id
-        ).first()
-        if not indoor:
+        if not indoor_belongs_to(db, user.id, body.indoor_id):
             raise HTTPException(status_code=404, detail="Indoor not found")
     
     # Create plant
@@ -51,8 +56,11 @@ async def create_plant(
     )
     
     db.add(plant)
+    db.flush()
+    emit_change(db, "plants", user.id, plant.id)
     db.commit()
     db.refresh(plant)
+    cache.invalidate_user(user.id)
     
     return PlantResponse(
         id=plant.id,
@@ -65,8 +73,25 @@ async def create_plant(
     )
 
 
-@router.post("/{plant_id}/water", response_model=WaterResponseData)
-async def water_plant(
+@router.get("/search", response_model=list[PlantSearchResult], dependencies=[Depends(deadline(settings.read_deadline_seconds))])
+def search_plants(
+    q: str = Query(..., min_length=1, max_length=100),
+    limit: int = Query(10, ge=1, le=50),
+    db: Session = Depends(get_read_db),
+    user: User = Depends(get_current_read_user)
+):
+    """
+    Search the user's plants by name, species or notes, tolerating typos
+    and accents. Best matches first.
+    """
+    # Loaded with the first search, not at startup
+    from app.services.search_service import plant_search
+
+    return [PlantSearchResult.model_validate(hit) for hit in plant_search.search(db, user, q, limit)]
+
+
+@router.post("/{plant_id}/water", response_model=WaterResponseData, dependencies=[Depends(deadline(settings.write_deadline_seconds))])
+def water_plant(
     plant_id: str,
     body: PlantWaterRequest,
     db: Session = Depends(get_db),
@@ -83,7 +108,7 @@ async def water_plant(
         raise HTTPException(status_code=400, detail="Invalid plant_id format")
     
     # Use today if date not provided
-    event_date = body.date if body.date else date.today()
+    event_date = body.date if body.date else user_today(user)
     
     # Register watering
     plant, watering_history = register_watering(
@@ -107,13 +132,13 @@ async def water_plant(
         last_watered_at=plant.last_watered_at,
         next_water_at=plant.next_water_at,
         watering_interval_days=plant.watering_interval_days,
-        default_liters=float(plant.default_liters)
+        default_liters=plant.default_liters
     )
     
     watering_response = WateringHistoryItem(
         id=watering_history.id,
         event_ts=watering_history.event_ts,
-        liters=float(watering_history.liters),
+        liters=watering_history.liters,
         note=watering_history.note,
         ferts=watering_history.ferts
     )
@@ -122,3 +147,23 @@ async def water_plant(
         plant=plant_response,
         watering_history=watering_response
     )
+
+
+@router.get("/{plant_id}/waterings", response_model=list[PlantWateringItem], dependencies=[Depends(deadline(settings.read_deadline_seconds))])
+def get_plant_waterings(
+    plant_id: str,
+    limit: int = Query(50, ge=1, le=500),
+    db: Session = Depends(get_read_db),
+    user: User = Depends(get_current_read_user)
+):
+    """
+    Get the latest waterings of a plant, single or part of a session.
+    """
+    from uuid import UUID
+
+    try:
+        plant_uuid = UUID(plant_id)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid plant_id format")
+
+    return [PlantWateringItem.model_validate(entry) for entry in fetch_plant_waterings(db, user.id, plant_uuid, limit)]
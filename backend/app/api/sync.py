@@ -0,0 +1,76 @@
+"""
+Delta sync router
+"""
+from typing import Optional
+from fastapi import APIRouter, Depends, HTTPException, Query
+from sqlalchemy.orm import Session
+from app.config import settings
+from app.database import ReleaseConnectionRoute, get_db, get_read_db, replica_router
+from app.models import User
+from app.schemas import (
+    SyncResponse, IndoorDetail, SyncPlant, WateringSessionItem, SyncWatering, SyncIndoorHistory, SyncTombstone
+)
+from app.api import get_current_read_user
+from app.admission import deadline
+from app.services.sync_service import SyncTokenExpired, changes_since, snapshot
+
+router = APIRouter(prefix="/api", tags=["sync"], route_class=ReleaseConnectionRoute)
+
+SYNC_SCHEMAS = {
+    "indoors": IndoorDetail,
+    "plants": SyncPlant,
+    "watering_sessions": WateringSessionItem,
+    "watering_history": SyncWatering,
+    "indoor_history": SyncIndoorHistory,
+}
+
+
+def _changes_since(db: Session, primary_db: Session, user_id, since: int, limit: int) -> dict:
+    try:
+        return changes_since(db, user_id, since, limit)
+    except SyncTokenExpired:
+        if db.get_bind() not in replica_router.engines:
+            raise
+        # A lagging replica may not have reached the token yet: the primary decides
+        return changes_since(primary_db, user_id, since, limit)
+
+
+@router.get(
+    "/sync",
+    response_model=SyncResponse,
+    response_model_exclude_none=True,
+    dependencies=[Depends(deadline(settings.read_deadline_seconds))]
+)
+def sync(
+    since: Optional[str] = Query(None, description="Token of the previous sync; omit for a full snapshot"),
+    limit: int = Query(500, ge=1, le=5000),
+    db: Session = Depends(get_read_db),
+    primary_db: Session = Depends(get_db),
+    user: User = Depends(get_current_read_user)
+):
+    """
+    Get indoors, plants and history rows changed since `since`, plus
+    tombstones for deleted ones. Without `since` returns all indoors and
+    plants (`reset`); a token older than the change log, or ahead of it,
+    gets 410.
+    """
+    if since is None:
+        result = snapshot(db, user.id)
+    else:
+        try:
+            since_seq = int(since)
+            if since_seq < 0:
+                raise ValueError
+        except ValueError:
+            raise HTTPException(status_code=400, detail="Invalid sync token")
+        try:
+            result = _changes_since(db, primary_db, user.id, since_seq, limit)
+        except SyncTokenExpired:
+            raise HTTPException(status_code=410, detail="Sync token expired, sync again without since")
+
+    response = SyncResponse(token=str(result["token"]), reset=result["reset"], has_more=result["has_more"])
+    for table, rows in result["changes"].items():
+        setattr(response, table, [SYNC_SCHEMAS[table].model_validate(row) for row in rows])
+    if result["deleted"]:
+        response.deleted = [SyncTombstone(**item) for item in result["deleted"]]
+    return response
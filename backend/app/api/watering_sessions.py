@@ -0,0 +1,49 @@
+"""
+Watering sessions router
+"""
+from fastapi import APIRouter, Depends, HTTPException
+from sqlalchemy.orm import Session
+from app.config import settings
+from app.database import ReleaseConnectionRoute, get_db
+from app.models import User
+from app.schemas import WateringSessionRequest, WateringSessionResponse, WateringSessionItem, PlantResponse
+from app.api import get_current_user
+from app.admission import deadline
+from app.services import user_today
+from app.services.plant_service import register_watering_session
+
+router = APIRouter(prefix="/api/watering-sessions", tags=["watering-sessions"], route_class=ReleaseConnectionRoute)
+
+
+@router.post("", response_model=WateringSessionResponse, status_code=201, dependencies=[Depends(deadline(settings.write_deadline_seconds))])
+def create_watering_session(
+    body: WateringSessionRequest,
+    db: Session = Depends(get_db),
+    user: User = Depends(get_current_user)
+):
+    """
+    Water several plants with one mix: note and ferts are stored once for
+    the session, each plant gets its liters.
+    """
+    if not body.plants:
+        raise HTTPException(status_code=400, detail="plants must not be empty")
+    plant_ids = [item.plant_id for item in body.plants]
+    if len(set(plant_ids)) != len(plant_ids):
+        raise HTTPException(status_code=400, detail="Duplicate plant_id")
+
+    session, plants = register_watering_session(
+        db,
+        user.id,
+        [(item.plant_id, item.liters) for item in body.plants],
+        event_date=body.date if body.date else user_today(user),
+        note=body.note,
+        ferts=[f.dict() for f in body.ferts] if body.ferts else None
+    )
+
+    if not session:
+        raise HTTPException(status_code=404, detail="Plant not found")
+
+    return WateringSessionResponse(
+        session=WateringSessionItem.model_validate(session),
+        plants=[PlantResponse.model_validate(plant) for plant in plants]
+    )
@@ -0,0 +1,502 @@
+"""
+CPU time per request for the hot endpoints.
+
+Requests are served in-process through the ASGI app against the configured
+database, with the read model cache disabled, so the numbers are the
+Python-side cost of each handler (routing, queries, serialization).
+Run it on two commits to compare them:
+
+    CACHE_BACKEND=none python -m app.bench --requests 500
+
+`--rows N` instead loads the plants of an indoor with N plants as ORM
+entities and as read models, and reports CPU time and memory per row.
+
+`--calendar N` projects a year of waterings for N plants (no database),
+stepping each plant with compute_next_water_at and with app.services.
+calendar_service, and reports CPU time and response size.
+
+`--search N` indexes N plants of one user (no database) and reports search
+latency percentiles against scoring every plant.
+
+`--light N` builds N light periods (no database) and times range queries
+answered from the cumulative checkpoints against replaying every period.
+
+`--bot N` checks the bot's golden corpus, then parses N generated messages
+and resolves their names against 300 indexed plants (no database), and
+reports messages/sec.
+
+`--concurrency C` keeps C requests in flight per endpoint and reports how
+long each request holds a database connection, and so how many requests
+one connection serves per second. Compare releasing connections before
+rendering (the default) with holding them to the end, e.g. through a local
+PgBouncer in transaction mode:
+
+    DATABASE_URL=postgresql+psycopg://...@localhost:6432/plantulasdb DB_TRANSACTION_POOLER=true \
+        python -m app.bench --concurrency 32
+    DB_RELEASE_BEFORE_RENDER=false ... python -m app.bench --concurrency 32
+
+`--backends URL [URL ...]` runs the request bench once per database URL
+(each in its own process, after `python -m app.startup migrate`), to
+compare Postgres with the embedded SQLite mode:
+
+    python -m app.bench --backends postgresql+psycopg://... sqlite:////tmp/plantulas.db
+"""
+import asyncio
+import json
+import os
+import random
+import statistics
+import subprocess
+import sys
+import time
+import tracemalloc
+
+os.environ.setdefault("CACHE_BACKEND", "none")
+
+BENCH_USER_ID = 990000000 + random.randint(0, 999999)
+
+
+async def _call(app, method: str, path: str, body: dict | None = None) -> tuple[int, bytes]:
+    raw = json.dumps(body).encode() if body is not None else b""
+    messages = []
+
+    async def receive():
+        return {"type": "http.request", "body": raw, "more_body": False}
+
+    async def send(message):
+        messages.append(message)
+
+    path, _, query = path.partition("?")
+    scope = {
+        "type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1",
+        "method": method, "scheme": "http", "path": path, "raw_path": path.encode(),
+        "query_string": query.encode(), "root_path": "",
+        "headers": [
+            (b"x-telegram-userid", str(BENCH_USER_ID).encode()),
+            (b"content-type", b"application/json"),
+        ],
+        "client": ("127.0.0.1", 0), "server": ("127.0.0.1", 8000),
+    }
+    await app(scope, receive, send)
+    status = messages[0]["status"]
+    payload = b"".join(m.get("body", b"") for m in messages[1:])
+    return status, payload
+
+
+async def _seed(app) -> dict[str, str]:
+    """Create the bench user with an indoor and a few plants; returns the paths to hit"""
+    status, payload = await _call(app, "POST", "/api/indoors", {"name": "bench", "light_power_pct": 50})
+    assert status == 201, payload
+    indoor_id = json.loads(payload)["id"]
+    plant_id = None
+    for i in range(5):
+        status, payload = await _call(app, "POST", "/api/plants", {
+            "name": f"bench {i}", "indoor_id": indoor_id, "watering_interval_days": 3
+        })
+        assert status == 201, payload
+        plant_id = json.loads(payload)["id"]
+    return {
+        "dashboard": "/api/dashboard",
+        "indoors": "/api/indoors",
+        "indoor_detail": f"/api/indoors/{indoor_id}",
+        "water": f"/api/plants/{plant_id}/water",
+    }
+
+
+async def _cleanup() -> None:
+    from app.database import user_session
+    from app.models import User
+
+    db = user_session(str(BENCH_USER_ID))
+    try:
+        user = db.query(User).filter(User.telegram_user_id == BENCH_USER_ID).first()
+        if user:
+            db.delete(user)
+            db.commit()
+    finally:
+        db.close()
+
+
+async def run(requests: int) -> None:
+    from app.main import app
+
+    async with app.router.lifespan_context(app):
+        paths = await _seed(app)
+        try:
+            print(f"{'endpoint':<16}{'cpu ms/req':>12}{'p50 ms':>10}{'p95 ms':>10}{'wall ms/req':>13}")
+            for name, path in paths.items():
+                method, body = ("POST", {"liters": 1.0}) if name == "water" else ("GET", None)
+                for _ in range(min(20, requests)):  # warm compiled and prepared statements
+                    await _call(app, method, path, body)
+
+                cpu_samples = []
+                wall_started = time.perf_counter()
+                for _ in range(requests):
+                    cpu_started = time.process_time()
+                    status, payload = await _call(app, method, path, body)
+                    cpu_samples.append((time.process_time() - cpu_started) * 1000)
+                    assert status < 400, payload
+                wall = (time.perf_counter() - wall_started) * 1000 / requests
+
+                cpu_samples.sort()
+                print(
+                    f"{name:<16}{statistics.fmean(cpu_samples):>12.3f}"
+                    f"{cpu_samples[len(cpu_samples) // 2]:>10.3f}"
+                    f"{cpu_samples[int(len(cpu_samples) * 0.95)]:>10.3f}{wall:>13.3f}"
+                )
+        finally:
+            await _cleanup()
+
+
+async def run_concurrent(requests: int, concurrency: int) -> None:
+    from app.database import pool_stats
+    from app.main import app
+
+    async with app.router.lifespan_context(app):
+        paths = await _seed(app)
+        try:
+            print(f"{'endpoint':<16}{'req/s':>10}{'p95 ms':>10}{'conn ms/req':>13}{'req/conn/s':>12}")
+            for name, path in paths.items():
+                method, body = ("POST", {"liters": 1.0}) if name == "water" else ("GET", None)
+                for _ in range(min(20, requests)):
+                    await _call(app, method, path, body)
+
+                latencies = []
+                pending = iter(range(requests))
+
+                async def client():
+                    for _ in pending:
+                        started = time.perf_counter()
+                        status, payload = await _call(app, method, path, body)
+                        latencies.append((time.perf_counter() - started) * 1000)
+                        assert status < 400, payload
+
+                before = pool_stats()
+                wall_started = time.perf_counter()
+                await asyncio.gather(*(client() for _ in range(concurrency)))
+                wall = time.perf_counter() - wall_started
+                after = pool_stats()
+                # Checkouts of this endpoint: checkins x average hold, before and after
+                held = after["held_ms_avg"] * after["checkins"] - before["held_ms_avg"] * before["checkins"]
+
+                latencies.sort()
+                print(
+                    f"{name:<16}{requests / wall:>10.0f}{latencies[int(len(latencies) * 0.95)]:>10.2f}"
+                    f"{held / requests:>13.3f}{requests * 1000 / held if held else 0:>12.0f}"
+                )
+        finally:
+            await _cleanup()
+
+
+def backends(urls: list[str], requests: int) -> None:
+    """The request bench against each database, in a fresh process"""
+    for url in urls:
+        env = {**os.environ, "DATABASE_URL": url}
+        print(f"\n== {url.split('@')[-1]}")
+        subprocess.run([sys.executable, "-m", "app.startup", "migrate"], env=env, check=True, stdout=subprocess.DEVNULL)
+        subprocess.run([sys.executable, "-m", "app.bench", "--requests", str(requests)], env=env, check=True)
+
+
+def _measure(load) -> tuple[float, float, list]:
+    """(cpu ms, KiB allocated and still held) for one call of `load`"""
+    tracemalloc.start()
+    cpu_started = time.process_time()
+    result = load()
+    cpu = (time.process_time() - cpu_started) * 1000
+    held, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return cpu, held / 1024, result
+
+
+def rows(count: int) -> None:
+    import uuid
+    from sqlalchemy import insert
+    from app.database import SessionLocal
+    from app.models import User, Indoor, Plant
+    from app.queries import fetch_indoor_plants
+
+    db = SessionLocal()
+    user = User(telegram_user_id=BENCH_USER_ID)
+    indoor = Indoor(user=user, name="bench")
+    db.add_all([user, indoor])
+    db.commit()
+    indoor_id = indoor.id
+    try:
+        db.execute(insert(Plant), [
+            {"id": uuid.uuid4(), "user_id": user.id, "indoor_id": indoor_id, "name": f"bench {i}",
+             "watering_interval_days": 3, "default_liters": 1.5}
+            for i in range(count)
+        ])
+        db.commit()
+
+        print(f"{'loader':<14}{'cpu ms':>10}{'us/row':>10}{'KiB':>10}{'bytes/row':>11}")
+        loaders = {
+            "orm": lambda: db.query(Plant).filter(Plant.indoor_id == indoor_id).all(),
+            "read models": lambda: fetch_indoor_plants(db, indoor_id),
+        }
+        for name, load in loaders.items():
+            load()  # compile and warm up
+            db.expunge_all()
+            cpu, kib, result = _measure(load)
+            assert len(result) == count
+            print(f"{name:<14}{cpu:>10.1f}{cpu * 1000 / count:>10.2f}{kib:>10.0f}{kib * 1024 / count:>11.0f}")
+            del result
+            db.expunge_all()
+    finally:
+        db.rollback()
+        db.query(User).filter(User.telegram_user_id == BENCH_USER_ID).delete()
+        db.commit()
+        db.close()
+
+
+def calendar(count: int, days: int = 365) -> None:
+    import uuid
+    from datetime import date, timedelta
+    from app.read_models import PlantCalendarEntry
+    from app.schemas import CalendarResponse, CalendarPlant, CalendarDay
+    from app.services.calendar_service import project, project_naive
+
+    rng = random.Random(42)
+    today = date(2026, 1, 1)
+    start, end = today, today + timedelta(days=days - 1)
+    plants = [
+        PlantCalendarEntry(
+            uuid.uuid4(), f"bench {i}", None,
+            today + timedelta(days=rng.randint(-5, 14)), rng.choice((1, 2, 3, 4, 5, 7, 10, 14))
+        )
+        for i in range(count)
+    ]
+
+    def build():
+        groups, buckets = project(plants, today, start, end)
+        return CalendarResponse(
+            start=start, end=end,
+            plants=[CalendarPlant(id=p.id, name=p.name, indoor_id=p.indoor_id) for p in plants],
+            groups=groups,
+            days=[CalendarDay(date=day, groups=g, count=n) for day, g, n in buckets]
+        ).model_dump_json()
+
+    naive = project_naive(plants, today, start, end)
+    groups, buckets = project(plants, today, start, end)
+    assert {day: sorted(i for g in day_groups for i in groups[g]) for day, day_groups, _ in buckets} == \
+        {day: sorted(indexes) for day, indexes in naive.items()}, "projections differ"
+
+    print(f"{count} plants, {days} days, {sum(len(v) for v in naive.values())} waterings, {len(groups)} groups")
+    print(f"{'projection':<26}{'cpu ms':>10}")
+    for name, fn in (
+        ("compute_next_water_at", lambda: project_naive(plants, today, start, end)),
+        ("arithmetic (grouped)", lambda: project(plants, today, start, end)),
+        ("arithmetic + JSON", build),
+    ):
+        samples = []
+        for _ in range(5):
+            started = time.process_time()
+            fn()
+            samples.append((time.process_time() - started) * 1000)
+        print(f"{name:<26}{min(samples):>10.1f}")
+    print(f"response: {len(build()) / 1024:.0f} KiB")
+
+
+def search(count: int, queries: int = 2000) -> None:
+    import uuid
+    from collections import namedtuple
+    from app.services.search_service import UserIndex, normalize, trigrams, _score
+
+    rng = random.Random(42)
+    genera = ("Monstera", "Albahaca", "Pothos", "Ficus", "Limón", "Tomate", "Lavanda", "Romero", "Aloe", "Helecho",
+              "Orquídea", "Cactus", "Menta", "Perejil", "Frutilla", "Pimiento", "Calathea", "Begonia", "Jazmín", "Potus")
+    words = ("grande", "chica", "del balcón", "cocina", "norte", "sur", "nueva", "vieja", "roja", "verde")
+    Row = namedtuple("Row", "id name species indoor_id notes")
+    rows = [
+        Row(uuid.uuid4(), f"{rng.choice(genera)} {rng.choice(words)} {i}", rng.choice(genera).lower(), None,
+            rng.choice((None, "regar con agua de lluvia", "poda en primavera", "trasplantar")))
+        for i in range(count)
+    ]
+    started = time.process_time()
+    index = UserIndex(0)
+    for row in rows:
+        index.upsert(row)
+    build_ms = (time.process_time() - started) * 1000
+
+    def typo(word: str) -> str:
+        position = rng.randrange(len(word))
+        return word[:position] + word[position + 1:] if len(word) > 4 else word
+
+    terms = [rng.choice((lambda g: g.lower(), typo, lambda g: g[:3].lower()))(rng.choice(genera)) for _ in range(queries)]
+
+    def scan(query: str) -> list:
+        query = normalize(query)
+        grams = trigrams(query)
+        return sorted(((_score(query, grams, doc), doc.name) for doc in index.docs.values()), reverse=True)[:10]
+
+    for term in terms[:200]:
+        query = normalize(term)
+        scored = sorted(
+            (-_score(query, trigrams(query), doc), doc.name) for doc in index.docs.values()
+        )
+        expected = [(name, round(-score, 3)) for score, name in scored if -score >= 0.3][:10]
+        assert [(hit.name, hit.score) for hit in index.search(term, 10)] == expected, term
+
+    print(f"{count} plants, {queries} queries, index built in {build_ms:.0f} ms")
+    print(f"{'search':<26}{'p50 ms':>10}{'p99 ms':>10}")
+    for name, fn in (("score every plant", scan), ("trigram index", lambda q: index.search(q, 10))):
+        samples = []
+        for term in terms[: queries if name == "trigram index" else min(queries, 200)]:
+            started = time.perf_counter()
+            fn(term)
+            samples.append((time.perf_counter() - started) * 1000)
+        samples.sort()
+        print(f"{name:<26}{samples[len(samples) // 2]:>10.2f}{samples[int(len(samples) * 0.99)]:>10.2f}")
+
+
+def light(count: int, queries: int = 1000) -> None:
+    from datetime import datetime, timedelta, timezone
+    from app.read_models import LightPeriodView
+    from app.services.light_service import LightCurve, parse_schedule, cycle_start, _accumulated
+
+    rng = random.Random(42)
+    at = datetime(2024, 1, 1, tzinfo=timezone.utc)
+    periods, hours, dli = [], 0.0, 0.0
+    for _ in range(count):
+        text = rng.choice(("18/6", "20/4", "12/12 08:00", "06:00-00:00", "6/2", "nada"))
+        parsed = parse_schedule(text)
+        period = LightPeriodView(
+            at, text, parsed and parsed.on_minutes, parsed and parsed.off_minutes,
+            parsed and cycle_start(parsed, at, "UTC"), rng.choice((None, 25, 50, 75, 100)), hours, dli
+        )
+        periods.append(period)
+        at += timedelta(minutes=rng.randint(30, 60 * 24 * 5))
+        hours, dli = _accumulated(period, at)
+    curve = LightCurve(periods)
+    span = (at - periods[0].starts_at).total_seconds()
+    ranges = []
+    for _ in range(queries):
+        a, b = sorted(rng.uniform(0, span) for _ in range(2))
+        ranges.append((periods[0].starts_at + timedelta(seconds=a), periods[0].starts_at + timedelta(seconds=b)))
+
+    def replay(start, end):
+        total_hours = total_dli = 0.0
+        for index, period in enumerate(periods):
+            period_end = periods[index + 1].starts_at if index + 1 < len(periods) else end
+            lo, hi = max(start, period.starts_at), min(end, period_end)
+            if lo < hi:
+                base = _accumulated(period, lo)
+                top = _accumulated(period, hi)
+                total_hours += top[0] - base[0]
+                total_dli += top[1] - base[1]
+        return total_hours, total_dli
+
+    def minutes(start, end):
+        lit = 0
+        ts = start
+        while ts < end:
+            index = max(i for i, period in enumerate(periods) if period.starts_at <= ts)
+            period = periods[index]
+            if period.on_minutes is not None:
+                offset = (ts - period.cycle_start).total_seconds() // 60 % (period.on_minutes + period.off_minutes)
+                lit += offset < period.on_minutes
+            ts += timedelta(minutes=1)
+        return lit / 60
+
+    for start, end in ranges[:3]:
+        start = start.replace(second=0, microsecond=0)
+        end = min(end, start + timedelta(days=3)).replace(second=0, microsecond=0)
+        expected = minutes(start, end)
+        assert abs(curve.between(start, end)[0] - expected) < 0.05, (curve.between(start, end), expected)
+    for start, end in ranges:
+        fast, slow = curve.between(start, end), replay(start, end)
+        assert abs(fast[0] - slow[0]) < 1e-6 and abs(fast[1] - slow[1]) < 1e-6, (fast, slow)
+
+    print(f"{count} periods, {queries} range queries")
+    print(f"{'engine':<26}{'cpu ms':>10}")
+    for name, fn in (
+        ("replay every period", lambda: [replay(start, end) for start, end in ranges]),
+        ("cumulative checkpoints", lambda: [curve.between(start, end) for start, end in ranges]),
+    ):
+        started = time.process_time()
+        fn()
+        print(f"{name:<26}{(time.process_time() - started) * 1000:>10.1f}")
+
+
+def bot(count: int, plants: int = 300) -> None:
+    import uuid
+    from collections import namedtuple
+    from app.services import bot_service
+    from app.services.bot_service import IndoorName, IndoorNames, parse, pick
+    from app.services.search_service import UserIndex, normalize, trigrams
+
+    failures = bot_service.check_corpus(bot_service.load_corpus())
+    assert not failures, "\n".join(failures)
+
+    rng = random.Random(42)
+    genera = ("Monstera", "Albahaca", "Pothos", "Ficus", "Limón", "Tomate", "Lavanda", "Romero", "Aloe", "Helecho")
+    Row = namedtuple("Row", "id name species indoor_id notes")
+    index = UserIndex(0)
+    names = [f"{rng.choice(genera)} {i}" for i in range(plants)]
+    for name in names:
+        index.upsert(Row(uuid.uuid4(), name, None, None, None))
+    indoors = [
+        IndoorName(uuid.uuid4(), name, normalize(name), frozenset(trigrams(normalize(name))))
+        for name in ("Carpa grande", "Carpa chica", "Balcón", "Esquejes")
+    ]
+    templates = (
+        lambda: f"regué la {rng.choice(names)} con {rng.randint(1, 9) / 2:g} litros".replace(".", ","),
+        lambda: f"le di agua a {rng.choice(names)} y a {rng.choice(names)} ayer",
+        lambda: f"regué todas las plantas de {rng.choice(indoors).name} con 2 ml/l de Bio Grow",
+        lambda: f"poné la luz al {rng.randint(10, 100)}% en la {rng.choice(indoors).name}",
+        lambda: f"cambiá el fotoperiodo de {rng.choice(indoors).name} a {rng.choice(('18/6', '12/12', '20/4'))}",
+        lambda: f"¿cuándo riego la {rng.choice(names)}?",
+        lambda: "¿qué toca regar hoy?",
+    )
+    messages = [rng.choice(templates)() for _ in range(count)]
+
+    def resolve(message: str) -> None:
+        command = parse(message)
+        for ref in command.targets:
+            pick(ref, "plant", index.search(ref, 5))
+        if command.indoor:
+            pick(command.indoor, "indoor", IndoorNames.match(indoors, command.indoor))
+
+    print(f"{count} messages, {plants} plants")
+    print(f"{'stage':<26}{'msgs/sec':>12}{'p99 us':>10}")
+    for name, fn in (("parse", parse), ("parse + resolve names", resolve)):
+        samples = []
+        started = time.process_time()
+        for message in messages:
+            began = time.perf_counter()
+            fn(message)
+            samples.append((time.perf_counter() - began) * 1e6)
+        elapsed = time.process_time() - started
+        samples.sort()
+        print(f"{name:<26}{count / elapsed:>12.0f}{samples[int(len(samples) * 0.99)]:>10.0f}")
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="CPU time per request for the hot endpoints")
+    parser.add_argument("--requests", type=int, default=500, help="requests per endpoint")
+    parser.add_argument("--rows", type=int, help="compare ORM and read model loading of N plants")
+    parser.add_argument("--calendar", type=int, help="project a year of waterings for N plants")
+    parser.add_argument("--light", type=int, help="light hours over ranges of N light periods")
+    parser.add_argument("--search", type=int, help="search among N plants of one user")
+    parser.add_argument("--bot", type=int, help="parse and resolve N bot messages")
+    parser.add_argument("--backends", nargs="+", metavar="URL", help="request bench against each database URL")
+    parser.add_argument("--concurrency", type=int, help="requests in flight; reports connection time per request")
+    args = parser.parse_args()
+    if args.backends:
+        backends(args.backends, args.requests)
+    elif args.bot:
+        bot(args.bot)
+    elif args.search:
+        search(args.search)
+    elif args.light:
+        light(args.light)
+    elif args.calendar:
+        calendar(args.calendar)
+    elif args.rows:
+        rows(args.rows)
+    elif args.concurrency:
+        asyncio.run(run_concurrent(args.requests, args.concurrency))
+    else:
+        asyncio.run(run(args.requests))
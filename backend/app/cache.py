@@ -0,0 +1,261 @@
+"""
+Read-model cache shared by the GET endpoints.
+
+Values are stored as JSON so the same code works with the in-process LRU
+and with a shared backend (Redis) used by several uvicorn workers.
+Keys live in a per-user namespace; invalidating a user bumps the namespace
+version so every key of that user becomes unreachable at once.
+"""
+import asyncio
+import itertools
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable
+from uuid import UUID
+
+from pydantic import TypeAdapter
+from starlette.concurrency import run_in_threadpool
+
+from app.config import settings
+from app.metrics import metrics
+
+
+class MemoryBackend:
+    """
+    In-process LRU with per-entry expiry.
+
+    Namespace versions are an LRU of their own, as large as the data one.
+    Versions come from one increasing sequence, so a version that was
+    evicted (or never set) is replaced by one no key was ever stored under.
+    """
+
+    def __init__(self, max_entries: int):
+        self.max_entries = max_entries
+        self._data: OrderedDict[str, tuple[float, Any]] = OrderedDict()
+        # Kept apart so evicting data can't reset a version
+        self._counters: OrderedDict[str, int] = OrderedDict()
+        self._versions = itertools.count(1)
+        self._lock = threading.Lock()
+
+    def get(self, key: str):
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                return None
+            expires_at, value = item
+            if expires_at and expires_at <= time.monotonic():
+                del self._data[key]
+                return None
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key: str, value, ttl: float | None = None) -> None:
+        expires_at = time.monotonic() + ttl if ttl else 0.0
+        with self._lock:
+            self._data[key] = (expires_at, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+
+    def add(self, key: str, value, ttl: float | None = None) -> bool:
+        """Set only if the key is missing. Returns True if it was set."""
+        with self._lock:
+            item = self._data.get(key)
+            if item is not None and (not item[0] or item[0] > time.monotonic()):
+                return False
+        self.set(key, value, ttl)
+        return True
+
+    def delete(self, key: str) -> None:
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+
+    def counter(self, key: str) -> int:
+        with self._lock:
+            value = self._counters.get(key)
+            if value is None:
+                return self._new_version(key)
+            self._counters.move_to_end(key)
+            return value
+
+    def incr(self, key: str) -> int:
+        with self._lock:
+            return self._new_version(key)
+
+    def _new_version(self, key: str) -> int:
+        value = self._counters[key] = next(self._versions)
+        self._counters.move_to_end(key)
+        while len(self._counters) > max(self.max_entries, 1):
+            self._counters.popitem(last=False)
+        return value
+
+
+class RedisBackend:
+    """Shared backend for multi-worker deployments (requires the redis package)"""
+
+    def __init__(self, url: str, client=None):
+        if client is None:
+            try:
+                import redis
+            except ImportError as e:
+                raise RuntimeError("CACHE_BACKEND=redis requires `pip install redis`") from e
+            client = redis.Redis.from_url(url)
+        # Any client with the redis-py API works, e.g. fakeredis.FakeRedis()
+        self.client = client
+
+    def get(self, key: str):
+        value = self.client.get(key)
+        return value.decode() if isinstance(value, bytes) else value
+
+    def set(self, key: str, value, ttl: float | None = None) -> None:
+        self.client.set(key, value, px=int(ttl * 1000) if ttl else None)
+
+    def add(self, key: str, value, ttl: float | None = None) -> bool:
+        return bool(self.client.set(key, value, nx=True, px=int(ttl * 1000) if ttl else None))
+
+    def delete(self, key: str) -> None:
+        self.client.delete(key)
+
+    def clear(self) -> None:
+        # The shared backend never misses invalidations, nothing to resync
+        pass
+
+    def counter(self, key: str) -> int:
+        return int(self.client.get(key) or 0)
+
+    def incr(self, key: str) -> int:
+        return int(self.client.incr(key))
+
+
+class ReadModelCache:
+    """
+    Per-user cache of computed responses with stampede protection.
+
+    Only one loader per key runs at a time: other callers wait up to
+    `lock_wait` seconds for the value before loading it themselves.
+    """
+
+    def __init__(self, backend, ttl: float, prefix: str = "plantulas", lock_wait: float = 0.5):
+        self.backend = backend
+        self.ttl = ttl
+        self.prefix = prefix
+        self.lock_wait = lock_wait
+        self._adapters: dict[Any, TypeAdapter] = {}
+        self.hits = 0
+        self.misses = 0
+        self.loads = 0
+        self.invalidations = 0
+        self.stampede_waits = 0
+        self.stampede_coalesced = 0
+
+    def _adapter(self, type_) -> TypeAdapter:
+        adapter = self._adapters.get(type_)
+        if adapter is None:
+            adapter = self._adapters[type_] = TypeAdapter(type_)
+        return adapter
+
+    def _namespace(self, user_id: UUID) -> str:
+        version = self.backend.counter(f"{self.prefix}:u:{user_id}:ver")
+        return f"{self.prefix}:u:{user_id}:v{version}"
+
+    async def get_or_load(
+        self,
+        user_id: UUID,
+        name: str,
+        type_,
+        loader: Callable[[], Any],
+        ttl: float | None = None,
+    ):
+        """
+        Return the cached value of `name` for the user or compute it with `loader`.
+        `ttl` overrides the default expiry for this entry.
+        """
+        adapter = self._adapter(type_)
+        key = f"{self._namespace(user_id)}:{name}"
+
+        raw = self.backend.get(key)
+        if raw is not None:
+            self.hits += 1
+            metrics.inc("cache_hits")
+            return adapter.validate_json(raw)
+        self.misses += 1
+        metrics.inc("cache_misses")
+
+        lock_key = f"{key}:lock"
+        if not self.backend.add(lock_key, "1", ttl=max(self.lock_wait * 4, 1.0)):
+            # Someone else is loading this key: wait for their result
+            self.stampede_waits += 1
+            deadline = time.monotonic() + self.lock_wait
+            while time.monotonic() < deadline:
+                await asyncio.sleep(0.02)
+                raw = self.backend.get(key)
+                if raw is not None:
+                    self.stampede_coalesced += 1
+                    return adapter.validate_json(raw)
+
+        try:
+            # Loaders query the database: keep the event loop free meanwhile
+            value = await run_in_threadpool(loader)
+            self.loads += 1
+            self.backend.set(key, adapter.dump_json(value).decode(), ttl=ttl or self.ttl)
+        finally:
+            self.backend.delete(lock_key)
+        return value
+
+    def invalidate_user(self, user_id: UUID) -> None:
+        """Drop every cached read model of the user"""
+        self.backend.incr(f"{self.prefix}:u:{user_id}:ver")
+        self.invalidations += 1
+
+    def clear(self) -> None:
+        """Drop everything (e.g. after missing invalidations)"""
+        self.backend.clear()
+        self.invalidations += 1
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "backend": type(self.backend).__name__,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            "loads": self.loads,
+            "invalidations": self.invalidations,
+            "stampede_waits": self.stampede_waits,
+            "stampede_coalesced": self.stampede_coalesced,
+        }
+
+
+class NullBackend(MemoryBackend):
+    """Disables caching (CACHE_BACKEND=none)"""
+
+    def __init__(self):
+        super().__init__(max_entries=0)
+
+    def get(self, key: str):
+        return None
+
+    def add(self, key: str, value, ttl: float | None = None) -> bool:
+        return True
+
+    def counter(self, key: str) -> int:
+        return 0
+
+    def incr(self, key: str) -> int:
+        return 0
+
+
+def build_backend(name: str):
+    if name == "redis":
+        return RedisBackend(settings.cache_url)
+    if name == "none":
+        return NullBackend()
+    return MemoryBackend(settings.cache_max_entries)
+
+
+cache = ReadModelCache(build_backend(settings.cache_backend), ttl=settings.cache_ttl_seconds)
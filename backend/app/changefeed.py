@@ -0,0 +1,240 @@
+"""
+Change feed over Postgres LISTEN/NOTIFY.
+
+Write paths call `emit_change()` inside their transaction, so the NOTIFY is
+only delivered if the transaction commits. Every process runs one listener
+that collects notifications for a short window, de-duplicates them and hands
+the batch to the registered callbacks (e.g. to drop per-process caches).
+The same listener carries other channels too (`listen()`, used by the SSE
+events transport), so a worker keeps one LISTEN connection per shard and
+one reconnect path.
+
+Run `python -m app.changefeed --bench 10000` against a local Postgres to
+measure end-to-end throughput.
+"""
+import asyncio
+import json
+import logging
+import time
+import uuid
+from typing import Callable, Iterable, NamedTuple
+
+from sqlalchemy import text
+from sqlalchemy.engine import make_url
+from sqlalchemy.orm import Session
+
+from app.config import settings
+from app.database import direct_urls
+from app.services.sync_service import log_changes
+
+logger = logging.getLogger(__name__)
+
+CHANNEL = "plantulas_changes"
+
+# Identifies this process so it can skip its own notifications
+ORIGIN = uuid.uuid4().hex[:8]
+
+
+class Change(NamedTuple):
+    table: str
+    user_id: str
+    entity_id: str | None
+    # X-Telegram-UserId of the request that wrote (read-your-writes on other workers)
+    rw_key: str | None = None
+
+
+def emit_change(db: Session, table: str, user_id, entity_id=None, op: str = "upsert") -> None:
+    """
+    Record a change in the session's transaction: logged for delta sync
+    (GET /api/sync) and notified to other processes on commit.
+    """
+    if entity_id is not None:
+        log_changes(db, table, user_id, [entity_id], op)
+    if not settings.change_feed_enabled or db.get_bind().dialect.name != "postgresql":
+        return
+    payload = json.dumps(
+        [table, str(user_id), str(entity_id) if entity_id else None, ORIGIN, db.info.get("rw_key")],
+        separators=(",", ":")
+    )
+    db.execute(text("SELECT pg_notify(:channel, :payload)"), {"channel": CHANNEL, "payload": payload})
+
+
+class ChangeFeed:
+    """
+    Per-process listener that fans coalesced changes out to callbacks.
+
+    Callbacks get a list of unique Change tuples. After a reconnect, changes
+    may have been missed, so callbacks registered with `on_resync` run too.
+    """
+
+    def __init__(self, database_urls: list[str], coalesce_seconds: float, skip_own: bool = True):
+        # psycopg wants plain libpq URLs, without the SQLAlchemy driver suffix
+        self.dsns = [
+            make_url(url).set(drivername="postgresql").render_as_string(hide_password=False)
+            for url in database_urls
+        ]
+        self.coalesce_seconds = coalesce_seconds
+        self.skip_own = skip_own
+        self._callbacks: list[tuple[Callable[[list[Change]], None], set[str] | None]] = []
+        self._resync_callbacks: list[Callable[[], None]] = []
+        self._channels: dict[str, Callable[[str], None]] = {}
+        self._pending: dict[Change, None] = {}
+        self._wakeup = asyncio.Event()
+        self._tasks: list[asyncio.Task] = []
+        self.received = 0
+        self.delivered = 0
+        self.reconnects = 0
+
+    def register(self, callback: Callable[[list[Change]], None], tables: Iterable[str] | None = None) -> None:
+        self._callbacks.append((callback, set(tables) if tables else None))
+
+    def on_resync(self, callback: Callable[[], None]) -> None:
+        self._resync_callbacks.append(callback)
+
+    def listen(self, channel: str, callback: Callable[[str], None]) -> None:
+        """Also LISTEN on `channel`, passing each payload to callback as it arrives (not coalesced)"""
+        self._channels[channel] = callback
+
+    async def start(self) -> None:
+        self._wakeup = asyncio.Event()
+        # One listener per shard: writes notify on the database they commit to
+        self._tasks = [asyncio.create_task(self._listen(dsn)) for dsn in self.dsns]
+        self._tasks.append(asyncio.create_task(self._dispatch()))
+
+    async def stop(self) -> None:
+        for task in self._tasks:
+            task.cancel()
+        for task in self._tasks:
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+        self._tasks = []
+        self._flush()
+
+    async def _listen(self, dsn: str) -> None:
+        import psycopg
+
+        backoff = 1.0
+        connected_before = False
+        while True:
+            try:
+                async with await psycopg.AsyncConnection.connect(dsn, autocommit=True) as conn:
+                    for channel in (CHANNEL, *self._channels):
+                        await conn.execute(f"LISTEN {channel}")
+                    if connected_before:
+                        self.reconnects += 1
+                        self._resync()
+                    connected_before = True
+                    backoff = 1.0
+                    async for notify in conn.notifies():
+                        if notify.channel == CHANNEL:
+                            self._receive(notify.payload)
+                        else:
+                            self._channels[notify.channel](notify.payload)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning("Change feed disconnected (%s), retrying in %.0fs", e, backoff)
+                await asyncio.sleep(backoff)
+                backoff = min(backoff * 2, 30.0)
+
+    def _receive(self, payload: str) -> None:
+        try:
+            table, user_id, entity_id, origin, *rest = json.loads(payload)
+        except ValueError:
+            return
+        self.received += 1
+        if self.skip_own and origin == ORIGIN:
+            return
+        self._pending[Change(table, user_id, entity_id, rest[0] if rest else None)] = None
+        self._wakeup.set()
+
+    async def _dispatch(self) -> None:
+        while True:
+            await self._wakeup.wait()
+            # Let a burst accumulate so repeated changes are delivered once
+            await asyncio.sleep(self.coalesce_seconds)
+            self._wakeup.clear()
+            self._flush()
+
+    def _flush(self) -> None:
+        if not self._pending:
+            return
+        batch = list(self._pending)
+        self._pending.clear()
+        self.delivered += len(batch)
+        for callback, tables in self._callbacks:
+            selected = batch if tables is None else [c for c in batch if c.table in tables]
+            if not selected:
+                continue
+            try:
+                callback(selected)
+            except Exception:
+                logger.exception("Change feed callback failed")
+
+    def _resync(self) -> None:
+        for callback in self._resync_callbacks:
+            try:
+                callback()
+            except Exception:
+                logger.exception("Change feed resync callback failed")
+
+    def stats(self) -> dict:
+        return {
+            "received": self.received,
+            "delivered": self.delivered,
+            "reconnects": self.reconnects,
+        }
+
+
+change_feed = ChangeFeed(
+    direct_urls(),
+    coalesce_seconds=settings.change_feed_coalesce_ms / 1000,
+)
+
+
+async def _bench(count: int) -> None:
+    """Emit `count` changes from one session and time their arrival at the listener"""
+    from app.database import SessionLocal
+
+    feed = ChangeFeed([settings.database_url], coalesce_seconds=0.0, skip_own=False)
+    seen = 0
+    done = asyncio.Event()
+
+    def on_changes(batch: list[Change]) -> None:
+        nonlocal seen
+        seen += len(batch)
+        if seen >= count:
+            done.set()
+
+    feed.register(on_changes)
+    await feed.start()
+    await asyncio.sleep(0.5)
+
+    settings.change_feed_enabled = True
+    user_id = uuid.uuid4()
+    db = SessionLocal()
+    start = time.perf_counter()
+    try:
+        for i in range(count):
+            emit_change(db, "bench", user_id, i)
+        db.commit()
+        emitted = time.perf_counter()
+        await asyncio.wait_for(done.wait(), timeout=60)
+    finally:
+        db.close()
+        await feed.stop()
+    received = time.perf_counter()
+
+    print(f"emit:    {count / (emitted - start):,.0f} changes/s")
+    print(f"deliver: {count / (received - start):,.0f} changes/s end-to-end")
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Change feed throughput benchmark")
+    parser.add_argument("--bench", type=int, default=10000, help="number of changes to emit")
+    args = parser.parse_args()
+    asyncio.run(_bench(args.bench))
@@ -9,11 +9,115 @@ class Settings(BaseSettings):
     # Accept both JSON list or CSV string from env to avoid parsing issues on hosts
     cors_origins: Union[List[str], str] = ["http://localhost:5173"]
     db_echo: bool = False
+    # Optional read replicas (JSON list or CSV string). Empty = everything on the primary
+    database_read_url: Union[List[str], str] = []
+    # Reads from a user within this window after their own write stay on the primary
+    read_your_writes_seconds: float = 5.0
+    # How long a failing replica is skipped before it is probed again
+    replica_retry_seconds: float = 30.0
+    # Read-model cache: "memory" (per process), "redis" (shared, uses cache_url) or "none"
+    cache_backend: str = "memory"
+    cache_url: str = "redis://localhost:6379/0"
+    cache_ttl_seconds: float = 60.0
+    cache_max_entries: int = 10000
+    # Dashboard cache: "midnight" expires at the user's next local midnight,
+    # "rebase" keeps the entry across days and shifts due_in_days arithmetically
+    dashboard_cache_mode: str = "midnight"
+    # Upper bound for dashboard entries (they are also dropped on every mutation)
+    dashboard_cache_ttl_seconds: float = 86400.0
+    # Live updates (SSE): "local" (single process) or "postgres" (NOTIFY across
+    # workers, received by the change feed listener even when it is disabled)
+    events_transport: str = "local"
+    events_queue_size: int = 100
+    events_heartbeat_seconds: float = 15.0
+    # Cross-process change feed (Postgres LISTEN/NOTIFY) used to drop per-process caches
+    change_feed_enabled: bool = False
+    change_feed_coalesce_ms: float = 50.0
+    # Idempotency-Key store: how long responses are kept, and how long a retry
+    # waits for a first request that is still running
+    idempotency_ttl_seconds: float = 86400.0
+    idempotency_wait_seconds: float = 10.0
+    # Write-behind for indoor PATCHes: coalescing window (0 = write immediately)
+    # and the local append-only journal that keeps pending updates across restarts
+    # (a relative path starts at the backend directory)
+    indoor_write_behind_ms: float = 0.0
+    indoor_write_journal: str = "indoor_updates.journal"
+    # Connections opened (and hot queries compiled) at startup, 0 = skip
+    db_pool_prewarm: int = 2
+    # psycopg: executions of the same query on a connection before it is
+    # prepared server-side (0 = always, empty = never, e.g. behind PgBouncer)
+    db_prepare_threshold: int | None = 5
+    # Behind a transaction pooler (PgBouncer pool_mode=transaction): statements
+    # are never prepared server-side (the next transaction may run on another
+    # server connection) and what needs a session of its own (LISTEN, the
+    # retention lock) goes to DATABASE_DIRECT_URL (the database itself, not
+    # the pooler) and DATABASE_SHARDS_DIRECT (same order as DATABASE_SHARDS)
+    db_transaction_pooler: bool = False
+    database_direct_url: str | None = None
+    database_shards_direct: Union[List[str], str] = []
+    # Hand the request's connections back to the pool when the handler
+    # returns, before the response is validated, serialized and sent
+    db_release_before_render: bool = True
+    # Connection pool per worker process (primary engine)
+    db_pool_size: int = 5
+    db_max_overflow: int = 10
+    # Connections this node may open on the database; caps the worker count
+    db_max_connections: int = 100
+    # Server (python -m app.server): worker processes (0 = from CPU count and
+    # db_max_connections) and seconds a worker gets to drain on SIGTERM/SIGHUP
+    web_workers: int = 0
+    graceful_timeout_seconds: int = 30
+    # Directory for per-process metric files summed by /api/metrics
+    # (set by app.server for multi-worker mode; empty = this process only)
+    metrics_dir: str = ""
+    # Admission control per worker (0 = off, the default): in-flight requests,
+    # share of them open to reads (the rest is kept for writes), pool wait that
+    # starts shedding reads (writes at twice this) and the Retry-After sent with 503
+    admission_max_inflight: int = 0
+    admission_read_share: float = 0.75
+    admission_pool_wait_ms: float = 250.0
+    admission_retry_after_seconds: int = 2
+    # Request deadlines, counted from arrival (unset = none, the default); each
+    # DB transaction gets the remaining time as statement_timeout. Reads and
+    # writes fall back to the request deadline
+    read_deadline_seconds: float | None = None
+    write_deadline_seconds: float | None = None
+    request_deadline_seconds: float | None = None
+    # History retention (python -m app.retention): days kept per table and user
+    # tier as JSON, merged over the defaults in app/retention.py, e.g.
+    # {"indoor_history": {"free": 90}}; null = keep forever
+    retention_policies: str = ""
+    # Archived rows go to {dir}/{table}/{date}.ndjson.gz before being deleted
+    retention_archive_dir: str = "archive"
+    # Rows per delete transaction, and pause between them (lets WAL and replicas catch up)
+    retention_batch_size: int = 500
+    retention_pause_ms: float = 50.0
+    # Days of change_log kept for GET /api/sync (older tokens get 410 and resync)
+    sync_log_days: int = 30
+    # Plant search (GET /api/plants/search): users whose trigram index is kept
+    # in memory per worker, and plants above which a user is searched in Postgres
+    search_index_max_users: int = 2000
+    search_index_max_plants: int = 3000
+    # SQLite mode (DATABASE_URL=sqlite:///path): one writer connection plus
+    # this many read-only connections per worker, memory-mapped I/O and page
+    # cache per connection, wait for the write lock and compiled statements
+    # kept per connection
+    sqlite_read_pool_size: int = 4
+    sqlite_mmap_size_mb: int = 256
+    sqlite_cache_size_mb: int = 16
+    sqlite_busy_timeout_ms: int = 5000
+    sqlite_statement_cache: int = 256
+    # Horizontal sharding (app/sharding.py): databases after DATABASE_URL, which
+    # is shard 0 and keeps the shard directory. Append only, a shard is its
+    # position. Workers cache directory entries for the TTL
+    database_shards: Union[List[str], str] = []
+    shard_directory_ttl_seconds: float = 5.0
+    shard_directory_max_users: int = 100000
 
     model_config = SettingsConfigDict(env_file=".env", case_sensitive=False)
 
-    @field_validator("cors_origins", mode="before")
-    def split_cors_origins(cls, value):
+    @field_validator("cors_origins", "database_read_url", "database_shards", "database_shards_direct", mode="before")
+    def split_list_values(cls, value):
         # Handles cases where env provides a CSV string, JSON array string, or already a list
         if value is None:
             return value
@@ -31,7 +135,7 @@ class Settings(BaseSettings):
                 except Exception:
                     pass
             # Fallback: CSV splitting
-            return [origin.strip() for origin in s.split(",") if origin.strip()]
+            return [item.strip() for item in s.split(",") if item.strip()]
         return value
 
 
@@ -0,0 +1,123 @@
+"""
+Counter caches kept by database triggers.
+
+indoors.plants_count, users.indoors_total and users.plants_total are
+updated by triggers on plants and indoors in the same transaction as the
+row change, so they also follow changes the service layer never sees: the
+SET NULL of plants.indoor_id when an indoor is deleted and cascaded
+deletes. Reading a count is a column read instead of a COUNT(*).
+
+`python -m app.verify_db --repair` recounts them if they ever drift (for
+example after restoring a table from a dump taken without triggers).
+"""
+from sqlalchemy import text
+
+# Columns the triggers maintain, by table
+COLUMNS = {"users": ("indoors_total", "plants_total"), "indoors": ("plants_count",)}
+
+POSTGRES_TRIGGERS = (
+    """
+    CREATE OR REPLACE FUNCTION plants_counters() RETURNS trigger AS $$
+    BEGIN
+        IF TG_OP IN ('UPDATE', 'DELETE') THEN
+            UPDATE indoors SET plants_count = plants_count - 1 WHERE id = OLD.indoor_id;
+            UPDATE users SET plants_total = plants_total - 1 WHERE id = OLD.user_id;
+        END IF;
+        IF TG_OP IN ('UPDATE', 'INSERT') THEN
+            UPDATE indoors SET plants_count = plants_count + 1 WHERE id = NEW.indoor_id;
+            UPDATE users SET plants_total = plants_total + 1 WHERE id = NEW.user_id;
+        END IF;
+        RETURN NULL;
+    END
+    $$ LANGUAGE plpgsql
+    """,
+    """
+    CREATE OR REPLACE FUNCTION indoors_counters() RETURNS trigger AS $$
+    BEGIN
+        IF TG_OP = 'DELETE' THEN
+            UPDATE users SET indoors_total = indoors_total - 1 WHERE id = OLD.user_id;
+        ELSE
+            UPDATE users SET indoors_total = indoors_total + 1 WHERE id = NEW.user_id;
+        END IF;
+        RETURN NULL;
+    END
+    $$ LANGUAGE plpgsql
+    """,
+    """
+    CREATE TRIGGER plants_counters AFTER INSERT OR DELETE ON plants
+    FOR EACH ROW EXECUTE FUNCTION plants_counters()
+    """,
+    """
+    CREATE TRIGGER plants_counters_move AFTER UPDATE OF indoor_id, user_id ON plants
+    FOR EACH ROW WHEN (OLD.indoor_id IS DISTINCT FROM NEW.indoor_id OR OLD.user_id IS DISTINCT FROM NEW.user_id)
+    EXECUTE FUNCTION plants_counters()
+    """,
+    """
+    CREATE TRIGGER indoors_counters AFTER INSERT OR DELETE ON indoors
+    FOR EACH ROW EXECUTE FUNCTION indoors_counters()
+    """,
+)
+
+POSTGRES_DROP = (
+    "DROP TRIGGER IF EXISTS indoors_counters ON indoors",
+    "DROP TRIGGER IF EXISTS plants_counters_move ON plants",
+    "DROP TRIGGER IF EXISTS plants_counters ON plants",
+    "DROP FUNCTION IF EXISTS indoors_counters()",
+    "DROP FUNCTION IF EXISTS plants_counters()",
+)
+
+_SQLITE_PLANT_OUT = """
+    UPDATE indoors SET plants_count = plants_count - 1 WHERE id = OLD.indoor_id;
+    UPDATE users SET plants_total = plants_total - 1 WHERE id = OLD.user_id;
+"""
+_SQLITE_PLANT_IN = """
+    UPDATE indoors SET plants_count = plants_count + 1 WHERE id = NEW.indoor_id;
+    UPDATE users SET plants_total = plants_total + 1 WHERE id = NEW.user_id;
+"""
+
+SQLITE_TRIGGERS = (
+    f"CREATE TRIGGER IF NOT EXISTS plants_counters_insert AFTER INSERT ON plants BEGIN {_SQLITE_PLANT_IN} END",
+    f"CREATE TRIGGER IF NOT EXISTS plants_counters_delete AFTER DELETE ON plants BEGIN {_SQLITE_PLANT_OUT} END",
+    f"""
+    CREATE TRIGGER IF NOT EXISTS plants_counters_move AFTER UPDATE OF indoor_id, user_id ON plants
+    WHEN OLD.indoor_id IS NOT NEW.indoor_id OR OLD.user_id IS NOT NEW.user_id
+    BEGIN {_SQLITE_PLANT_OUT} {_SQLITE_PLANT_IN} END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS indoors_counters_insert AFTER INSERT ON indoors BEGIN
+        UPDATE users SET indoors_total = indoors_total + 1 WHERE id = NEW.user_id;
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS indoors_counters_delete AFTER DELETE ON indoors BEGIN
+        UPDATE users SET indoors_total = indoors_total - 1 WHERE id = OLD.user_id;
+    END
+    """,
+)
+
+SQLITE_DROP = (
+    "DROP TRIGGER IF EXISTS indoors_counters_delete",
+    "DROP TRIGGER IF EXISTS indoors_counters_insert",
+    "DROP TRIGGER IF EXISTS plants_counters_move",
+    "DROP TRIGGER IF EXISTS plants_counters_delete",
+    "DROP TRIGGER IF EXISTS plants_counters_insert",
+)
+
+TRIGGERS = {"postgresql": POSTGRES_TRIGGERS, "sqlite": SQLITE_TRIGGERS}
+DROP = {"postgresql": POSTGRES_DROP, "sqlite": SQLITE_DROP}
+
+
+def install(connection) -> None:
+    """Create the counter triggers on the connection's database"""
+    for statement in TRIGGERS.get(connection.dialect.name, ()):
+        connection.execute(text(statement))
+
+
+def uninstall(connection) -> None:
+    for statement in DROP.get(connection.dialect.name, ()):
+        connection.execute(text(statement))
+
+
+def create_triggers(target, connection, **kw) -> None:
+    """after_create listener of the plants table, for metadata.create_all()"""
+    install(connection)
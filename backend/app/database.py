@@ -1,14 +1,157 @@
-from sqlalchemy import create_engine
+import contextvars
+import functools
+import inspect
+import itertools
+import threading
+import time
+
+from fastapi import Request
+from fastapi.routing import APIRoute
+from sqlalchemy import create_engine, event
+from sqlalchemy.exc import OperationalError
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import QueuePool
 from app.config import settings
+from app.admission import DeadlineExceeded, admission, pool_timeout, request_deadline
+
+
+def _connect_args(url: str) -> dict:
+    """
+    psycopg prepares a statement server-side after `prepare_threshold`
+    executions; sqlite3 keeps `cached_statements` prepared per connection.
+    """
+    if url.startswith("postgresql+psycopg"):
+        # A pooler in transaction mode can't keep statements prepared on the connection
+        return {"prepare_threshold": None if settings.db_transaction_pooler else settings.db_prepare_threshold}
+    if url.startswith("sqlite"):
+        return {
+            "cached_statements": settings.sqlite_statement_cache,
+            # Pooled connections are handed to any threadpool thread, one at a time
+            "check_same_thread": False,
+            "timeout": settings.sqlite_busy_timeout_ms / 1000,
+        }
+    return {}
+
+
+class TimedQueuePool(QueuePool):
+    """
+    QueuePool reporting how long each checkout waited to admission control,
+    and counting how long connections stay checked out
+    """
+
+    lane = "primary"
+    checkins = 0
+    held_seconds = 0.0
+
+    def _do_get(self):
+        started = admission.checkout_started(self.lane)
+        try:
+            record = super()._do_get()
+        finally:
+            admission.checkout_finished(self.lane, started)
+        record.info["checked_out_at"] = time.monotonic()
+        return record
+
+    def _do_return_conn(self, record):
+        checked_out_at = record.info.pop("checked_out_at", None)
+        if checked_out_at is not None:
+            self.checkins += 1
+            self.held_seconds += time.monotonic() - checked_out_at
+        super()._do_return_conn(record)
+
+
+class TimedReplicaPool(TimedQueuePool):
+    """TimedQueuePool of a read-only database (replicas, the SQLite reader pool)"""
+
+    lane = "replica"
+
+
+def _sqlite_engine(url: str, pool_size: int, readonly: bool):
+    """
+    SQLite in WAL mode: readers never block the writer nor each other, and
+    with synchronous=NORMAL a commit only fsyncs at checkpoints. SQLite takes
+    one writer at a time, so the write engine holds a single connection and
+    starts its transactions with BEGIN IMMEDIATE (waiting in the pool, not
+    failing with SQLITE_BUSY halfway through); reads go to a pool of
+    query_only connections. A write never queues for the writer longer than
+    its deadline.
+    """
+    sqlite_engine = create_engine(
+        url,
+        echo=settings.db_echo,
+        poolclass=TimedReplicaPool if readonly else TimedQueuePool,
+        pool_size=pool_size,
+        max_overflow=0,
+        pool_timeout=pool_timeout(
+            settings.read_deadline_seconds if readonly else settings.write_deadline_seconds,
+            settings.request_deadline_seconds,
+        ),
+        connect_args=_connect_args(url),
+    )
+
+    @event.listens_for(sqlite_engine, "connect")
+    def _configure(dbapi_connection, connection_record):
+        # Transactions are started by the "begin" listener below
+        dbapi_connection.isolation_level = None
+        cursor = dbapi_connection.cursor()
+        cursor.execute("PRAGMA journal_mode=WAL")
+        cursor.execute("PRAGMA synchronous=NORMAL")
+        cursor.execute("PRAGMA foreign_keys=ON")
+        cursor.execute(f"PRAGMA mmap_size={settings.sqlite_mmap_size_mb * 1024 * 1024}")
+        cursor.execute(f"PRAGMA cache_size=-{settings.sqlite_cache_size_mb * 1024}")
+        cursor.execute("PRAGMA temp_store=MEMORY")
+        if readonly:
+            cursor.execute("PRAGMA query_only=ON")
+        cursor.close()
+
+    @event.listens_for(sqlite_engine, "begin")
+    def _begin(conn):
+        conn.exec_driver_sql("BEGIN" if readonly else "BEGIN IMMEDIATE")
+
+    return sqlite_engine
+
+
+def _engines(url: str) -> tuple:
+    """(engine, SQLite read-only engine or None) for one database"""
+    if url.startswith("sqlite"):
+        return (
+            _sqlite_engine(url, pool_size=1, readonly=False),
+            _sqlite_engine(url, pool_size=settings.sqlite_read_pool_size, readonly=True),
+        )
+    return create_engine(
+        url,
+        echo=settings.db_echo,
+        pool_pre_ping=True,
+        poolclass=TimedQueuePool,
+        pool_size=settings.db_pool_size,
+        max_overflow=settings.db_max_overflow,
+        # No request may wait for a connection longer than its deadline
+        pool_timeout=pool_timeout(settings.request_deadline_seconds),
+        connect_args=_connect_args(url),
+    ), None
+
 
 # Create engine
-engine = create_engine(
-    settings.database_url,
-    echo=settings.db_echo,
-    pool_pre_ping=True,
-)
+engine, sqlite_reader = _engines(settings.database_url)
+
+# Shard 0 is DATABASE_URL; the others hold the users app/sharding.py routes there
+shards = [(engine, sqlite_reader)] + [_engines(url) for url in settings.database_shards]
+shard_engines = [writer for writer, _ in shards]
+
+
+def direct_urls() -> list[str]:
+    """
+    Per shard, the URL for sessions that outlive a transaction (LISTEN,
+    session locks): DATABASE_DIRECT_URL / DATABASE_SHARDS_DIRECT when set,
+    else the shard's own URL
+    """
+    direct = settings.database_shards_direct or [None] * len(settings.database_shards)
+    if len(direct) != len(settings.database_shards):
+        raise ValueError("DATABASE_SHARDS_DIRECT needs one URL per DATABASE_SHARDS entry")
+    urls = [settings.database_url, *settings.database_shards]
+    return [direct_url or url for url, direct_url in zip(urls, [settings.database_direct_url, *direct])]
+
 
 # Create SessionLocal class
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
@@ -17,11 +160,255 @@ SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 Base = declarative_base()
 
 
+class ReplicaRouter:
+    """
+    Round-robin routing over read replicas.
+
+    Replicas that fail to hand out a connection are skipped for
+    `retry_seconds` and then probed again. Users that wrote recently
+    are kept on the primary so they always read their own writes.
+    """
+
+    def __init__(self, urls: list[str], retry_seconds: float, sticky_seconds: float):
+        self.engines = [
+            create_engine(
+                url,
+                echo=settings.db_echo,
+                pool_pre_ping=True,
+                poolclass=TimedReplicaPool,
+                connect_args=_connect_args(url),
+            )
+            for url in urls
+        ]
+        self.retry_seconds = retry_seconds
+        self.sticky_seconds = sticky_seconds
+        self._down_until = [0.0] * len(self.engines)
+        self._counter = itertools.count()
+        self._recent_writes: dict[str, float] = {}
+        self._lock = threading.Lock()
+
+    def candidates(self) -> list:
+        """Healthy replicas in round-robin order, starting at the next one"""
+        if not self.engines:
+            return []
+        now = time.monotonic()
+        count = len(self.engines)
+        start = next(self._counter) % count
+        order = [(start + i) % count for i in range(count)]
+        return [self.engines[i] for i in order if self._down_until[i] <= now]
+
+    def mark_down(self, replica) -> None:
+        index = self.engines.index(replica)
+        self._down_until[index] = time.monotonic() + self.retry_seconds
+
+    def mark_write(self, key: str | None) -> None:
+        if not key or not self.engines:
+            return
+        now = time.monotonic()
+        with self._lock:
+            self._recent_writes[key] = now + self.sticky_seconds
+            # Drop expired entries so the map stays small
+            if len(self._recent_writes) > 10000:
+                self._recent_writes = {
+                    k: v for k, v in self._recent_writes.items() if v > now
+                }
+
+    def wrote_recently(self, key: str | None) -> bool:
+        if not key:
+            return False
+        return self._recent_writes.get(key, 0.0) > time.monotonic()
+
+
+replica_router = ReplicaRouter(
+    settings.database_read_url,
+    retry_seconds=settings.replica_retry_seconds,
+    sticky_seconds=settings.read_your_writes_seconds,
+)
+
+
+@event.listens_for(SessionLocal, "after_flush")
+def _flag_write(session, flush_context):
+    session.info["wrote"] = True
+
+
+@event.listens_for(SessionLocal, "do_orm_execute")
+def _flag_statement_write(orm_execute_state):
+    # Core INSERT/UPDATE statements run through the session don't flush
+    if orm_execute_state.is_insert or orm_execute_state.is_update or orm_execute_state.is_delete:
+        orm_execute_state.session.info["wrote"] = True
+
+
+@event.listens_for(SessionLocal, "after_begin")
+def _apply_deadline(session, transaction, connection):
+    deadline_at = session.info.get("deadline")
+    if deadline_at is None:
+        return
+    remaining = deadline_at - time.monotonic()
+    if remaining <= 0:
+        admission.deadline_exceeded += 1
+        raise DeadlineExceeded()
+    if connection.dialect.name == "postgresql":
+        # LOCAL: ends with the transaction, so pooled connections stay clean
+        connection.exec_driver_sql(f"SET LOCAL statement_timeout = {max(1, int(remaining * 1000))}")
+
+
+@event.listens_for(SessionLocal, "after_commit")
+def _track_write(session):
+    if session.info.pop("wrote", False):
+        replica_router.mark_write(session.info.get("rw_key"))
+
+
+def shard_for(key: str | None) -> int:
+    """Shard of the user in X-Telegram-UserId (0 without sharding)"""
+    if len(shards) == 1 or not key:
+        return 0
+    try:
+        telegram_user_id = int(key)
+    except ValueError:
+        return 0  # rejected by get_current_user
+    from app.sharding import shard_map
+
+    return shard_map.shard_of(telegram_user_id)
+
+
+def user_session(key: str | None):
+    """Session on the shard of the user in X-Telegram-UserId"""
+    shard = shard_for(key)
+    db = SessionLocal(bind=shard_engines[shard])
+    db.info["shard"] = shard
+    return db
+
+
 # Dependency to get DB session
-def get_db():
-    """Database session dependency for FastAPI endpoints"""
-    db = SessionLocal()
+def get_db(request: Request):
+    """Database session dependency for FastAPI endpoints, on the user's shard"""
+    db = user_session(request.headers.get("X-Telegram-UserId"))
+    db.info["rw_key"] = request.headers.get("X-Telegram-UserId")
+    db.info["deadline"] = request_deadline(request)
+    _track(db)
+    try:
+        yield db
+    finally:
+        db.close()
+
+
+def get_read_db(request: Request):
+    """
+    Read-only session dependency for GET endpoints.
+    Uses a healthy replica unless the user wrote within the last
+    `read_your_writes_seconds`; falls back to the primary. On SQLite, the
+    read-only pool (it sees every committed write). Replicas are those of
+    shard 0: users on other shards read from their shard.
+    """
+    key = request.headers.get("X-Telegram-UserId")
+    deadline_at = request_deadline(request)
+    shard = shard_for(key)
+    writer, reader = shards[shard]
+    db = None
+    if reader is not None or shard > 0:
+        db = SessionLocal(bind=reader or writer)
+        db.info["deadline"] = deadline_at
+    elif not replica_router.wrote_recently(key):
+        for replica in replica_router.candidates():
+            candidate = SessionLocal(bind=replica)
+            candidate.info["deadline"] = deadline_at
+            try:
+                candidate.connection()
+            except OperationalError:
+                candidate.close()
+                replica_router.mark_down(replica)
+                continue
+            except DeadlineExceeded:
+                candidate.close()
+                raise
+            db = candidate
+            break
+    if db is None:
+        db = SessionLocal()
+        db.info["deadline"] = deadline_at
+    db.info["rw_key"] = key
+    db.info["shard"] = shard
+    _track(db)
     try:
         yield db
     finally:
         db.close()
+
+
+# Sessions opened by the current request's dependencies (see ReleaseConnectionRoute)
+_request_sessions: contextvars.ContextVar[list | None] = contextvars.ContextVar("request_sessions", default=None)
+
+
+def _track(db) -> None:
+    sessions = _request_sessions.get()
+    if sessions is not None:
+        sessions.append(db)
+
+
+def _release_sessions() -> None:
+    for db in _request_sessions.get() or ():
+        # Writes are committed by then; a read transaction just ends
+        db.close()
+
+
+def _releasing(endpoint):
+    """The endpoint, closing the request's sessions as soon as it returns"""
+    if inspect.iscoroutinefunction(endpoint):
+        @functools.wraps(endpoint)
+        async def call(*args, **kwargs):
+            try:
+                return await endpoint(*args, **kwargs)
+            finally:
+                _release_sessions()
+    else:
+        @functools.wraps(endpoint)
+        def call(*args, **kwargs):
+            try:
+                return endpoint(*args, **kwargs)
+            finally:
+                _release_sessions()
+    return call
+
+
+class ReleaseConnectionRoute(APIRoute):
+    """
+    Route whose database connections go back to the pool when the endpoint
+    returns. get_db sessions otherwise live until the response has been
+    validated, serialized and sent, holding a connection (and behind a
+    transaction pooler, a server connection) the whole time. Endpoints build
+    their responses from read models and Pydantic objects, so nothing is
+    loaded from the database after they return.
+    """
+
+    def __init__(self, path: str, endpoint, **kwargs):
+        if settings.db_release_before_render:
+            endpoint = _releasing(endpoint)
+        super().__init__(path, endpoint, **kwargs)
+
+    def get_route_handler(self):
+        handler = super().get_route_handler()
+
+        async def route_handler(request: Request):
+            # Dependencies and sync endpoints run in threadpool copies of
+            # this context: they share the list, not the variable
+            token = _request_sessions.set([])
+            try:
+                return await handler(request)
+            finally:
+                _request_sessions.reset(token)
+
+        return route_handler
+
+
+def pool_stats() -> dict:
+    """Connections checked out now, and how long a checkout lasts on average"""
+    pools = [bind.pool for pair in shards for bind in pair if bind is not None] + [
+        replica.pool for replica in replica_router.engines
+    ]
+    checkins = sum(pool.checkins for pool in pools)
+    held = sum(pool.held_seconds for pool in pools)
+    return {
+        "checked_out": sum(pool.checkedout() for pool in pools),
+        "checkins": checkins,
+        "held_ms_avg": round(held * 1000 / checkins, 3) if checkins else 0.0,
+    }
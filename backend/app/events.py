@@ -0,0 +1,191 @@
+"""
+In-process pub/sub for live updates (Server-Sent Events).
+
+Each subscriber gets a bounded queue of pre-rendered SSE frames, so an idle
+connection costs one small queue and one task. When a slow client falls
+behind, the oldest frames are dropped and the client gets a `resync` event
+telling it to refetch.
+
+The transport decides how events reach other workers: "local" delivers in
+this process only, "postgres" goes through NOTIFY and the change feed's
+listener (app.changefeed) so every worker connected to the database sees
+them.
+"""
+import asyncio
+import json
+import logging
+from typing import AsyncIterator
+
+from fastapi import Request
+from sqlalchemy import text
+
+from app.config import settings
+
+logger = logging.getLogger(__name__)
+
+NOTIFY_CHANNEL = "plantulas_events"
+
+
+class Subscriber:
+    __slots__ = ("queue", "dropped")
+
+    def __init__(self, maxsize: int):
+        self.queue: asyncio.Queue[str] = asyncio.Queue(maxsize)
+        self.dropped = False
+
+
+class LocalTransport:
+    """Deliver events only inside this process"""
+
+    def __init__(self, broker: "EventBroker"):
+        self.broker = broker
+
+    async def start(self) -> None:
+        pass
+
+    async def stop(self) -> None:
+        pass
+
+    def send(self, channel: str, frame: str) -> None:
+        self.broker.deliver_threadsafe(channel, frame)
+
+
+class PostgresTransport:
+    """
+    Fan events out to every worker through Postgres NOTIFY. They are received
+    by the change feed's listener, which this transport starts; events
+    published here come back through it, like any other.
+    """
+
+    def __init__(self, broker: "EventBroker"):
+        self.broker = broker
+
+    async def start(self) -> None:
+        from app.changefeed import change_feed
+
+        change_feed.listen(NOTIFY_CHANNEL, self._receive)
+        # Frames missed while the listener was reconnecting
+        change_feed.on_resync(self.broker.resync)
+
+    async def stop(self) -> None:
+        pass
+
+    def send(self, channel: str, frame: str) -> None:
+        from app.database import engine
+
+        payload = json.dumps({"c": channel, "f": frame})
+        with engine.connect() as conn:
+            conn.execute(text("SELECT pg_notify(:channel, :payload)"), {
+                "channel": NOTIFY_CHANNEL,
+                "payload": payload
+            })
+            conn.commit()
+
+    def _receive(self, payload: str) -> None:
+        try:
+            message = json.loads(payload)
+        except ValueError:
+            return
+        self.broker.deliver(message["c"], message["f"])
+
+
+class EventBroker:
+    """Channels of SSE subscribers, e.g. "indoor:<uuid>" """
+
+    def __init__(self, queue_size: int, heartbeat_seconds: float):
+        self.queue_size = queue_size
+        self.heartbeat_seconds = heartbeat_seconds
+        self.channels: dict[str, set[Subscriber]] = {}
+        self.transport = LocalTransport(self)
+        self._loop: asyncio.AbstractEventLoop | None = None
+
+    async def start(self, transport: str = "local") -> None:
+        self._loop = asyncio.get_running_loop()
+        if transport == "postgres":
+            self.transport = PostgresTransport(self)
+        await self.transport.start()
+
+    async def stop(self) -> None:
+        await self.transport.stop()
+        self._loop = None
+
+    def subscribe(self, channel: str) -> Subscriber:
+        subscriber = Subscriber(self.queue_size)
+        self.channels.setdefault(channel, set()).add(subscriber)
+        return subscriber
+
+    def unsubscribe(self, channel: str, subscriber: Subscriber) -> None:
+        subscribers = self.channels.get(channel)
+        if subscribers is None:
+            return
+        subscribers.discard(subscriber)
+        if not subscribers:
+            del self.channels[channel]
+
+    def publish(self, channel: str, event: str, data: dict) -> None:
+        """Publish an event. Safe to call from sync code; no-op if the broker isn't running."""
+        if self._loop is None:
+            return
+        frame = f"event: {event}\ndata: {json.dumps(data, default=str)}\n\n"
+        try:
+            self.transport.send(channel, frame)
+        except Exception as e:
+            # Live updates are best effort: never fail the write that triggered them
+            logger.warning("Could not publish %s on %s: %s", event, channel, e)
+
+    def deliver_threadsafe(self, channel: str, frame: str) -> None:
+        loop = self._loop
+        if loop is None:
+            return
+        try:
+            running = asyncio.get_running_loop()
+        except RuntimeError:
+            running = None
+        if running is loop:
+            self.deliver(channel, frame)
+        else:
+            loop.call_soon_threadsafe(self.deliver, channel, frame)
+
+    def deliver(self, channel: str, frame: str) -> None:
+        """Push a frame to the local subscribers of a channel (event loop thread only)"""
+        for subscriber in self.channels.get(channel, ()):
+            if subscriber.queue.full():
+                # Bounded memory: drop the oldest frame and ask the client to resync
+                subscriber.queue.get_nowait()
+                subscriber.dropped = True
+            subscriber.queue.put_nowait(frame)
+
+    def resync(self) -> None:
+        """Tell every local subscriber to refetch (event loop thread only)"""
+        for channel in self.channels:
+            self.deliver(channel, "event: resync\ndata: {}\n\n")
+
+    async def stream(self, channel: str, request: Request) -> AsyncIterator[str]:
+        """SSE body for one client, with heartbeats while idle"""
+        subscriber = self.subscribe(channel)
+        try:
+            yield "retry: 3000\n\n"
+            while True:
+                try:
+                    frame = await asyncio.wait_for(subscriber.queue.get(), self.heartbeat_seconds)
+                except asyncio.TimeoutError:
+                    if await request.is_disconnected():
+                        break
+                    yield ": ping\n\n"
+                    continue
+                if subscriber.dropped:
+                    subscriber.dropped = False
+                    yield "event: resync\ndata: {}\n\n"
+                yield frame
+        finally:
+            self.unsubscribe(channel, subscriber)
+
+
+broker = EventBroker(
+    queue_size=settings.events_queue_size,
+    heartbeat_seconds=settings.events_heartbeat_seconds,
+)
+
+
+def indoor_channel(indoor_id) -> str:
+    return f"indoor:{indoor_id}"
@@ -0,0 +1,223 @@
+"""
+Idempotency-Key support for POST/PATCH requests.
+
+The first request with a given key claims it by inserting a row into
+`idempotency_keys` and runs normally; its response is stored when it
+finishes. Retries with the same key get the stored response back without
+running the handler again (no duplicate WateringHistory, no second shift of
+next_water_at). A retry that arrives while the first request is still running
+waits for it, so concurrent duplicates are serialised on the key row instead
+of on the plant rows. The key store is reached from worker threads, so the
+event loop never blocks on it.
+"""
+import asyncio
+import hashlib
+import itertools
+import time
+from datetime import datetime, timedelta, timezone
+
+from sqlalchemy import delete, select
+from starlette.datastructures import Headers
+from starlette.responses import JSONResponse, Response
+
+from app.admission import longest_request_seconds
+from app.config import settings
+from app.database import SessionLocal
+from app.models import IdempotencyKey
+from app.portable import insert
+
+METHODS = ("POST", "PATCH")
+MAX_KEY_LENGTH = 255
+
+# A claim without a response is taken over once the first request must be
+# over: past the longest request deadline, plus room to send the response
+CLAIM_MARGIN_SECONDS = 30.0
+
+# Polling interval while waiting for the first request: starts short, doubles up to the max
+POLL_SECONDS = 0.05
+MAX_POLL_SECONDS = 0.5
+
+_claims = itertools.count()
+
+
+def _claim_lifetime() -> float:
+    """Seconds after which an unfinished claim belongs to a request that died"""
+    return longest_request_seconds() + CLAIM_MARGIN_SECONDS
+
+
+def _claim(key_hash: str, request_hash: str) -> IdempotencyKey | None:
+    """Claim the key. Returns None if claimed, or the existing row."""
+    now = datetime.now(timezone.utc)
+    db = SessionLocal()
+    try:
+        # Forget expired keys and keys whose first request died mid-flight
+        db.execute(delete(IdempotencyKey).where(
+            IdempotencyKey.key_hash == key_hash,
+            (IdempotencyKey.expires_at < now) | (
+                IdempotencyKey.status_code.is_(None)
+                & (IdempotencyKey.created_at < now - timedelta(seconds=_claim_lifetime()))
+            )
+        ))
+        claimed = db.execute(
+            insert(db, IdempotencyKey)
+            .values(
+                key_hash=key_hash,
+                request_hash=request_hash,
+                created_at=now,
+                expires_at=now + timedelta(seconds=settings.idempotency_ttl_seconds)
+            )
+            .on_conflict_do_nothing(index_elements=[IdempotencyKey.key_hash])
+            .returning(IdempotencyKey.key_hash)
+        ).first()
+
+        # Purge expired keys from time to time so the table stays compact
+        if next(_claims) % 100 == 0:
+            expired = select(IdempotencyKey.key_hash).where(IdempotencyKey.expires_at < now).limit(500)
+            db.execute(delete(IdempotencyKey).where(IdempotencyKey.key_hash.in_(expired)))
+
+        db.commit()
+        if claimed:
+            return None
+        return db.get(IdempotencyKey, key_hash)
+    finally:
+        db.close()
+
+
+def _load(key_hash: str) -> IdempotencyKey | None:
+    db = SessionLocal()
+    try:
+        return db.get(IdempotencyKey, key_hash)
+    finally:
+        db.close()
+
+
+def _store(key_hash: str, status_code: int, content_type: str | None, body: bytes) -> None:
+    db = SessionLocal()
+    try:
+        db.query(IdempotencyKey).filter(IdempotencyKey.key_hash == key_hash).update({
+            IdempotencyKey.status_code: status_code,
+            IdempotencyKey.content_type: content_type,
+            IdempotencyKey.response_body: body.decode("utf-8", errors="replace")
+        })
+        db.commit()
+    finally:
+        db.close()
+
+
+def _release(key_hash: str) -> None:
+    """Drop the claim so the client can retry (server error or crash)"""
+    db = SessionLocal()
+    try:
+        db.execute(delete(IdempotencyKey).where(IdempotencyKey.key_hash == key_hash))
+        db.commit()
+    finally:
+        db.close()
+
+
+def _replay(record: IdempotencyKey) -> Response:
+    return Response(
+        content=record.response_body or "",
+        status_code=record.status_code,
+        media_type=record.content_type,
+        headers={"Idempotent-Replayed": "true"}
+    )
+
+
+class IdempotencyMiddleware:
+    """ASGI middleware; requests without an Idempotency-Key pass straight through"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["method"] not in METHODS:
+            await self.app(scope, receive, send)
+            return
+
+        headers = Headers(scope=scope)
+        key = headers.get("idempotency-key")
+        if not key:
+            await self.app(scope, receive, send)
+            return
+        if len(key) > MAX_KEY_LENGTH:
+            await JSONResponse({"detail": "Idempotency-Key too long"}, status_code=400)(scope, receive, send)
+            return
+
+        body = b""
+        more_body = True
+        while more_body:
+            message = await receive()
+            body += message.get("body", b"")
+            more_body = message.get("more_body", False)
+
+        user = headers.get("x-telegram-userid", "")
+        key_hash = hashlib.sha256(f"{user}:{scope['method']}:{scope['path']}:{key}".encode()).hexdigest()
+        request_hash = hashlib.sha256(body).hexdigest()
+
+        record = await asyncio.to_thread(_claim, key_hash, request_hash)
+        if record is not None:
+            response = await self._wait_for(record, key_hash, request_hash)
+            await response(scope, receive, send)
+            return
+
+        body_sent = False
+
+        async def replay_receive():
+            nonlocal body_sent
+            if not body_sent:
+                body_sent = True
+                return {"type": "http.request", "body": body, "more_body": False}
+            return await receive()
+
+        status_code = 500
+        content_type = None
+        chunks = []
+
+        async def capture_send(message):
+            nonlocal status_code, content_type
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+                content_type = Headers(raw=message["headers"]).get("content-type")
+            elif message["type"] == "http.response.body":
+                chunks.append(message.get("body", b""))
+            await send(message)
+
+        try:
+            await self.app(scope, replay_receive, capture_send)
+        except BaseException:
+            await asyncio.to_thread(_release, key_hash)
+            raise
+
+        if status_code >= 500:
+            await asyncio.to_thread(_release, key_hash)
+        else:
+            await asyncio.to_thread(_store, key_hash, status_code, content_type, b"".join(chunks))
+
+    async def _wait_for(self, record: IdempotencyKey, key_hash: str, request_hash: str) -> Response:
+        if record.request_hash != request_hash:
+            return JSONResponse(
+                {"detail": "Idempotency-Key reused with a different request body"},
+                status_code=422
+            )
+
+        deadline = time.monotonic() + settings.idempotency_wait_seconds
+        poll = POLL_SECONDS
+        while record is not None and record.status_code is None:
+            if time.monotonic() >= deadline:
+                return JSONResponse(
+                    {"detail": "A request with this Idempotency-Key is still in progress"},
+                    status_code=409,
+                    headers={"Retry-After": "1"}
+                )
+            await asyncio.sleep(poll)
+            poll = min(poll * 2, MAX_POLL_SECONDS)
+            record = await asyncio.to_thread(_load, key_hash)
+
+        if record is None:
+            # The first request failed and released the key: let the client retry
+            return JSONResponse(
+                {"detail": "The original request failed, retry"},
+                status_code=409,
+                headers={"Retry-After": "1"}
+            )
+        return _replay(record)
@@ -1,13 +1,84 @@
-from fastapi import FastAPI
+import asyncio
+import logging
+import os
+import sys
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
+from sqlalchemy.exc import OperationalError, TimeoutError as PoolTimeout
 from app.config import settings
-from app.database import engine
+from app.database import engine, pool_stats, replica_router
 from app import models  # Import models to ensure they're registered
-from app.api import dashboard, indoors, plants
+from app.api import dashboard, indoors, plants, fertilizers, watering_sessions, bootstrap, sync, calendar, bot
+from app.cache import cache
+from app.events import broker
+from app.changefeed import change_feed
+from app.idempotency import IdempotencyMiddleware
+from app.admission import AdmissionMiddleware, DeadlineExceeded, admission, is_statement_timeout
+from app.metrics import MetricsMiddleware, metrics as node_metrics
+from app.services.indoor_buffer import indoor_buffer
+from app.sharding import ShardMoving, shard_map
 
-app = FastAPI(title="PlantulasBot API")
+logger = logging.getLogger(__name__)
 
-# CORS middleware
+
+def _drop_cached_users(changes) -> None:
+    for change in changes:
+        cache.invalidate_user(change.user_id)
+
+
+def _mark_remote_writes(changes) -> None:
+    # Users who just wrote through another worker read from the primary here too
+    for change in changes:
+        replica_router.mark_write(change.rw_key)
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Start and stop process-wide background services"""
+    listening = settings.change_feed_enabled or settings.events_transport == "postgres"
+    if settings.db_pool_prewarm > 0:
+        from app.startup import prewarm
+
+        try:
+            await asyncio.to_thread(prewarm, settings.db_pool_prewarm)
+        except Exception as e:
+            logger.warning("Connection pool pre-warm failed: %s", e)
+    # Registers its channel on the change feed's listener when it is "postgres"
+    await broker.start(settings.events_transport)
+    if settings.change_feed_enabled and settings.cache_backend == "memory":
+        # Other workers' writes must drop this process' cached read models
+        change_feed.register(_drop_cached_users)
+        change_feed.on_resync(cache.clear)
+    if settings.change_feed_enabled and replica_router.engines:
+        change_feed.register(_mark_remote_writes)
+    if listening:
+        await change_feed.start()
+    if indoor_buffer.enabled:
+        await indoor_buffer.start()
+    yield
+    if indoor_buffer.enabled:
+        # Drain buffered indoor updates before the worker exits
+        await indoor_buffer.stop()
+    if listening:
+        await change_feed.stop()
+    await broker.stop()
+
+
+app = FastAPI(title="PlantulasBot API", lifespan=lifespan)
+
+# Middlewares run outermost-last-added: CORS -> metrics -> admission -> idempotency
+
+# Replays stored responses for retried POST/PATCH requests
+app.add_middleware(IdempotencyMiddleware)
+
+# Sheds load with 503 before any work (or idempotency key claim) is done
+app.add_middleware(AdmissionMiddleware)
+
+# Request count and latency, including shed requests
+app.add_middleware(MetricsMiddleware)
+
+# CORS middleware (outermost, so 503s from admission are readable by the browser)
 app.add_middleware(
     CORSMiddleware,
     allow_origins=settings.cors_origins,
@@ -16,10 +87,42 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+
+@app.exception_handler(DeadlineExceeded)
+async def deadline_exceeded(request: Request, exc: DeadlineExceeded):
+    return admission.busy_response("Request deadline exceeded, retry later")
+
+
+@app.exception_handler(PoolTimeout)
+async def pool_timeout(request: Request, exc: PoolTimeout):
+    # No connection freed up within the pool timeout (a deadline, see app.database)
+    admission.deadline_exceeded += 1
+    return admission.busy_response("Request deadline exceeded, retry later")
+
+
+@app.exception_handler(ShardMoving)
+async def shard_moving(request: Request, exc: ShardMoving):
+    return admission.busy_response("User data is being moved, retry shortly")
+
+
+@app.exception_handler(OperationalError)
+async def database_unavailable(request: Request, exc: OperationalError):
+    if is_statement_timeout(exc):
+        # statement_timeout set from the request deadline
+        admission.deadline_exceeded += 1
+        return admission.busy_response("Request deadline exceeded, retry later")
+    raise exc
+
 # Include routers
 app.include_router(dashboard.router)
 app.include_router(indoors.router)
 app.include_router(plants.router)
+app.include_router(fertilizers.router)
+app.include_router(watering_sessions.router)
+app.include_router(bootstrap.router)
+app.include_router(sync.router)
+app.include_router(calendar.router)
+app.include_router(bot.router)
 
 
 @app.get("/api/health")
@@ -28,6 +131,38 @@ async def health_check():
     return {"ok": True}
 
 
+def _bot_stats() -> dict | None:
+    """Bot counters, once the first message has loaded the bot (None before)"""
+    bot_service = sys.modules.get("app.services.bot_service")
+    return bot_service.stats() if bot_service else None
+
+
+def _search_stats() -> dict | None:
+    """Search index counters, once the first search has loaded it (None before)"""
+    search_service = sys.modules.get("app.services.search_service")
+    return search_service.plant_search.stats() if search_service else None
+
+
+@app.get("/api/metrics")
+async def metrics():
+    """
+    `node`: totals over every worker of this node (requests, latency, SQL,
+    cache). The other sections are for the process that answered.
+    """
+    return {
+        "node": node_metrics.collect(),
+        "pid": os.getpid(),
+        "cache": cache.stats(),
+        "change_feed": change_feed.stats(),
+        "indoor_buffer": indoor_buffer.stats(),
+        "plant_search": _search_stats(),
+        "bot": _bot_stats(),
+        "shards": shard_map.stats(),
+        "admission": admission.stats(),
+        "db_pool": pool_stats(),
+    }
+
+
 @app.get("/")
 async def root():
     """Root endpoint"""
@@ -0,0 +1,261 @@
+"""
+Node-wide metrics shared between worker processes.
+
+Each process adds to a fixed array of float counters. With METRICS_DIR set
+(python -m app.server does it) the array lives in a memory-mapped file
+`{METRICS_DIR}/{pid}.metrics`, so incrementing is a plain memory write and
+any worker can sum every file to report totals for the node. Counters of
+workers that exited are folded into `retired.metrics` and their files
+removed, so totals never go backwards on a restart and the directory does
+not grow with every replaced worker. Without METRICS_DIR the counters stay
+in process memory.
+"""
+import glob
+import mmap
+import os
+import struct
+import threading
+import time
+
+try:
+    import fcntl
+except ImportError:  # Windows: files of dead workers are kept
+    fcntl = None
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+from app.config import settings
+
+# Request latency buckets (seconds, upper bounds); the last one is +Inf
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+
+COUNTERS = (
+    "requests",
+    "requests_5xx",
+    "request_seconds",
+    *(f"latency_le_{bound}" for bound in LATENCY_BUCKETS),
+    "latency_le_inf",
+    "sql_queries",
+    "sql_seconds",
+    "cache_hits",
+    "cache_misses",
+)
+INDEX = {name: i for i, name in enumerate(COUNTERS)}
+SIZE = len(COUNTERS) * 8
+
+# Counters of exited workers, summed
+RETIRED = "retired.metrics"
+
+
+class SharedCounters:
+    def __init__(self, directory: str):
+        self.directory = directory
+        self._lock = threading.Lock()
+        self._pid = None
+        self._values = None
+
+    def _open(self) -> None:
+        # Reopened after a fork so a child never writes into its parent's file
+        self._pid = os.getpid()
+        if not self.directory:
+            self._values = memoryview(bytearray(SIZE)).cast("d")
+            return
+        os.makedirs(self.directory, exist_ok=True)
+        fd = os.open(os.path.join(self.directory, f"{self._pid}.metrics"), os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            if os.fstat(fd).st_size < SIZE:
+                os.ftruncate(fd, SIZE)
+            self._values = memoryview(mmap.mmap(fd, SIZE)).cast("d")
+        finally:
+            os.close(fd)
+
+    def inc(self, name: str, amount: float = 1.0) -> None:
+        if self._pid != os.getpid():
+            self._open()
+        with self._lock:
+            self._values[INDEX[name]] += amount
+
+    def observe_request(self, seconds: float, status: int) -> None:
+        if self._pid != os.getpid():
+            self._open()
+        bucket = next((f"latency_le_{b}" for b in LATENCY_BUCKETS if seconds <= b), "latency_le_inf")
+        with self._lock:
+            values = self._values
+            values[INDEX["requests"]] += 1
+            values[INDEX["request_seconds"]] += seconds
+            values[INDEX[bucket]] += 1
+            if status >= 500:
+                values[INDEX["requests_5xx"]] += 1
+
+    def _read_all(self) -> tuple[list[float], int, int]:
+        """Summed counters, worker files and live workers"""
+        if self._pid != os.getpid():
+            self._open()
+        if not self.directory:
+            return list(self._values), 1, 1
+
+        self._retire_dead()
+        totals = [0.0] * len(COUNTERS)
+        files = alive = 0
+        for path in glob.glob(os.path.join(self.directory, "*.metrics")):
+            values = _read_file(path)
+            if values is None:
+                continue
+            for i, value in enumerate(values):
+                totals[i] += value
+            if os.path.basename(path) == RETIRED:
+                continue
+            files += 1
+            if _pid_alive(_file_pid(path)):
+                alive += 1
+        return totals, files, alive
+
+    def _retire_dead(self) -> None:
+        """Add the files of exited workers to RETIRED and remove them"""
+        if fcntl is None:
+            return
+        dead = [
+            path for path in glob.glob(os.path.join(self.directory, "*.metrics"))
+            if os.path.basename(path) != RETIRED and not _pid_alive(_file_pid(path))
+        ]
+        if not dead:
+            return
+        # One worker at a time, so no file is added twice
+        with open(os.path.join(self.directory, ".lock"), "w") as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            retired_path = os.path.join(self.directory, RETIRED)
+            retired = _read_file(retired_path) or [0.0] * len(COUNTERS)
+            retired += [0.0] * (len(COUNTERS) - len(retired))
+            folded = []
+            for path in dead:
+                values = _read_file(path)
+                if values is None:
+                    continue  # retired by another worker meanwhile
+                for i, value in enumerate(values):
+                    retired[i] += value
+                folded.append(path)
+            if not folded:
+                return
+            with open(f"{retired_path}.tmp", "wb") as f:
+                f.write(struct.pack(f"{len(COUNTERS)}d", *retired))
+            os.replace(f"{retired_path}.tmp", retired_path)
+            for path in folded:
+                os.remove(path)
+
+    def collect(self) -> dict:
+        totals, files, alive = self._read_all()
+        value = dict(zip(COUNTERS, totals))
+        requests = value["requests"]
+        lookups = value["cache_hits"] + value["cache_misses"]
+        return {
+            "workers": alive,
+            "worker_files": files,
+            "requests": int(requests),
+            "requests_5xx": int(value["requests_5xx"]),
+            "latency_avg_ms": round(value["request_seconds"] * 1000 / requests, 2) if requests else 0.0,
+            "latency_p50_ms": _percentile(value, requests, 0.50),
+            "latency_p95_ms": _percentile(value, requests, 0.95),
+            "latency_p99_ms": _percentile(value, requests, 0.99),
+            "sql_queries": int(value["sql_queries"]),
+            "sql_per_request": round(value["sql_queries"] / requests, 2) if requests else 0.0,
+            "sql_avg_ms": round(value["sql_seconds"] * 1000 / value["sql_queries"], 3) if value["sql_queries"] else 0.0,
+            "cache_hits": int(value["cache_hits"]),
+            "cache_misses": int(value["cache_misses"]),
+            "cache_hit_rate": round(value["cache_hits"] / lookups, 4) if lookups else 0.0,
+        }
+
+
+def _read_file(path: str) -> list[float] | None:
+    try:
+        with open(path, "rb") as f:
+            raw = f.read(SIZE)
+    except OSError:
+        return None
+    count = len(raw) // 8
+    return list(struct.unpack(f"{count}d", raw[:count * 8]))
+
+
+def _file_pid(path: str) -> int:
+    return int(os.path.basename(path).split(".")[0])
+
+
+def _pid_alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+def _percentile(value: dict, requests: float, q: float) -> float | None:
+    """Upper bound (ms) of the latency bucket holding the q-th request"""
+    if not requests:
+        return None
+    seen = 0.0
+    for bound in LATENCY_BUCKETS:
+        seen += value[f"latency_le_{bound}"]
+        if seen >= requests * q:
+            return bound * 1000
+    return None  # beyond the last bucket
+
+
+def reset(directory: str) -> None:
+    """Remove metric files of a previous run (called by the server before forking workers)"""
+    for path in glob.glob(os.path.join(directory, "*.metrics")):
+        os.remove(path)
+
+
+metrics = SharedCounters(settings.metrics_dir)
+
+
+# ============ SQL ============
+
+@event.listens_for(Engine, "before_cursor_execute")
+def _sql_started(conn, cursor, statement, parameters, context, executemany):
+    conn.info["query_started"] = time.perf_counter()
+
+
+@event.listens_for(Engine, "after_cursor_execute")
+def _sql_finished(conn, cursor, statement, parameters, context, executemany):
+    started = conn.info.pop("query_started", None)
+    metrics.inc("sql_queries")
+    if started is not None:
+        metrics.inc("sql_seconds", time.perf_counter() - started)
+
+
+# ============ REQUESTS ============
+
+class MetricsMiddleware:
+    """
+    ASGI middleware recording request count, 5xx and latency. Latency is
+    measured to the start of the response, so long-lived SSE streams count
+    like any other request.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        started = time.perf_counter()
+        recorded = False
+
+        async def timed_send(message):
+            nonlocal recorded
+            if message["type"] == "http.response.start" and not recorded:
+                recorded = True
+                metrics.observe_request(time.perf_counter() - started, message["status"])
+            await send(message)
+
+        try:
+            await self.app(scope, receive, timed_send)
+        except BaseException:
+            if not recorded:
+                metrics.observe_request(time.perf_counter() - started, 500)
+            raise
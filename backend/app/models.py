@@ -2,12 +2,13 @@ import uuid
 from datetime import datetime, date
 from sqlalchemy import (
     Column, String, BigInteger, DateTime, Date, Integer, Numeric, Boolean,
-    Text, ForeignKey, Index
+    Text, ForeignKey, Index, DDL, event
 )
-from sqlalchemy.dialects.postgresql import UUID, JSONB
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
 from app.database import Base
+from app.portable import UUID, JSONDocument
+from app.counters import create_triggers
 
 
 class User(Base):
@@ -16,6 +17,12 @@ class User(Base):
 
     id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
     telegram_user_id = Column(BigInteger, unique=True, nullable=False, index=True)
+    timezone = Column(Text)  # IANA name, e.g. "America/Argentina/Buenos_Aires". None = server time
+    tier = Column(Text, nullable=False, default="free", server_default="free")  # retention policy tier
+    change_seq = Column(BigInteger, nullable=False, default=0, server_default="0")  # last change_log seq
+    # Counter caches, kept by triggers (app/counters.py)
+    indoors_total = Column(Integer, nullable=False, server_default="0")
+    plants_total = Column(Integer, nullable=False, server_default="0")
     created_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
 
     # Relationships
@@ -48,6 +55,8 @@ class Indoor(Base):
     light_height_cm = Column(Numeric(6, 2))
     light_power_pct = Column(Integer)  # 0-100
     light_schedule = Column(Text)  # e.g., "18/6", "20/4"
+
+    plants_count = Column(Integer, nullable=False, server_default="0")  # kept by triggers (app/counters.py)
     
     created_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
     updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now(), nullable=False)
@@ -69,7 +78,7 @@ class IndoorHistory(Base):
     indoor_id = Column(UUID(as_uuid=True), ForeignKey("indoors.id", ondelete="CASCADE"), nullable=False, index=True)
     event_ts = Column(DateTime(timezone=True), nullable=False, index=True)
     message = Column(Text, nullable=False)
-    payload = Column(JSONB)  # Optional extra data
+    payload = Column(JSONDocument)  # Optional extra data
 
     # Relationships
     indoor = relationship("Indoor", back_populates="history")
@@ -119,16 +128,206 @@ class WateringHistory(Base):
     event_ts = Column(DateTime(timezone=True), nullable=False, index=True)
     liters = Column(Numeric(6, 3), nullable=False)
     note = Column(Text)
-    ferts = Column(JSONB)  # Optional fertilizer data
+    ferts = Column(JSONDocument)  # Fertilizers as sent by the client; normalized in watering_fertilizers
+    # Set for waterings of a session: note and ferts live once on the session
+    session_id = Column(UUID(as_uuid=True), ForeignKey("watering_sessions.id", ondelete="CASCADE"), index=True)
 
     # Relationships
     plant = relationship("Plant", back_populates="watering_history")
+    session = relationship("WateringSession", back_populates="waterings")
+    fertilizers = relationship("WateringFertilizer", back_populates="watering", cascade="all, delete-orphan")
 
     def __repr__(self):
         return f"<WateringHistory(id={self.id}, plant_id={self.plant_id}, liters={self.liters})>"
 
 
+class WateringSession(Base):
+    """One mix (tank, nutrients) used to water several plants"""
+    __tablename__ = "watering_sessions"
+
+    id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
+    user_id = Column(UUID(as_uuid=True), ForeignKey("users.id", ondelete="CASCADE"), nullable=False)
+    indoor_id = Column(UUID(as_uuid=True), ForeignKey("indoors.id", ondelete="SET NULL"))
+    event_ts = Column(DateTime(timezone=True), nullable=False)
+    total_liters = Column(Numeric(8, 3), nullable=False)
+    note = Column(Text)
+    ferts = Column(JSONDocument)  # Mix as sent by the client, once for all its plants
+
+    # Relationships
+    waterings = relationship("WateringHistory", back_populates="session")
+    fertilizers = relationship("WateringFertilizer", back_populates="session", cascade="all, delete-orphan")
+
+    def __repr__(self):
+        return f"<WateringSession(id={self.id}, event_ts={self.event_ts}, total_liters={self.total_liters})>"
+
+
+class Fertilizer(Base):
+    """Fertilizer catalog entry of a user"""
+    __tablename__ = "fertilizers"
+
+    id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
+    user_id = Column(UUID(as_uuid=True), ForeignKey("users.id", ondelete="CASCADE"), nullable=False)
+    name = Column(Text, nullable=False)
+    name_key = Column(Text, nullable=False)  # lowercased, collapsed spaces: "Bio Grow" == "bio  grow"
+    default_unit = Column(Text)  # "ml" or "g"
+    created_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
+
+    def __repr__(self):
+        return f"<Fertilizer(id={self.id}, name={self.name})>"
+
+
+class WateringFertilizer(Base):
+    """Fertilizer applied in a watering, with a numeric amount"""
+    __tablename__ = "watering_fertilizers"
+
+    id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
+    # One of them is set: a single watering, or a whole session (totals over all its liters).
+    # Both are NULL once the watering was archived (app/retention.py), so usage reports keep it
+    watering_id = Column(UUID(as_uuid=True), ForeignKey("watering_history.id", ondelete="CASCADE"), index=True)
+    session_id = Column(UUID(as_uuid=True), ForeignKey("watering_sessions.id", ondelete="CASCADE"), index=True)
+    fertilizer_id = Column(UUID(as_uuid=True), ForeignKey("fertilizers.id", ondelete="CASCADE"), nullable=False)
+    # Copied from the watering and its plant so usage reports read one table;
+    # indoor_id is where the plant was when it was watered
+    user_id = Column(UUID(as_uuid=True), ForeignKey("users.id", ondelete="CASCADE"), nullable=False)
+    indoor_id = Column(UUID(as_uuid=True), ForeignKey("indoors.id", ondelete="SET NULL"))
+    event_ts = Column(DateTime(timezone=True), nullable=False)
+    amount = Column(Numeric(10, 3), nullable=False)  # as entered
+    unit = Column(Text, nullable=False)  # "ml", "g", "ml/l" or "g/l"
+    total_amount = Column(Numeric(12, 3), nullable=False)  # per-liter amounts times the liters watered
+    total_unit = Column(Text, nullable=False)  # "ml" or "g"
+
+    # Relationships
+    watering = relationship("WateringHistory", back_populates="fertilizers")
+    session = relationship("WateringSession", back_populates="fertilizers")
+    fertilizer = relationship("Fertilizer")
+
+    def __repr__(self):
+        return f"<WateringFertilizer(fertilizer_id={self.fertilizer_id}, amount={self.amount} {self.unit})>"
+
+
+class IndoorHistoryDaily(Base):
+    """Per-day summary of archived indoor history (app/retention.py)"""
+    __tablename__ = "indoor_history_daily"
+
+    indoor_id = Column(UUID(as_uuid=True), ForeignKey("indoors.id", ondelete="CASCADE"), primary_key=True)
+    day = Column(Date, primary_key=True)  # in the user's timezone
+    events = Column(Integer, nullable=False)
+    first_ts = Column(DateTime(timezone=True), nullable=False)
+    last_ts = Column(DateTime(timezone=True), nullable=False)
+    last_message = Column(Text)
+
+    def __repr__(self):
+        return f"<IndoorHistoryDaily(indoor_id={self.indoor_id}, day={self.day}, events={self.events})>"
+
+
+class WateringDaily(Base):
+    """Per-day summary of archived waterings (app/retention.py)"""
+    __tablename__ = "watering_daily"
+
+    plant_id = Column(UUID(as_uuid=True), ForeignKey("plants.id", ondelete="CASCADE"), primary_key=True)
+    day = Column(Date, primary_key=True)  # in the user's timezone
+    waterings = Column(Integer, nullable=False)
+    liters = Column(Numeric(10, 3), nullable=False)
+
+    def __repr__(self):
+        return f"<WateringDaily(plant_id={self.plant_id}, day={self.day}, waterings={self.waterings})>"
+
+
+class ChangeLog(Base):
+    """
+    Per-user change sequence read by GET /api/sync. `seq` comes from
+    users.change_seq, whose row lock orders a user's writers, so seqs
+    become visible in commit order and without gaps.
+    """
+    __tablename__ = "change_log"
+
+    user_id = Column(UUID(as_uuid=True), ForeignKey("users.id", ondelete="CASCADE"), primary_key=True)
+    seq = Column(BigInteger, primary_key=True)
+    table_name = Column(Text, nullable=False)
+    entity_id = Column(UUID(as_uuid=True), nullable=False)
+    op = Column(Text, nullable=False)  # "upsert" | "delete"
+    changed_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False, index=True)
+
+    def __repr__(self):
+        return f"<ChangeLog(user_id={self.user_id}, seq={self.seq}, {self.op} {self.table_name}:{self.entity_id})>"
+
+
+class LightPeriod(Base):
+    """
+    Light settings of an indoor from `starts_at` until the next period, with
+    the light hours and relative DLI accumulated up to `starts_at`
+    (app/services/light_service.py).
+    """
+    __tablename__ = "light_periods"
+
+    indoor_id = Column(UUID(as_uuid=True), ForeignKey("indoors.id", ondelete="CASCADE"), primary_key=True)
+    starts_at = Column(DateTime(timezone=True), primary_key=True)
+    schedule = Column(Text)  # as written, e.g. "18/6 06:00"
+    on_minutes = Column(Integer)  # NULL: schedule not readable, hours unknown
+    off_minutes = Column(Integer)
+    cycle_start = Column(DateTime(timezone=True))  # lights-on instant at or before starts_at
+    power_pct = Column(Integer)  # NULL: no dimmer, full power
+    light_hours = Column(Numeric(14, 4), nullable=False)  # cumulative
+    light_dli = Column(Numeric(14, 4), nullable=False)  # cumulative full-power hours
+
+    def __repr__(self):
+        return f"<LightPeriod(indoor_id={self.indoor_id}, starts_at={self.starts_at}, schedule={self.schedule})>"
+
+
+class IdempotencyKey(Base):
+    """Stored outcome of a POST/PATCH sent with an Idempotency-Key header"""
+    __tablename__ = "idempotency_keys"
+
+    # sha256 of user + method + path + client key
+    key_hash = Column(String(64), primary_key=True)
+    request_hash = Column(String(64), nullable=False)
+    status_code = Column(Integer)  # NULL while the first request is still running
+    content_type = Column(Text)
+    response_body = Column(Text)
+    created_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
+    expires_at = Column(DateTime(timezone=True), nullable=False, index=True)
+
+    def __repr__(self):
+        return f"<IdempotencyKey(key_hash={self.key_hash}, status_code={self.status_code})>"
+
+
+class UserShard(Base):
+    """Shard directory entry, kept in shard 0 (see app/sharding.py)"""
+    __tablename__ = "user_shards"
+
+    telegram_user_id = Column(BigInteger, primary_key=True, autoincrement=False)
+    shard = Column(Integer, nullable=False)
+    moving_to = Column(Integer)  # set while a move copies the user's rows
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now(), nullable=False)
+
+    def __repr__(self):
+        return f"<UserShard(telegram_user_id={self.telegram_user_id}, shard={self.shard}, moving_to={self.moving_to})>"
+
+
 # Create composite indexes
 Index("idx_plants_user_indoor", Plant.user_id, Plant.indoor_id)
 Index("idx_watering_history_plant_ts", WateringHistory.plant_id, WateringHistory.event_ts.desc())
+Index("idx_watering_sessions_user_ts", WateringSession.user_id, WateringSession.event_ts.desc())
 Index("idx_indoor_history_indoor_ts", IndoorHistory.indoor_id, IndoorHistory.event_ts.desc())
+Index("idx_fertilizers_user_name", Fertilizer.user_id, Fertilizer.name_key, unique=True)
+Index("idx_watering_fertilizers_usage", WateringFertilizer.user_id, WateringFertilizer.fertilizer_id, WateringFertilizer.event_ts)
+# Legacy rows whose amounts couldn't be parsed are still searchable by name (ferts ? 'name')
+Index("idx_watering_history_ferts", WateringHistory.ferts, postgresql_using="gin").ddl_if(dialect="postgresql")
+# Plant search for users too big for the in-memory index (app/services/search_service.py),
+# over the unaccented text like the index compares
+Index("idx_plants_name_trgm", func.search_unaccent(Plant.name).label("name"), postgresql_using="gin", postgresql_ops={"name": "gin_trgm_ops"}).ddl_if(dialect="postgresql")
+Index("idx_plants_species_trgm", func.search_unaccent(Plant.species).label("species"), postgresql_using="gin", postgresql_ops={"species": "gin_trgm_ops"}).ddl_if(dialect="postgresql")
+Index("idx_plants_notes_trgm", func.search_unaccent(Plant.notes).label("notes"), postgresql_using="gin", postgresql_ops={"notes": "gin_trgm_ops"}).ddl_if(dialect="postgresql")
+
+# unaccent() is only STABLE (its dictionary can change), so it can't be indexed directly
+SEARCH_UNACCENT_FUNCTION = """
+CREATE OR REPLACE FUNCTION search_unaccent(text) RETURNS text
+LANGUAGE sql IMMUTABLE PARALLEL SAFE STRICT
+AS $$ SELECT public.unaccent('public.unaccent'::regdictionary, $1) $$
+"""
+
+# Counter-cache triggers, the extensions and the search function also come with metadata.create_all()
+event.listen(Base.metadata, "before_create", DDL("CREATE EXTENSION IF NOT EXISTS pg_trgm").execute_if(dialect="postgresql"))
+event.listen(Base.metadata, "before_create", DDL("CREATE EXTENSION IF NOT EXISTS unaccent").execute_if(dialect="postgresql"))
+event.listen(Base.metadata, "before_create", DDL(SEARCH_UNACCENT_FUNCTION).execute_if(dialect="postgresql"))
+event.listen(Plant.__table__, "after_create", create_triggers)
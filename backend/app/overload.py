@@ -0,0 +1,176 @@
+"""
+Admission control check against a slow database stand-in.
+
+    python -m app.overload [--latency-ms 40] [--requests 400] [--rate 200]
+
+Serves the app with uvicorn on a throwaway SQLite file whose every statement,
+on the writer and the read-only connections, is delayed by --latency-ms
+(the "slow Postgres"). Client threads send
+dashboard polls and waterings at a rate well above what the worker can
+serve, without waiting for each other, and the run checks that:
+
+- excess requests are shed fast with 503 + Retry-After instead of queueing,
+- writes get through more often than reads (a higher share, not all of
+  them: the writer's capacity is far below the offered load),
+- no request is answered successfully after its deadline,
+- the worker recovers once the load is over.
+
+Exits with an AssertionError if any check fails.
+"""
+import http.client
+import json
+import os
+import socket
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+DB_PATH = os.path.join(tempfile.gettempdir(), f"plantulas-overload-{os.getpid()}.db")
+os.environ["DATABASE_URL"] = f"sqlite:///{DB_PATH}"
+os.environ["DATABASE_READ_URL"] = ""
+os.environ["CACHE_BACKEND"] = "none"
+os.environ["DB_POOL_PREWARM"] = "0"
+# Admission control and deadlines are off by default
+os.environ.setdefault("ADMISSION_MAX_INFLIGHT", "32")
+os.environ.setdefault("ADMISSION_POOL_WAIT_MS", "100")
+os.environ.setdefault("READ_DEADLINE_SECONDS", "1.5")
+os.environ.setdefault("WRITE_DEADLINE_SECONDS", "4")
+os.environ.setdefault("REQUEST_DEADLINE_SECONDS", "10")
+os.environ.setdefault("DB_POOL_SIZE", "4")
+os.environ.setdefault("DB_MAX_OVERFLOW", "0")
+
+USER_ID = 4242
+
+
+def _call(port: int, method: str, path: str, body: dict | None = None) -> tuple[int, dict, float]:
+    started = time.monotonic()
+    conn = http.client.HTTPConnection("127.0.0.1", port, timeout=30)
+    try:
+        conn.request(
+            method, path,
+            body=json.dumps(body) if body is not None else None,
+            headers={"X-Telegram-UserId": str(USER_ID), "Content-Type": "application/json"}
+        )
+        response = conn.getresponse()
+        response.read()
+        headers = {k.lower(): v for k, v in response.getheaders()}
+        return response.status, headers, time.monotonic() - started
+    finally:
+        conn.close()
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def run(latency_ms: float, requests: int, rate: float, write_every: int) -> None:
+    import uvicorn
+    from sqlalchemy import event
+    from app.config import settings
+    from app.database import Base, SessionLocal, engine, sqlite_reader
+    from app.models import Plant
+    from app.admission import admission
+    from app.main import app
+
+    Base.metadata.create_all(engine)
+
+    def slow_statement(conn, cursor, statement, parameters, context, executemany):
+        time.sleep(latency_ms / 1000)
+
+    # The writer and the read-only pool alike
+    for bind in (engine, sqlite_reader):
+        event.listen(bind, "before_cursor_execute", slow_statement)
+
+    port = _free_port()
+    server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=port, log_level="warning", backlog=4096))
+    thread = threading.Thread(target=server.run, daemon=True)
+    thread.start()
+    while not server.started:
+        time.sleep(0.05)
+
+    try:
+        status, _, _ = _call(port, "POST", "/api/plants", {"name": "overload"})
+        assert status == 201, status
+        db = SessionLocal()
+        try:
+            plant_path = f"/api/plants/{db.query(Plant.id).first()[0]}/water"
+        finally:
+            db.close()
+
+        # Open-loop arrivals (clients don't wait for each other), one write in `write_every`
+        methods, futures = [], []
+        started = time.monotonic()
+        with ThreadPoolExecutor(max_workers=256) as clients:
+            for i in range(requests):
+                if i % write_every == 0:
+                    methods.append("POST")
+                    futures.append(clients.submit(_call, port, "POST", plant_path, {"liters": 0.5}))
+                else:
+                    methods.append("GET")
+                    futures.append(clients.submit(_call, port, "GET", "/api/dashboard"))
+                time.sleep(max(0.0, started + (i + 1) / rate - time.monotonic()))
+            results = [future.result() for future in futures]
+        elapsed = time.monotonic() - started
+
+        outcome = {"GET": {"ok": 0, "shed": 0, "other": 0}, "POST": {"ok": 0, "shed": 0, "other": 0}}
+        slowest_ok = {"GET": 0.0, "POST": 0.0}
+        slowest_shed = 0.0
+        for method, (status, headers, seconds) in zip(methods, results):
+            if status < 300:
+                outcome[method]["ok"] += 1
+                slowest_ok[method] = max(slowest_ok[method], seconds)
+            elif status == 503:
+                outcome[method]["shed"] += 1
+                slowest_shed = max(slowest_shed, seconds)
+                assert headers.get("retry-after"), "503 without Retry-After"
+            else:
+                outcome[method]["other"] += 1
+
+        print(f"{requests} requests at {rate:.0f}/s, {latency_ms:.0f} ms per statement, took {elapsed:.2f}s")
+        for method, label in (("GET", "reads (dashboard)"), ("POST", "writes (water)")):
+            counts = outcome[method]
+            total = sum(counts.values())
+            print(
+                f"  {label:<18} ok {counts['ok']:>4}  shed {counts['shed']:>4}  other {counts['other']:>3}"
+                f"  served {counts['ok'] / total:6.1%}  slowest ok {slowest_ok[method]:.2f}s"
+            )
+        print(f"  slowest 503: {slowest_shed:.2f}s")
+        print(f"  admission: {admission.stats()}")
+
+        read_rate = outcome["GET"]["ok"] / methods.count("GET")
+        write_rate = outcome["POST"]["ok"] / methods.count("POST")
+        assert outcome["GET"]["shed"] > 0, "nothing was shed: the stand-in is not slow enough"
+        assert write_rate > read_rate, "writes were not prioritised over reads"
+        assert outcome["GET"]["other"] == outcome["POST"]["other"] == 0, "unexpected status codes"
+        # The deadline is checked when each transaction begins, so allow a few statements of slack
+        slack = latency_ms / 1000 * 5
+        assert slowest_ok["GET"] <= settings.read_deadline_seconds + slack, "read answered after its deadline"
+        assert slowest_ok["POST"] <= settings.write_deadline_seconds + slack, "write answered after its deadline"
+
+        time.sleep(1)
+        status, _, _ = _call(port, "GET", "/api/dashboard")
+        assert status == 200, f"worker did not recover after the load ({status})"
+        print("OK")
+    finally:
+        server.should_exit = True
+        thread.join()
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Admission control check against a slow database stand-in")
+    parser.add_argument("--latency-ms", type=float, default=40.0)
+    parser.add_argument("--requests", type=int, default=400)
+    parser.add_argument("--rate", type=float, default=200.0, help="arrivals per second")
+    parser.add_argument("--write-every", type=int, default=6, help="one watering every N requests")
+    args = parser.parse_args()
+    try:
+        run(args.latency_ms, args.requests, args.rate, args.write_every)
+    finally:
+        for path in (DB_PATH, f"{DB_PATH}-wal", f"{DB_PATH}-shm"):
+            if os.path.exists(path):
+                os.remove(path)
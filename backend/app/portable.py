@@ -0,0 +1,21 @@
+"""
+Column types and statements that work on Postgres and on SQLite.
+
+UUID is the generic type: native `uuid` on Postgres, CHAR(32) on SQLite.
+JSONDocument is JSONB on Postgres (GIN-indexable, `?` operator) and JSON
+text on SQLite. Postgres-only indexes are created with `.ddl_if(dialect=
+"postgresql")`, so metadata.create_all() and the migrations build the same
+schema on both.
+"""
+from sqlalchemy import JSON, Uuid
+from sqlalchemy.dialects import postgresql, sqlite
+
+UUID = Uuid
+JSONDocument = JSON().with_variant(postgresql.JSONB(), "postgresql")
+
+_INSERTS = {"postgresql": postgresql.insert, "sqlite": sqlite.insert}
+
+
+def insert(db, table):
+    """INSERT with .on_conflict_do_nothing()/.on_conflict_do_update() for the session's database"""
+    return _INSERTS[db.get_bind().dialect.name](table)
@@ -0,0 +1,264 @@
+"""
+Prepared queries for the hot request paths.
+
+Statements are built once at import time with bind parameters, so every
+execution hits SQLAlchemy's compiled cache and, after `db_prepare_threshold`
+executions on a connection, psycopg's server-side prepared statement
+(never behind a transaction pooler, DB_TRANSACTION_POOLER).
+They select plain columns (numerics cast to float in SQL) and the fetch
+helpers return the read models of app/read_models.py, without identity map
+entries, relationship collections or change tracking.
+"""
+from sqlalchemy import Float, bindparam, cast, func, insert, select, update
+from sqlalchemy.orm import Session
+
+from app.models import User, Indoor, IndoorHistory, Plant, WateringHistory, WateringSession
+from app.read_models import (
+    UserRef,
+    IndoorSummary,
+    IndoorView,
+    IndoorPlantView,
+    HistoryEntry,
+    PlantSchedule,
+    PlantCalendarEntry,
+    PlantWateringEntry,
+    load,
+    load_one,
+)
+
+
+def as_float(column):
+    """Numeric column converted to float by the database, not via Decimal"""
+    return cast(column, Float).label(column.key)
+
+
+# ============ USERS ============
+
+USER_BY_TELEGRAM_ID = select(
+    User.id, User.telegram_user_id, User.timezone, User.change_seq
+).where(User.telegram_user_id == bindparam("telegram_user_id"))
+
+# ============ DASHBOARD ============
+
+# Counter caches kept by triggers (app/counters.py)
+USER_COUNTERS = select(User.indoors_total, User.plants_total).where(User.id == bindparam("user_id"))
+
+USER_PLANTS_SCHEDULE = select(
+    Plant.id, Plant.name, Plant.next_water_at
+).where(Plant.user_id == bindparam("user_id"))
+
+USER_PLANTS_CALENDAR = (
+    select(Plant.id, Plant.name, Plant.indoor_id, Plant.next_water_at, Plant.watering_interval_days)
+    .where(Plant.user_id == bindparam("user_id"), Plant.next_water_at.isnot(None))
+    .order_by(Plant.name, Plant.id)
+)
+
+# ============ INDOORS ============
+
+INDOOR_LIST = (
+    select(Indoor.id, Indoor.name, Indoor.plants_count)
+    .where(Indoor.user_id == bindparam("user_id"))
+    .order_by(Indoor.created_at)
+)
+
+INDOOR_DETAIL = select(
+    Indoor.id,
+    Indoor.user_id,
+    Indoor.name,
+    as_float(Indoor.temp_c),
+    as_float(Indoor.humidity),
+    Indoor.fan_location,
+    Indoor.extractor_top,
+    Indoor.extractor_bottom,
+    Indoor.fan,
+    as_float(Indoor.light_height_cm),
+    Indoor.light_power_pct,
+    Indoor.light_schedule,
+).where(Indoor.id == bindparam("indoor_id"), Indoor.user_id == bindparam("user_id"))
+
+INDOOR_PLANTS = select(
+    Plant.id,
+    Plant.name,
+    Plant.species,
+    Plant.planted_at,
+    Plant.last_watered_at,
+    Plant.next_water_at,
+    Plant.watering_interval_days,
+).where(Plant.indoor_id == bindparam("indoor_id"))
+
+# First `per_indoor` plants of every indoor of the user, in one query
+_RANKED_PLANTS = (
+    select(
+        *INDOOR_PLANTS.selected_columns,
+        Plant.indoor_id,
+        func.count().over(partition_by=Plant.indoor_id).label("indoor_plants"),
+        func.row_number().over(partition_by=Plant.indoor_id, order_by=(Plant.name, Plant.id)).label("position"),
+    )
+    .where(Plant.user_id == bindparam("user_id"), Plant.indoor_id.isnot(None))
+    .subquery()
+)
+
+PLANT_PAGES = (
+    select(
+        *(_RANKED_PLANTS.c[column.key] for column in INDOOR_PLANTS.selected_columns),
+        _RANKED_PLANTS.c.indoor_id,
+        _RANKED_PLANTS.c.indoor_plants,
+    )
+    .where(_RANKED_PLANTS.c.position <= bindparam("per_indoor"))
+    .order_by(_RANKED_PLANTS.c.indoor_id, _RANKED_PLANTS.c.position)
+)
+
+# Latest events shown on the indoor detail; older ones are summarised by app/retention.py
+INDOOR_HISTORY_LIMIT = 100
+
+INDOOR_HISTORY = (
+    select(IndoorHistory.event_ts, IndoorHistory.message)
+    .where(IndoorHistory.indoor_id == bindparam("indoor_id"))
+    .order_by(IndoorHistory.event_ts.desc())
+    .limit(INDOOR_HISTORY_LIMIT)
+)
+
+INDOOR_OWNED = select(Indoor.id).where(
+    Indoor.id == bindparam("indoor_id"), Indoor.user_id == bindparam("user_id")
+)
+
+# ============ PLANTS ============
+
+PLANT_RESPONSE_COLUMNS = (
+    Plant.id,
+    Plant.indoor_id,
+    Plant.name,
+    Plant.species,
+    Plant.last_watered_at,
+    Plant.next_water_at,
+    Plant.watering_interval_days,
+    as_float(Plant.default_liters),
+)
+
+PLANT_FOR_WATERING = select(Plant.id, Plant.indoor_id, Plant.watering_interval_days).where(
+    Plant.id == bindparam("plant_id"), Plant.user_id == bindparam("user_id")
+)
+
+INSERT_WATERING = insert(WateringHistory).returning(
+    WateringHistory.id,
+    WateringHistory.event_ts,
+    as_float(WateringHistory.liters),
+    WateringHistory.note,
+    WateringHistory.ferts,
+)
+
+# bindparam names must differ from column names inside SET
+UPDATE_PLANT_WATERED = (
+    update(Plant)
+    .where(Plant.id == bindparam("plant_id"))
+    .values(
+        last_watered_at=bindparam("new_last_watered_at"),
+        next_water_at=bindparam("new_next_water_at"),
+    )
+    .returning(*PLANT_RESPONSE_COLUMNS)
+)
+
+
+# ============ WATERING SESSIONS ============
+
+PLANTS_FOR_SESSION = select(
+    Plant.id, Plant.indoor_id, Plant.watering_interval_days, as_float(Plant.default_liters)
+).where(
+    Plant.id.in_(bindparam("plant_ids", expanding=True)), Plant.user_id == bindparam("user_id")
+)
+
+INSERT_SESSION = insert(WateringSession).returning(
+    WateringSession.id,
+    WateringSession.indoor_id,
+    WateringSession.event_ts,
+    as_float(WateringSession.total_liters),
+    WateringSession.note,
+    WateringSession.ferts,
+)
+
+# Executed with one parameter set per plant (executemany), so no RETURNING
+INSERT_SESSION_WATERING = insert(WateringHistory)
+
+# Table-level statement: the ORM would treat an executemany UPDATE as a bulk
+# update by primary key
+MARK_PLANT_WATERED = (
+    update(Plant.__table__)
+    .where(Plant.__table__.c.id == bindparam("plant_id"))
+    .values(
+        last_watered_at=bindparam("new_last_watered_at"),
+        next_water_at=bindparam("new_next_water_at"),
+    )
+)
+
+PLANTS_BY_IDS = select(*PLANT_RESPONSE_COLUMNS).where(Plant.id.in_(bindparam("plant_ids", expanding=True)))
+
+# Session waterings take note and ferts from their session: one join, no JSON copies
+PLANT_WATERINGS = (
+    select(
+        WateringHistory.id,
+        WateringHistory.event_ts,
+        as_float(WateringHistory.liters),
+        func.coalesce(WateringHistory.note, WateringSession.note).label("note"),
+        func.coalesce(WateringHistory.ferts, WateringSession.ferts).label("ferts"),
+        WateringHistory.session_id,
+    )
+    .join(Plant, Plant.id == WateringHistory.plant_id)
+    .outerjoin(WateringSession, WateringSession.id == WateringHistory.session_id)
+    .where(WateringHistory.plant_id == bindparam("plant_id"), Plant.user_id == bindparam("user_id"))
+    .order_by(WateringHistory.event_ts.desc())
+    .limit(bindparam("limit"))
+)
+
+
+def fetch_user(db: Session, telegram_user_id: int) -> UserRef | None:
+    return load_one(UserRef, db.execute(USER_BY_TELEGRAM_ID, {"telegram_user_id": telegram_user_id}).first())
+
+
+def fetch_user_counters(db: Session, user_id) -> tuple[int, int]:
+    """(indoors_total, plants_total) of a user"""
+    row = db.execute(USER_COUNTERS, {"user_id": user_id}).first()
+    return tuple(row) if row is not None else (0, 0)
+
+
+def fetch_plants_schedule(db: Session, user_id) -> list[PlantSchedule]:
+    return load(PlantSchedule, db.execute(USER_PLANTS_SCHEDULE, {"user_id": user_id}))
+
+
+def fetch_plants_calendar(db: Session, user_id) -> list[PlantCalendarEntry]:
+    return load(PlantCalendarEntry, db.execute(USER_PLANTS_CALENDAR, {"user_id": user_id}))
+
+
+def fetch_indoor_list(db: Session, user_id) -> list[IndoorSummary]:
+    return load(IndoorSummary, db.execute(INDOOR_LIST, {"user_id": user_id}))
+
+
+def fetch_indoor(db: Session, user_id, indoor_id) -> IndoorView | None:
+    return load_one(IndoorView, db.execute(INDOOR_DETAIL, {"user_id": user_id, "indoor_id": indoor_id}).first())
+
+
+def fetch_indoor_plants(db: Session, indoor_id) -> list[IndoorPlantView]:
+    return load(IndoorPlantView, db.execute(INDOOR_PLANTS, {"indoor_id": indoor_id}))
+
+
+def fetch_indoor_history(db: Session, indoor_id) -> list[HistoryEntry]:
+    return load(HistoryEntry, db.execute(INDOOR_HISTORY, {"indoor_id": indoor_id}))
+
+
+def fetch_plant_pages(db: Session, user_id, per_indoor: int) -> dict:
+    """{indoor_id: (plants in the page, plants in the indoor)}"""
+    pages = {}
+    width = len(INDOOR_PLANTS.selected_columns)
+    for row in db.execute(PLANT_PAGES, {"user_id": user_id, "per_indoor": per_indoor}):
+        page = pages.setdefault(row.indoor_id, ([], row.indoor_plants))
+        page[0].append(IndoorPlantView(*row[:width]))
+    return pages
+
+
+def indoor_belongs_to(db: Session, user_id, indoor_id) -> bool:
+    return db.execute(INDOOR_OWNED, {"user_id": user_id, "indoor_id": indoor_id}).first() is not None
+
+
+def fetch_plant_waterings(db: Session, user_id, plant_id, limit: int = 50) -> list[PlantWateringEntry]:
+    return load(PlantWateringEntry, db.execute(
+        PLANT_WATERINGS, {"user_id": user_id, "plant_id": plant_id, "limit": limit}
+    ))
@@ -0,0 +1,138 @@
+"""
+Read models for list and detail views.
+
+Compact __slots__ dataclasses filled positionally from Core rows (see
+app/queries.py). They carry only the columns a view renders, numeric
+columns arrive as float (cast in SQL) and nothing is tracked by a session,
+so thousands of plants cost a fraction of the memory and CPU of ORM
+entities.
+"""
+from dataclasses import dataclass
+from datetime import date, datetime
+from uuid import UUID
+
+
+@dataclass(slots=True, frozen=True)
+class UserRef:
+    id: UUID
+    telegram_user_id: int
+    timezone: str | None
+    change_seq: int  # last change_log seq, tells caches whether they are current
+
+
+@dataclass(slots=True, frozen=True)
+class IndoorSummary:
+    id: UUID
+    name: str
+    plants_count: int
+
+
+@dataclass(slots=True, frozen=True)
+class IndoorView:
+    id: UUID
+    user_id: UUID
+    name: str
+    temp_c: float | None
+    humidity: float | None
+    fan_location: str | None
+    extractor_top: bool | None
+    extractor_bottom: bool | None
+    fan: bool | None
+    light_height_cm: float | None
+    light_power_pct: int | None
+    light_schedule: str | None
+
+
+@dataclass(slots=True, frozen=True)
+class IndoorPlantView:
+    id: UUID
+    name: str
+    species: str | None
+    planted_at: date | None
+    last_watered_at: date | None
+    next_water_at: date | None
+    watering_interval_days: int
+
+
+@dataclass(slots=True, frozen=True)
+class HistoryEntry:
+    event_ts: datetime
+    message: str
+
+
+@dataclass(slots=True, frozen=True)
+class PlantSchedule:
+    id: UUID
+    name: str
+    next_water_at: date | None
+
+
+@dataclass(slots=True, frozen=True)
+class PlantCalendarEntry:
+    id: UUID
+    name: str
+    indoor_id: UUID | None
+    next_water_at: date | None
+    watering_interval_days: int
+
+
+@dataclass(slots=True, frozen=True)
+class PlantView:
+    id: UUID
+    indoor_id: UUID | None
+    name: str
+    species: str | None
+    last_watered_at: date | None
+    next_water_at: date | None
+    watering_interval_days: int
+    default_liters: float
+
+
+@dataclass(slots=True, frozen=True)
+class WateringView:
+    id: UUID
+    event_ts: datetime
+    liters: float
+    note: str | None
+    ferts: dict | None
+
+
+@dataclass(slots=True, frozen=True)
+class WateringSessionView:
+    id: UUID
+    indoor_id: UUID | None
+    event_ts: datetime
+    total_liters: float
+    note: str | None
+    ferts: dict | None
+
+
+@dataclass(slots=True, frozen=True)
+class PlantWateringEntry:
+    id: UUID
+    event_ts: datetime
+    liters: float
+    note: str | None
+    ferts: dict | None
+    session_id: UUID | None
+
+
+@dataclass(slots=True, frozen=True)
+class LightPeriodView:
+    starts_at: datetime
+    schedule: str | None
+    on_minutes: int | None
+    off_minutes: int | None
+    cycle_start: datetime | None
+    power_pct: int | None
+    light_hours: float
+    light_dli: float
+
+
+def load(model, rows) -> list:
+    """Build read models from result rows (columns in field order)"""
+    return [model(*row) for row in rows]
+
+
+def load_one(model, row):
+    return model(*row) if row is not None else None
@@ -0,0 +1,345 @@
+"""
+History retention: summarise, archive and delete old history rows.
+
+    python -m app.retention [--dry-run] [--table indoor_history] [--batch-size 500]
+
+For each table and user tier, rows older than the policy's days are, one
+batch at a time and in a single transaction per batch:
+
+1. locked with FOR UPDATE SKIP LOCKED (rows in use by a request are left
+   for the next run),
+2. appended to `{RETENTION_ARCHIVE_DIR}/{table}/{run date}.ndjson.gz` (one
+   gzip member per batch, fsynced before the delete commits),
+3. added to the per-day summary tables (indoor_history_daily, watering_daily),
+4. deleted by primary key and logged to change_log as deletes, so synced
+   clients drop them too.
+
+Batches are small and separated by RETENTION_PAUSE_MS, so the job never
+holds many locks or writes a burst of WAL. It can be stopped and re-run at
+any time; a batch whose transaction failed may be archived twice.
+Normalized fertilizer rows of deleted waterings are kept (detached), so
+fertilizer usage reports still cover archived periods. A full run also
+prunes change_log entries older than SYNC_LOG_DAYS.
+"""
+import gzip
+import json
+import os
+import time
+from abc import ABC, abstractmethod
+from collections import defaultdict
+from dataclasses import dataclass
+from datetime import date, datetime, timedelta, timezone
+from decimal import Decimal
+
+from sqlalchemy import create_engine, delete, func, select, text, tuple_, update
+from sqlalchemy.orm import Session
+from sqlalchemy.pool import NullPool
+
+from app.config import settings
+from app.models import (
+    User, Indoor, IndoorHistory, Plant, WateringHistory, WateringFertilizer, IndoorHistoryDaily, WateringDaily
+)
+from app.services import get_zone
+from app.services.sync_service import log_changes, prune as prune_change_log
+
+# Days kept per table and tier; None keeps rows forever
+DEFAULT_POLICIES = {
+    "indoor_history": {"free": 180, "pro": 730},
+    "watering_history": {"free": 365, "pro": None},
+}
+
+# Only one retention run at a time (Postgres advisory lock key)
+LOCK_KEY = 0x706C616E  # "plan"
+
+
+def load_policies(raw: str = "") -> dict:
+    """Default policies with the RETENTION_POLICIES JSON merged over them"""
+    policies = {table: dict(tiers) for table, tiers in DEFAULT_POLICIES.items()}
+    for table, tiers in (json.loads(raw) if raw else {}).items():
+        if table not in policies:
+            raise ValueError(f"Unknown retention table: {table}")
+        policies[table].update(tiers)
+    return policies
+
+
+def local_day(ts: datetime, tz: str | None) -> date:
+    zone = get_zone(tz)
+    if zone is not None and ts.tzinfo is not None:
+        return ts.astimezone(zone).date()
+    return ts.date()
+
+
+# ============ TABLES ============
+
+@dataclass
+class HistoryTable(ABC):
+    """How to find, archive, summarise and delete expired rows of one table"""
+    name: str
+    model: type
+    columns: tuple
+    owner: tuple  # joins from the history row to users
+
+    def expired(self, tier: str, cutoff: datetime):
+        query = select(
+            *self.columns, User.id.label("user_id"), User.timezone.label("user_timezone")
+        ).select_from(self.model)
+        for target, condition in self.owner:
+            query = query.join(target, condition)
+        return query.where(User.tier == tier, self.model.event_ts < cutoff)
+
+    def count(self, db: Session, tier: str, cutoff: datetime) -> int:
+        expired = self.expired(tier, cutoff).subquery()
+        return db.execute(select(func.count()).select_from(expired)).scalar_one()
+
+    def batch(self, db: Session, tier: str, cutoff: datetime, after, size: int) -> list:
+        query = self.expired(tier, cutoff)
+        if after is not None:
+            query = query.where(tuple_(self.model.event_ts, self.model.id) > after)
+        query = (
+            query.order_by(self.model.event_ts, self.model.id)
+            .limit(size)
+            .with_for_update(of=self.model, skip_locked=True)
+        )
+        return db.execute(query).all()
+
+    @abstractmethod
+    def summarise(self, db: Session, rows: list) -> int:
+        """Add the rows to the per-day summaries. Returns the days touched."""
+
+    def before_delete(self, db: Session, ids: list) -> None:
+        pass
+
+
+class IndoorHistoryTable(HistoryTable):
+    def summarise(self, db: Session, rows: list) -> int:
+        days = {}
+        for row in rows:
+            key = (row.indoor_id, local_day(row.event_ts, row.user_timezone))
+            day = days.setdefault(key, {"events": 0, "first_ts": row.event_ts, "last_ts": row.event_ts, "last_message": None})
+            day["events"] += 1
+            day["first_ts"] = min(day["first_ts"], row.event_ts)
+            if row.event_ts >= day["last_ts"]:
+                day["last_ts"], day["last_message"] = row.event_ts, row.message
+
+        existing = {
+            (summary.indoor_id, summary.day): summary
+            for summary in db.execute(
+                select(IndoorHistoryDaily).where(
+                    tuple_(IndoorHistoryDaily.indoor_id, IndoorHistoryDaily.day).in_(list(days))
+                )
+            ).scalars()
+        }
+        for (indoor_id, day), values in days.items():
+            summary = existing.get((indoor_id, day))
+            if summary is None:
+                db.add(IndoorHistoryDaily(indoor_id=indoor_id, day=day, **values))
+                continue
+            summary.events += values["events"]
+            summary.first_ts = min(summary.first_ts, values["first_ts"])
+            if values["last_ts"] >= summary.last_ts:
+                summary.last_ts, summary.last_message = values["last_ts"], values["last_message"]
+        return len(days)
+
+
+class WateringHistoryTable(HistoryTable):
+    def summarise(self, db: Session, rows: list) -> int:
+        days = {}
+        for row in rows:
+            key = (row.plant_id, local_day(row.event_ts, row.user_timezone))
+            day = days.setdefault(key, {"waterings": 0, "liters": Decimal(0)})
+            day["waterings"] += 1
+            day["liters"] += row.liters
+
+        existing = {
+            (summary.plant_id, summary.day): summary
+            for summary in db.execute(
+                select(WateringDaily).where(tuple_(WateringDaily.plant_id, WateringDaily.day).in_(list(days)))
+            ).scalars()
+        }
+        for (plant_id, day), values in days.items():
+            summary = existing.get((plant_id, day))
+            if summary is None:
+                db.add(WateringDaily(plant_id=plant_id, day=day, **values))
+            else:
+                summary.waterings += values["waterings"]
+                summary.liters += values["liters"]
+        return len(days)
+
+    def before_delete(self, db: Session, ids: list) -> None:
+        # Keep fertilizer usage of archived waterings
+        db.execute(
+            update(WateringFertilizer.__table__)
+            .where(WateringFertilizer.__table__.c.watering_id.in_(ids))
+            .values(watering_id=None)
+        )
+
+
+TABLES = {
+    "indoor_history": IndoorHistoryTable(
+        "indoor_history",
+        IndoorHistory,
+        (IndoorHistory.id, IndoorHistory.indoor_id, IndoorHistory.event_ts, IndoorHistory.message, IndoorHistory.payload),
+        ((Indoor, Indoor.id == IndoorHistory.indoor_id), (User, User.id == Indoor.user_id)),
+    ),
+    "watering_history": WateringHistoryTable(
+        "watering_history",
+        WateringHistory,
+        (
+            WateringHistory.id, WateringHistory.plant_id, WateringHistory.event_ts, WateringHistory.liters,
+            WateringHistory.note, WateringHistory.ferts, WateringHistory.session_id,
+        ),
+        ((Plant, Plant.id == WateringHistory.plant_id), (User, User.id == Plant.user_id)),
+    ),
+}
+
+
+# ============ ARCHIVE ============
+
+# Selected to summarise and log the rows, not part of them
+OWNER_COLUMNS = ("user_id", "user_timezone")
+
+def _json_default(value):
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    if isinstance(value, Decimal):
+        return float(value)
+    return str(value)
+
+
+def archive(path: str, rows: list) -> None:
+    """Append rows as one gzip member of NDJSON and fsync it"""
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "ab") as raw:
+        with gzip.GzipFile(fileobj=raw, mode="ab") as gz:
+            for row in rows:
+                record = {key: value for key, value in row._mapping.items() if key not in OWNER_COLUMNS}
+                gz.write(json.dumps(record, default=_json_default, separators=(",", ":")).encode() + b"\n")
+        raw.flush()
+        os.fsync(raw.fileno())
+
+
+# ============ RUN ============
+
+def _lock_connection(db: Session):
+    """
+    Connection for the run lock. Behind a transaction pooler a session lock
+    would stay on whichever server connection took it, after this run and
+    for other clients, so it is taken on the shard's direct URL instead.
+    """
+    bind = db.get_bind()
+    if not settings.db_transaction_pooler:
+        return bind.connect()
+    from app.database import direct_urls, shard_engines
+
+    pooled = [settings.database_url, *settings.database_shards]
+    shard = shard_engines.index(bind) if bind in shard_engines else None
+    if shard is None or direct_urls()[shard] == pooled[shard]:
+        raise RuntimeError("DB_TRANSACTION_POOLER needs DATABASE_DIRECT_URL (and DATABASE_SHARDS_DIRECT) for retention")
+    return create_engine(direct_urls()[shard], poolclass=NullPool).connect()
+
+
+def run(
+    db: Session,
+    tables: list[str] | None = None,
+    dry_run: bool = False,
+    batch_size: int | None = None,
+    pause_seconds: float | None = None,
+    archive_dir: str | None = None,
+    now: datetime | None = None,
+    progress=print,
+) -> dict:
+    """
+    Apply the retention policies. Returns {table: {tier: rows}} with the
+    rows deleted (or that would be, in dry-run).
+    """
+    policies = load_policies(settings.retention_policies)
+    batch_size = batch_size or settings.retention_batch_size
+    pause_seconds = settings.retention_pause_ms / 1000 if pause_seconds is None else pause_seconds
+    archive_dir = archive_dir or settings.retention_archive_dir
+    now = now or datetime.now(timezone.utc)
+    postgres = db.get_bind().dialect.name == "postgresql"
+
+    # Session-level lock, held on its own connection (the session's may change between batches)
+    lock = _lock_connection(db) if postgres and not dry_run else None
+    if lock is not None:
+        if not lock.execute(text("SELECT pg_try_advisory_lock(:key)"), {"key": LOCK_KEY}).scalar():
+            lock.close()
+            raise RuntimeError("Another retention run is in progress")
+        lock.commit()
+
+    result = {}
+    try:
+        for name in tables or list(TABLES):
+            table = TABLES[name]
+            result[name] = {}
+            path = os.path.join(archive_dir, name, f"{now:%Y-%m-%d}.ndjson.gz")
+            for tier, days in policies[name].items():
+                if days is None:
+                    continue
+                cutoff = now - timedelta(days=days)
+                total = table.count(db, tier, cutoff)
+                db.rollback()  # don't keep the snapshot open between batches
+                if dry_run or not total:
+                    progress(f"[retention] {name} tier={tier} keep {days}d: {total} rows older than {cutoff:%Y-%m-%d}")
+                    result[name][tier] = total
+                    continue
+
+                done = summaries = 0
+                after = None
+                while True:
+                    rows = table.batch(db, tier, cutoff, after, batch_size)
+                    if not rows:
+                        db.rollback()
+                        break
+                    ids = [row.id for row in rows]
+                    archive(path, rows)
+                    summaries += table.summarise(db, rows)
+                    table.before_delete(db, ids)
+                    db.execute(delete(table.model.__table__).where(table.model.__table__.c.id.in_(ids)))
+                    by_user = defaultdict(list)
+                    for row in rows:
+                        by_user[row.user_id].append(row.id)
+                    # In user order, like other writers taking the users' change_log locks
+                    for user_id in sorted(by_user, key=str):
+                        log_changes(db, name, user_id, by_user[user_id], op="delete")
+                    db.commit()
+
+                    done += len(rows)
+                    after = (rows[-1].event_ts, rows[-1].id)
+                    progress(f"[retention] {name} tier={tier}: {done}/{total} rows archived, {summaries} day summaries updated")
+                    if pause_seconds:
+                        time.sleep(pause_seconds)
+                result[name][tier] = done
+
+        if not dry_run and not tables:
+            pruned = prune_change_log(db, now - timedelta(days=settings.sync_log_days))
+            progress(f"[retention] change_log: {pruned} entries older than {settings.sync_log_days}d pruned")
+    finally:
+        if lock is not None:
+            lock.execute(text("SELECT pg_advisory_unlock(:key)"), {"key": LOCK_KEY})
+            lock.close()
+    return result
+
+
+if __name__ == "__main__":
+    import argparse
+    from app.database import SessionLocal, shard_engines
+
+    parser = argparse.ArgumentParser(description="Summarise, archive and delete old history rows")
+    parser.add_argument("--dry-run", action="store_true", help="only count the rows that would be archived")
+    parser.add_argument("--table", action="append", choices=list(TABLES), help="limit to a table (repeatable)")
+    parser.add_argument("--batch-size", type=int, default=None)
+    parser.add_argument("--archive-dir", default=None)
+    args = parser.parse_args()
+
+    # Each shard keeps its own history
+    for shard, bind in enumerate(shard_engines):
+        db = SessionLocal(bind=bind)
+        try:
+            result = run(db, args.table, args.dry_run, args.batch_size, archive_dir=args.archive_dir)
+            verb = "would archive" if args.dry_run else "archived"
+            prefix = f"shard {shard} " if len(shard_engines) > 1 else ""
+            for name, tiers in result.items():
+                print(f"{prefix}{name}: {verb} {sum(tiers.values())} rows {tiers}")
+        finally:
+            db.close()
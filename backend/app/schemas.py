@@ -2,8 +2,8 @@
 Pydantic schemas for API responses
 """
 from datetime import date, datetime
-from typing import Optional, List
-from pydantic import BaseModel
+from typing import Optional, List, Union
+from pydantic import BaseModel, Field
 from uuid import UUID
 
 
@@ -123,7 +123,8 @@ class IndoorUpdateRequest(BaseModel):
 
 class FertilizerItem(BaseModel):
     name: str
-    amount: str
+    amount: Union[str, float]  # "5", "5 ml", "2,5 ml/L" or 5
+    unit: Optional[str] = None  # "ml", "g", "ml/l", "g/l"; default ml
 
 
 class WateringHistoryItem(BaseModel):
@@ -176,3 +177,227 @@ class PlantCreateRequest(BaseModel):
 
     class Config:
         from_attributes = True
+
+
+class PlantWateringItem(WateringHistoryItem):
+    session_id: Optional[UUID]
+
+
+class PlantSearchResult(BaseModel):
+    id: UUID
+    name: str
+    species: Optional[str]
+    indoor_id: Optional[UUID]
+    score: float  # 0-1.3, higher first
+
+    class Config:
+        from_attributes = True
+
+
+# ============ WATERING SESSIONS ============
+
+class WateringSessionPlant(BaseModel):
+    plant_id: UUID
+    liters: Optional[float] = None  # default_liters of the plant
+
+
+class WateringSessionRequest(BaseModel):
+    plants: List[WateringSessionPlant]
+    date: Optional[date] = None
+    note: Optional[str] = None
+    ferts: Optional[List[FertilizerItem]] = None
+
+
+class WateringSessionItem(BaseModel):
+    id: UUID
+    indoor_id: Optional[UUID]
+    event_ts: datetime
+    total_liters: float
+    note: Optional[str]
+    ferts: Optional[dict]
+
+    class Config:
+        from_attributes = True
+
+
+class WateringSessionResponse(BaseModel):
+    session: WateringSessionItem
+    plants: List[PlantResponse]
+
+
+# ============ FERTILIZERS ============
+
+class FertilizerResponse(BaseModel):
+    id: UUID
+    name: str
+    default_unit: Optional[str]
+    waterings: int
+    last_used_at: Optional[datetime]
+
+    class Config:
+        from_attributes = True
+
+
+class FertilizerUsageItem(BaseModel):
+    fertilizer_id: UUID
+    fertilizer: str
+    indoor_id: Optional[UUID]
+    period: datetime
+    total: float
+    unit: str
+    waterings: int
+
+    class Config:
+        from_attributes = True
+
+
+class FertilizerUsageResponse(BaseModel):
+    period: str
+    items: List[FertilizerUsageItem]
+    unparsed_waterings: int
+
+
+# ============ BOOTSTRAP ============
+
+class IndoorPlantsPage(BaseModel):
+    indoor_id: UUID
+    plants: List[PlantInIndoor]
+    plants_total: int
+
+
+class BootstrapResponse(BaseModel):
+    """Sections not asked for with `include=` are left out"""
+    dashboard: Optional[DashboardResponse] = None
+    indoors: Optional[List[IndoorListItem]] = None
+    plants: Optional[List[IndoorPlantsPage]] = None
+
+
+# ============ SYNC ============
+
+class SyncPlant(BaseModel):
+    id: UUID
+    indoor_id: Optional[UUID]
+    name: str
+    species: Optional[str]
+    planted_at: Optional[date]
+    notes: Optional[str]
+    last_watered_at: Optional[date]
+    next_water_at: Optional[date]
+    watering_interval_days: int
+    default_liters: float
+
+    class Config:
+        from_attributes = True
+
+
+class SyncWatering(BaseModel):
+    id: UUID
+    plant_id: UUID
+    event_ts: datetime
+    liters: float
+    note: Optional[str]
+    ferts: Optional[dict]
+    session_id: Optional[UUID]
+
+    class Config:
+        from_attributes = True
+
+
+class SyncIndoorHistory(BaseModel):
+    id: UUID
+    indoor_id: UUID
+    event_ts: datetime
+    message: str
+
+    class Config:
+        from_attributes = True
+
+
+class SyncTombstone(BaseModel):
+    table: str
+    id: UUID
+
+
+class SyncResponse(BaseModel):
+    """Tables without changes are left out"""
+    token: str  # pass as `since` on the next sync
+    reset: bool  # full snapshot of indoors and plants: replace local state
+    has_more: bool  # more changes after `token`, sync again right away
+    indoors: Optional[List[IndoorDetail]] = None
+    plants: Optional[List[SyncPlant]] = None
+    watering_sessions: Optional[List[WateringSessionItem]] = None
+    watering_history: Optional[List[SyncWatering]] = None
+    indoor_history: Optional[List[SyncIndoorHistory]] = None
+    deleted: Optional[List[SyncTombstone]] = None
+
+
+# ============ CALENDAR ============
+
+class CalendarPlant(BaseModel):
+    id: UUID
+    name: str
+    indoor_id: Optional[UUID]
+
+    class Config:
+        from_attributes = True
+
+
+class CalendarDay(BaseModel):
+    date: date
+    groups: List[int]  # indexes into CalendarResponse.groups
+    count: int  # plants to water that day
+
+
+class CalendarResponse(BaseModel):
+    start: date
+    end: date
+    plants: List[CalendarPlant]
+    groups: List[List[int]]  # plants (indexes into `plants`) watered on the same dates
+    days: List[CalendarDay]  # only days with waterings
+
+
+# ============ LIGHT ============
+
+class LightScheduleInfo(BaseModel):
+    schedule: Optional[str]  # as written
+    on_hours: Optional[float]  # None if the schedule can't be read
+    off_hours: Optional[float]
+    on_at: Optional[str]  # local time lights go on, "HH:MM"
+    power_pct: Optional[int]
+
+
+class LightDay(BaseModel):
+    day: date
+    light_hours: float
+    dli: float  # relative: full-power hours
+
+
+class LightResponse(BaseModel):
+    start: date
+    end: date
+    current: LightScheduleInfo
+    light_hours: float
+    dli: float  # relative: full-power hours (hours x power / 100)
+    days: List[LightDay]
+
+
+# ============ BOT ============
+
+class BotMessageRequest(BaseModel):
+    text: str = Field(..., min_length=1, max_length=500)
+
+
+class BotEntity(BaseModel):
+    kind: str  # "plant" | "indoor"
+    id: UUID
+    name: str
+
+    class Config:
+        from_attributes = True
+
+
+class BotMessageResponse(BaseModel):
+    intent: str  # "water" | "light" | "schedule" | "help" | "unknown"
+    reply: str
+    done: bool  # False: nothing changed (a question, an error or a name to clarify)
+    entities: List[BotEntity]
@@ -11,6 +11,7 @@ from sqlalchemy.orm import Session
 from app.database import SessionLocal, engine
 from app.models import User, Indoor, IndoorHistory, Plant, WateringHistory
 from app.services import compute_next_water_at
+from app.services.light_service import record_period
 
 
 def create_user(db: Session, telegram_user_id: int) -> User:
@@ -83,6 +84,7 @@ def create_indoors(db: Session, user: User) -> list[Indoor]:
                 payload=None
             )
             db.add(history)
+            record_period(db, indoor.id, user.id, indoor.light_schedule, indoor.light_power_pct, indoor.created_at)
             indoors.append(indoor)
     
     db.commit()
@@ -0,0 +1,128 @@
+"""
+Production server entrypoint.
+
+    python -m app.server              # host/port from $PORT / BACKEND_PORT
+    python -m app.server --print-workers
+
+Runs uvicorn with several worker processes. The count comes from WEB_WORKERS
+or, when that is 0, from the CPU count, capped so that every worker can fill
+its connection pool without going over DB_MAX_CONNECTIONS. SQLite always
+runs one worker: its single writer connection is what orders the writes.
+
+Several workers need state shared between processes (see `unshared_state`):
+without it the automatic count falls back to one worker, and an explicit
+WEB_WORKERS > 1 refuses to start.
+
+Lifecycle (uvicorn's process supervisor):
+  SIGTERM / SIGINT  stop accepting, let in-flight requests finish for up to
+                    GRACEFUL_TIMEOUT_SECONDS, run shutdown (drains the indoor
+                    write-behind buffer), then exit
+  SIGHUP            restart the workers one at a time (graceful reload)
+  SIGTTIN / SIGTTOU add / remove one worker
+Workers that stop answering are replaced.
+"""
+import os
+import tempfile
+
+from app.config import settings
+
+
+def connections_per_worker() -> int:
+    """Database connections one worker can hold at peak"""
+    if settings.database_url.startswith("sqlite"):
+        # The writer plus the read-only pool
+        connections = 1 + settings.sqlite_read_pool_size
+    else:
+        connections = settings.db_pool_size + settings.db_max_overflow
+    if settings.change_feed_enabled or settings.events_transport == "postgres":
+        connections += 1  # LISTEN connection (app.changefeed, shared with SSE events)
+    return connections
+
+
+def unshared_state() -> list[str]:
+    """Settings that keep state in one process, so other workers would not see it"""
+    problems = []
+    if settings.cache_backend == "memory" and not settings.change_feed_enabled:
+        problems.append(
+            "CACHE_BACKEND=memory without CHANGE_FEED_ENABLED=true: "
+            "writes don't drop the read models cached by other workers"
+        )
+    if settings.events_transport != "postgres":
+        problems.append(
+            f"EVENTS_TRANSPORT={settings.events_transport}: "
+            "live updates don't reach clients connected to other workers (use postgres)"
+        )
+    if settings.indoor_write_behind_ms > 0:
+        problems.append(
+            "INDOOR_WRITE_BEHIND_MS > 0: buffered indoor updates are only seen "
+            "by the worker that took them until they are flushed"
+        )
+    if settings.database_read_url and not settings.change_feed_enabled:
+        problems.append(
+            "DATABASE_READ_URL without CHANGE_FEED_ENABLED=true: "
+            "read-your-writes only holds on the worker that took the write"
+        )
+    return problems
+
+
+def worker_count() -> int:
+    if settings.database_url.startswith("sqlite"):
+        return 1  # each worker would open its own writer: they'd fight over the file lock
+    if settings.web_workers > 0:
+        return settings.web_workers
+    if unshared_state():
+        return 1
+    by_pool = settings.db_max_connections // connections_per_worker()
+    return max(1, min(os.cpu_count() or 1, by_pool))
+
+
+def main(host: str, port: int) -> None:
+    import uvicorn
+    from app.metrics import reset
+
+    workers = worker_count()
+    if workers < settings.web_workers:
+        print(f"[server] WEB_WORKERS={settings.web_workers} ignored: SQLite runs a single worker")
+    problems = unshared_state()
+    if problems:
+        for problem in problems:
+            print(f"[server] {problem}")
+        if workers > 1:
+            raise SystemExit(f"[server] WEB_WORKERS={workers} needs state shared between workers, see above")
+        print("[server] running a single worker")
+
+    # Workers inherit the environment, so they all write their metric files here
+    metrics_dir = settings.metrics_dir or os.path.join(tempfile.gettempdir(), f"plantulas-metrics-{port}")
+    os.makedirs(metrics_dir, exist_ok=True)
+    reset(metrics_dir)
+    os.environ["METRICS_DIR"] = metrics_dir
+
+    print(
+        f"[server] {workers} workers (cpus={os.cpu_count()}, "
+        f"{connections_per_worker()} connections each, limit {settings.db_max_connections}), "
+        f"metrics in {metrics_dir}"
+    )
+    uvicorn.run(
+        "app.main:app",
+        host=host,
+        port=port,
+        workers=workers,
+        timeout_graceful_shutdown=settings.graceful_timeout_seconds,
+        proxy_headers=True,
+        forwarded_allow_ips="*",
+    )
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="PlantulasBot API server")
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=int(os.environ.get("PORT", settings.backend_port)))
+    parser.add_argument("--print-workers", action="store_true", help="print the worker count and exit")
+    args = parser.parse_args()
+
+    if args.print_workers:
+        print(worker_count())
+    else:
+        main(args.host, args.port)
@@ -1,8 +1,9 @@
 """
 Services package
 """
-from datetime import date, timedelta
+from datetime import date, datetime, timedelta
 from typing import Optional
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
 
 
 def compute_next_water_at(
@@ -24,3 +25,40 @@ def compute_next_water_at(
     
     return last_watered_at + timedelta(days=watering_interval_days)
 
+
+def get_zone(timezone: Optional[str]) -> Optional[ZoneInfo]:
+    """Return the ZoneInfo for an IANA name, or None if empty/unknown"""
+    if not timezone:
+        return None
+    try:
+        return ZoneInfo(timezone)
+    except (ZoneInfoNotFoundError, ValueError):
+        return None
+
+
+def user_today(user) -> date:
+    """Today's date in the user's timezone (server time if not set)"""
+    return datetime.now(get_zone(user.timezone)).date()
+
+
+def seconds_until_midnight(user) -> float:
+    """Seconds until the next local midnight of the user"""
+    now = datetime.now(get_zone(user.timezone))
+    midnight = datetime.combine(now.date() + timedelta(days=1), datetime.min.time(), now.tzinfo)
+    return max(midnight.timestamp() - now.timestamp(), 1.0)
+
+
+def watering_status(due_in_days: int) -> str:
+    """Dashboard status for a plant due in `due_in_days` days"""
+    if due_in_days < 0:
+        return "OVERDUE"
+    if due_in_days <= 2:
+        return "DUE_SOON"
+    return "OK"
+
+
+def light_power_message(old_power: Optional[int], new_power: int) -> str:
+    """History message for a light power change"""
+    if old_power is not None and new_power > old_power:
+        return f"Se aumentó la potencia de la luz a {new_power}%."
+    return f"Se ajustó la potencia de la luz a {new_power}%."
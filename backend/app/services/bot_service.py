@@ -0,0 +1,632 @@
+"""
+Chat bot commands: Spanish messages to intents, entities and actions.
+
+The grammar is compiled once, when the module is imported: one regex per
+intent made from its synonyms, one per slot (liters, fertilizer doses,
+power, photoperiod, height, dates) and a translate table that lowercases
+and drops accents keeping every character in place, so fertilizer names
+can be cut from the original message. `parse()` needs no database and
+returns a `Command`; `handle()` resolves the names it carries and runs it
+through the same services as the API (register_watering, update_indoor).
+
+Plant names are resolved with the user's trigram index (search_service);
+indoor names with a small per-user list kept while the user's change_seq
+doesn't move. A name matching several entities about as well is asked
+back instead of guessed.
+
+    python -m app.services.bot_service check          # golden corpus
+    python -m app.services.bot_service parse "regué la monstera con 1 litro"
+    python -m app.bench --bot 20000                   # messages/sec
+"""
+import json
+import re
+import threading
+from collections import Counter, OrderedDict
+from dataclasses import dataclass, field, fields
+from datetime import timedelta
+from pathlib import Path
+from uuid import UUID
+
+from sqlalchemy.orm import Session
+
+from app.config import settings
+from app.models import Indoor
+from app.queries import PLANTS_BY_IDS, fetch_indoor_list, fetch_indoor_plants, fetch_plants_schedule
+from app.read_models import PlantView, load_one
+from app.services import user_today
+from app.services.indoor_service import update_indoor
+from app.services.light_service import parse_schedule
+from app.services.plant_service import register_watering, register_watering_session
+from app.services.search_service import normalize, plant_search, trigrams
+
+CORPUS_PATH = Path(__file__).with_name("bot_corpus.json")
+
+# A name resolves to the best match when it scores at least this much and
+# beats the next one by RESOLVE_MARGIN (search scores go up to 1.3)
+RESOLVE_MIN_SCORE = 0.5
+RESOLVE_MARGIN = 0.15
+
+# ============ GRAMMAR ============
+
+# Same length in and out: slot positions found in the folded text are valid in the original
+FOLD = str.maketrans("áéíóúüñàèìòùâêîôûäëïö¿¡?!", "aeiouunaeiouaeiouaeio    ")
+
+
+def fold(text: str) -> str:
+    return text.lower().translate(FOLD)
+
+
+def _words(*synonyms: str) -> str:
+    """Alternation of whole words or phrases, longest first"""
+    return r"\b(?:" + "|".join(sorted(synonyms, key=len, reverse=True)) + r")\b"
+
+
+# Only when that's the whole message ("hola, regué la monstera" is a watering)
+HELP = re.compile(r"^\s*(?:/start|/help|" + "|".join((
+    "ayuda", "help", "hola", "comandos", "que podes hacer", "que puedes hacer", "que sabes hacer",
+)) + r")[\s.,]*$")
+SCHEDULE_QUERY = re.compile(_words(
+    "cuando", "que toca", "toca regar", "toca riego", "hay que regar", "tengo que regar", "debo regar",
+    "pendiente", "pendientes", "proximo riego", "proximos riegos", "agenda", "calendario",
+))
+WATER = re.compile(_words(
+    "regue", "regamos", "regaste", "regar", "riego", "rega", "regale", "regales", "regada", "regado",
+    "regadas", "regados", "hidrate", "moje", "di agua", "le di agua", "les di agua", "dale agua", "dales agua",
+))
+LIGHT = re.compile(_words(
+    "luz", "luces", "lampara", "lamparas", "led", "leds", "foco", "focos", "potencia", "intensidad",
+    "dimmer", "fotoperiodo", "fotoperiodos", "floracion", "flora", "vege", "vegetativo", "vegetacion",
+))
+
+NUMBER_WORDS = {
+    "medio": 0.5, "media": 0.5, "un": 1, "uno": 1, "una": 1, "dos": 2, "tres": 3, "cuatro": 4, "cinco": 5,
+}
+NUMBER = r"\d+(?:[.,]\d+)?|" + "|".join(NUMBER_WORDS)
+
+# "hoy", "ayer", "anteayer", "hace 3 dias"
+DAYS_AGO = re.compile(r"\b(?:(hoy)|(anteayer|antes de ayer|antes ayer)|(ayer)|hace (\d{1,2}|un|una|dos|tres) dias?)\b")
+# "con 2 ml/l de Bio Grow", "5 ml de top max": a dose needs "de <name>", water doesn't
+FERT = re.compile(
+    r"\b(\d+(?:[.,]\d+)?)\s*(ml/l|g/l|ml|cc|g|gr)\s+de\s+(?!agua\b)([a-z][a-z0-9\- ]*?)\s*(?=,|;|\by\b|\bcon\b|\bal?\b|\bpara\b|$)"
+)
+# "1,5 litros", "medio litro", "un litro y medio", "500 ml", "2l"
+LITERS = re.compile(rf"\b({NUMBER})\s*(litros?|lts?|l|mililitros?|ml|cc)\b(?!\s*/)( y medio)?")
+MILLILITER_UNITS = ("ml", "mililitro", "mililitros", "cc")
+
+# "80%", "80 por ciento", "al 80", "en 80" (not "a 40 cm", "a 12/12", "a las 8")
+POWER = re.compile(
+    r"\b(\d{1,3})\s*(?:%|por ?ciento\b)"
+    r"|\b(?:al?|en)\s+(\d{1,3})\b(?![.,]\d|\s*(?:cm\b|centimetros?\b|/|:|h\b|hs\b|horas?\b))"
+)
+POWER_FULL = re.compile(_words("al maximo", "a full", "a tope", "a pleno", "al 100"))
+POWER_OFF = re.compile(_words("apaga", "apague", "apagar", "apagala", "apagalas"))
+# "18/6", "20h/4h", "12/12 desde las 8", "18/6 06:00"; "06:00-00:00"
+HOURS = re.compile(
+    r"\b(\d{1,2}(?:[.,]\d+)?)(?:\s*h)?\s*/\s*(\d{1,2}(?:[.,]\d+)?)(?:\s*h\b)?"
+    r"(?:\s+(?:desde\s+(?:las\s+)?|a\s+las\s+|las\s+)(\d{1,2})(?::(\d{2}))?(?:\s*hs?\b)?|\s+(\d{1,2}):(\d{2})(?:\s*hs?\b)?)?"
+)
+TIMES = re.compile(r"\b(\d{1,2}:\d{2})\s*(?:-|a)\s*(\d{1,2}:\d{2})\b")
+STAGE_SCHEDULES = (
+    (re.compile(_words("floracion", "flora")), "12/12"),
+    (re.compile(_words("vege", "vegetativo", "vegetacion")), "18/6"),
+)
+HEIGHT = re.compile(r"\b(\d{1,3}(?:[.,]\d+)?)\s*(?:cm|centimetros?)\b")
+
+# Horizon of a schedule question, in days from today
+HORIZON = (
+    (re.compile(r"\bpasado manana\b"), 2),
+    (re.compile(r"\bmanana\b"), 1),
+    (re.compile(r"\bsemana\b"), 7),
+)
+
+EVERY = re.compile(r"\btod[oa]s?\b")
+SEPARATORS = re.compile(r"\s*(?:[,;|]|\by\b|\be\b|\bmas\b|\bademas\b)\s*")
+PREPOSITION = re.compile(r"\b(?:en|del?|para)\b")
+TOKEN = re.compile(r"[a-z0-9]+(?:[.\-][a-z0-9]+)*")
+
+FILLER = frozenset((
+    "a", "al", "la", "el", "los", "las", "lo", "mi", "mis", "le", "les", "con", "de", "del", "en", "para",
+    "que", "ya", "recien", "tambien", "bien", "un", "una", "poco", "che", "por", "favor", "porfa", "plis",
+    "agua", "planta", "plantas", "ahora", "hoy", "y", "e", "se", "me", "nos", "su", "sus", "esta", "este",
+    "manana", "tarde", "noche", "hola", "buenas", "buen", "dia", "cada", "uno",
+))
+WATER_VERBS = frozenset((
+    "regue", "regamos", "regaste", "regar", "riego", "rega", "regale", "regales", "regada", "regado",
+    "regadas", "regados", "hidrate", "moje", "di", "dale", "dales",
+))
+LIGHT_WORDS = frozenset((
+    "luz", "luces", "lampara", "lamparas", "led", "leds", "foco", "focos", "potencia", "intensidad", "dimmer",
+    "fotoperiodo", "fotoperiodos", "floracion", "flora", "vege", "vegetativo", "vegetacion", "altura", "horario",
+    "pone", "pon", "poner", "ponela", "ponelas", "subi", "sube", "subir", "subila", "baja", "bajar", "baje",
+    "bajala", "cambia", "cambie", "cambiar", "setea", "configura", "deja", "dejala", "pasa", "pasar",
+    "pasala", "prende", "prendi", "prender", "apaga", "apague", "apagar", "apagala", "apagalas", "ajusta",
+    "ajustar", "regula", "quiero", "podes", "max", "maximo", "full", "tope", "pleno", "ciento", "hs",
+))
+QUERY_WORDS = frozenset((
+    "cuando", "toca", "tocaba", "regar", "riego", "riegos", "hay", "tengo", "debo", "pendiente", "pendientes",
+    "proximo", "proximos", "agenda", "calendario", "manana", "pasado", "semana", "cual", "cuales", "falta",
+))
+
+
+@dataclass(slots=True, frozen=True)
+class Command:
+    intent: str  # water | light | schedule | help | unknown
+    targets: tuple[str, ...] = ()  # plant names as written (folded)
+    every: bool = False  # "todas las plantas" (of `indoor` if given)
+    indoor: str | None = None
+    liters: float | None = None
+    days_ago: int = 0
+    ferts: tuple[tuple[str, float, str], ...] = ()  # (name, amount, unit)
+    power_pct: int | None = None
+    schedule: str | None = None
+    height_cm: float | None = None
+    horizon_days: int = 0
+
+    def slots(self) -> dict:
+        """Fields that differ from their defaults, JSON-ready (the corpus format)"""
+        slots = {}
+        for item in fields(self):
+            value = getattr(self, item.name)
+            if item.name != "intent" and value != item.default:
+                slots[item.name] = json.loads(json.dumps(value))
+        return slots
+
+
+def _number(text: str) -> float:
+    return NUMBER_WORDS.get(text) or float(text.replace(",", "."))
+
+
+def _cut(message: str, match: re.Match) -> str:
+    """Replace a slot by a separator, keeping every other position"""
+    start, end = match.span()
+    return message[:start] + "," + " " * (end - start - 1) + message[end:]
+
+
+def _ref(text: str, drop: frozenset) -> str | None:
+    words = [word for word in TOKEN.findall(text) if word not in FILLER and word not in drop]
+    return " ".join(words) or None
+
+
+def _days_ago(message: str) -> tuple[int, str]:
+    match = DAYS_AGO.search(message)
+    if not match:
+        return 0, message
+    today, before_yesterday, yesterday, ago = match.groups()
+    days = 0 if today else 2 if before_yesterday else 1 if yesterday else int(_number(ago))
+    return days, _cut(message, match)
+
+
+def _parse_water(message: str, original: str) -> Command:
+    days_ago, message = _days_ago(message)
+
+    ferts = []
+    while match := FERT.search(message):
+        start, end = match.span(3)
+        ferts.append((" ".join(original[start:end].split()), _number(match.group(1)), match.group(2).replace("gr", "g")))
+        message = _cut(message, match)
+
+    liters = None
+    if match := LITERS.search(message):
+        number, unit, half = match.groups()
+        liters = _number(number) + (0.5 if half else 0)
+        if unit in MILLILITER_UNITS:
+            liters /= 1000
+        message = _cut(message, match)
+
+    every = EVERY.search(message)
+    if every:
+        # "todas las plantas de la carpa": what follows names the indoor
+        indoor = _ref(message[every.end():], WATER_VERBS)
+        return Command("water", every=True, indoor=indoor, liters=liters, days_ago=days_ago, ferts=tuple(ferts))
+
+    targets = []
+    for chunk in SEPARATORS.split(message):
+        ref = _ref(chunk, WATER_VERBS)
+        if ref and ref not in targets:
+            targets.append(ref)
+    return Command("water", targets=tuple(targets), liters=liters, days_ago=days_ago, ferts=tuple(ferts))
+
+
+def _parse_light(message: str) -> Command:
+    power = None
+    if POWER_OFF.search(message):
+        power = 0
+    elif match := POWER_FULL.search(message):
+        power = 100
+        message = _cut(message, match)
+    if match := POWER.search(message):
+        power = int(match.group(1) or match.group(2))
+        message = _cut(message, match)
+
+    schedule = None
+    if match := HOURS.search(message):
+        on, off, hour, minute, clock_hour, clock_minute = match.groups()
+        schedule = f"{on.replace(',', '.')}/{off.replace(',', '.')}"
+        hour, minute = hour or clock_hour, minute or clock_minute
+        if hour is not None:
+            schedule += f" {int(hour):02d}:{minute or '00'}"
+        message = _cut(message, match)
+    elif match := TIMES.search(message):
+        schedule = f"{match.group(1)}-{match.group(2)}"
+        message = _cut(message, match)
+    else:
+        for stage, stage_schedule in STAGE_SCHEDULES:
+            if stage.search(message):
+                schedule = stage_schedule
+                break
+
+    height = None
+    if match := HEIGHT.search(message):
+        height = _number(match.group(1))
+        message = _cut(message, match)
+
+    # The indoor comes after a preposition ("en la carpa", "de la carpa");
+    # the first one followed by something other than light words
+    indoor = None
+    for match in PREPOSITION.finditer(message):
+        indoor = _ref(message[match.end():], LIGHT_WORDS)
+        if indoor:
+            break
+    else:
+        indoor = _ref(message, LIGHT_WORDS)
+    return Command("light", indoor=indoor, power_pct=power, schedule=schedule, height_cm=height)
+
+
+def _parse_schedule_query(message: str) -> Command:
+    horizon = 0
+    for pattern, days in HORIZON:
+        if match := pattern.search(message):
+            horizon = days
+            message = _cut(message, match)
+            break
+    targets = []
+    for chunk in SEPARATORS.split(message):
+        ref = _ref(chunk, QUERY_WORDS)
+        if ref and ref not in targets:
+            targets.append(ref)
+    return Command("schedule", targets=tuple(targets), horizon_days=horizon)
+
+
+def parse(text: str) -> Command:
+    """Intent and slots of a message; names stay as written (folded)"""
+    original = text.strip()
+    message = fold(original)
+    if HELP.search(message):
+        return Command("help")
+    # Questions first: "cuando riego la monstera" names the watering verb too
+    if SCHEDULE_QUERY.search(message):
+        return _parse_schedule_query(message)
+    if WATER.search(message):
+        return _parse_water(message, original)
+    if LIGHT.search(message) or HOURS.search(message):
+        return _parse_light(message)
+    return Command("unknown")
+
+
+# ============ NAME RESOLUTION ============
+
+@dataclass(slots=True, frozen=True)
+class Entity:
+    kind: str  # plant | indoor
+    id: UUID
+    name: str
+
+
+@dataclass(slots=True)
+class Resolution:
+    entity: Entity | None = None
+    options: list[Entity] = field(default_factory=list)  # ambiguous: the close matches
+
+
+def pick(ref: str, kind: str, hits: list) -> Resolution:
+    """
+    Choose among scored matches (best first, with .id/.name/.score): an
+    exact name, else the best one if it's good enough and clearly ahead.
+    """
+    wanted = normalize(ref)
+    exact = [hit for hit in hits if normalize(hit.name) == wanted]
+    if len(exact) == 1:
+        return Resolution(Entity(kind, exact[0].id, exact[0].name))
+    if not hits or hits[0].score < RESOLVE_MIN_SCORE:
+        return Resolution()
+    if len(hits) == 1 or hits[0].score - hits[1].score >= RESOLVE_MARGIN:
+        return Resolution(Entity(kind, hits[0].id, hits[0].name))
+    close = [hit for hit in hits if hits[0].score - hit.score < RESOLVE_MARGIN]
+    return Resolution(options=[Entity(kind, hit.id, hit.name) for hit in close])
+
+
+@dataclass(slots=True, frozen=True)
+class IndoorName:
+    id: UUID
+    name: str
+    normalized: str
+    grams: frozenset[str]
+    score: float = 0.0
+
+
+class IndoorNames:
+    """
+    Indoor names of recently active users. An entry is reused while the
+    user's change_seq hasn't moved; any change reloads it (one small query).
+    """
+
+    def __init__(self, max_users: int):
+        self.max_users = max_users
+        self.entries: OrderedDict[UUID, tuple[int, list[IndoorName]]] = OrderedDict()
+        self._lock = threading.Lock()
+        self.loads = 0
+
+    def names(self, db: Session, user) -> list[IndoorName]:
+        with self._lock:
+            entry = self.entries.get(user.id)
+            if entry is not None and entry[0] >= user.change_seq:
+                self.entries.move_to_end(user.id)
+                return entry[1]
+        names = [
+            IndoorName(indoor.id, indoor.name, normalize(indoor.name), frozenset(trigrams(normalize(indoor.name))))
+            for indoor in fetch_indoor_list(db, user.id)
+        ]
+        self.loads += 1
+        with self._lock:
+            self.entries[user.id] = (user.change_seq, names)
+            self.entries.move_to_end(user.id)
+            while len(self.entries) > self.max_users:
+                self.entries.popitem(last=False)
+        return names
+
+    @staticmethod
+    def match(names: list[IndoorName], ref: str) -> list[IndoorName]:
+        """Indoors scored like plant names in search_service, best first"""
+        query = normalize(ref)
+        query_grams = trigrams(query)
+        if not query_grams:
+            return []
+        scored = []
+        for name in names:
+            shared = len(query_grams & name.grams)
+            score = max(shared / len(query_grams | name.grams), shared / len(query_grams))
+            if name.normalized.startswith(query) or any(word.startswith(query) for word in name.normalized.split()):
+                score += 0.3
+            scored.append(IndoorName(name.id, name.name, name.normalized, name.grams, round(score, 3)))
+        return sorted(scored, key=lambda name: (-name.score, name.name))
+
+
+indoor_names = IndoorNames(max_users=settings.search_index_max_users)
+
+
+# ============ ACTIONS ============
+
+@dataclass(slots=True)
+class Reply:
+    intent: str
+    text: str
+    done: bool = False  # False: nothing was changed (question, error or something to clarify)
+    entities: list[Entity] = field(default_factory=list)
+
+
+HELP_TEXT = (
+    "Puedo anotar riegos, ajustar la luz y decirte qué toca regar. Por ejemplo:\n"
+    "• «regué la monstera con 1,5 litros»\n"
+    "• «regué todas las plantas de la carpa con 2 ml/l de Bio Grow»\n"
+    "• «poné la luz al 80% en la carpa»\n"
+    "• «fotoperiodo 12/12»\n"
+    "• «¿qué toca regar hoy?»"
+)
+
+
+def _liters(value: float) -> str:
+    return f"{value:g}".replace(".", ",") + " L"
+
+
+def _when(day, today) -> str:
+    if day is None:
+        return "sin fecha"
+    delta = (day - today).days
+    if delta == 0:
+        return "hoy"
+    if delta == 1:
+        return "mañana"
+    if delta < 0:
+        return f"atrasada {-delta} día{'s' if delta < -1 else ''}"
+    return f"el {day:%d/%m} (en {delta} días)"
+
+
+def _options(ref: str, options: list[Entity]) -> str:
+    return f"«{ref}» puede ser: {', '.join(option.name for option in options)}. ¿Cuál?"
+
+
+def _resolve_plants(db: Session, user, refs: tuple[str, ...]) -> tuple[list[Entity], list[str]]:
+    """Entities found and the questions to ask back for the others"""
+    found, problems = [], []
+    for ref in refs:
+        resolution = pick(ref, "plant", plant_search.search(db, user, ref, limit=5))
+        if resolution.entity:
+            if resolution.entity not in found:
+                found.append(resolution.entity)
+        elif resolution.options:
+            problems.append(_options(ref, resolution.options))
+        else:
+            problems.append(f"No encontré la planta «{ref}».")
+    return found, problems
+
+
+def _resolve_indoor(db: Session, user, ref: str | None) -> tuple[Entity | None, str | None]:
+    names = indoor_names.names(db, user)
+    if not names:
+        return None, "Todavía no tenés indoors."
+    if ref is None:
+        if len(names) == 1:
+            return Entity("indoor", names[0].id, names[0].name), None
+        return None, f"¿En qué indoor? {', '.join(name.name for name in names)}."
+    resolution = pick(ref, "indoor", IndoorNames.match(names, ref))
+    if resolution.entity:
+        return resolution.entity, None
+    if resolution.options:
+        return None, _options(ref, resolution.options)
+    return None, f"No encontré el indoor «{ref}»."
+
+
+def _water(db: Session, user, command: Command) -> Reply:
+    if command.every:
+        if command.indoor:
+            indoor, problem = _resolve_indoor(db, user, command.indoor)
+            if problem:
+                return Reply("water", problem)
+            rows = fetch_indoor_plants(db, indoor.id)
+        else:
+            rows = fetch_plants_schedule(db, user.id)
+        plants = [Entity("plant", row.id, row.name) for row in rows]
+        if not plants:
+            return Reply("water", "No hay plantas para regar ahí.")
+    else:
+        if not command.targets:
+            return Reply("water", "¿Qué planta regaste? Por ejemplo: «regué la monstera con 1 litro».")
+        plants, problems = _resolve_plants(db, user, command.targets)
+        if problems:
+            return Reply("water", "\n".join(problems), entities=plants)
+
+    event_date = user_today(user) - timedelta(days=command.days_ago)
+    ferts = [{"name": name, "amount": amount, "unit": unit} for name, amount, unit in command.ferts] or None
+    when = "" if command.days_ago == 0 else " de ayer" if command.days_ago == 1 else f" del {event_date:%d/%m}"
+
+    if len(plants) == 1:
+        plant_id = plants[0].id
+        liters = command.liters
+        if liters is None:
+            liters = load_one(PlantView, db.execute(PLANTS_BY_IDS, {"plant_ids": [plant_id]}).first()).default_liters
+        plant, _ = register_watering(db, plant_id, user.id, liters=liters, event_date=event_date, ferts=ferts)
+        if plant is None:
+            return Reply("water", f"No encontré la planta «{plants[0].name}».")
+        text = f"Anoté el riego{when} de {plant.name} ({_liters(liters)})."
+        if plant.next_water_at:
+            text += f" Próximo riego: {_when(plant.next_water_at, user_today(user))}."
+        return Reply("water", text, True, plants)
+
+    session, _ = register_watering_session(
+        db, user.id, [(plant.id, command.liters) for plant in plants], event_date=event_date, ferts=ferts
+    )
+    if session is None:
+        return Reply("water", "Alguna de esas plantas ya no existe.")
+    return Reply(
+        "water",
+        f"Anoté el riego{when} de {len(plants)} plantas ({_liters(session.total_liters)} en total).",
+        True,
+        plants,
+    )
+
+
+def _light(db: Session, user, command: Command) -> Reply:
+    if command.power_pct is None and command.schedule is None and command.height_cm is None:
+        return Reply("light", "¿Qué cambio de la luz? Por ejemplo: «luz al 80% en la carpa» o «fotoperiodo 12/12».")
+    if command.power_pct is not None and command.power_pct > 100:
+        return Reply("light", "La potencia va de 0 a 100%.")
+    if command.schedule is not None and parse_schedule(command.schedule) is None:
+        return Reply("light", f"No entiendo el fotoperiodo «{command.schedule}». Probá con «18/6» o «12/12 08:00».")
+
+    indoor, problem = _resolve_indoor(db, user, command.indoor)
+    if problem:
+        return Reply("light", problem)
+    row = db.query(Indoor).filter(Indoor.id == indoor.id, Indoor.user_id == user.id).first()
+    if row is None:
+        return Reply("light", f"No encontré el indoor «{indoor.name}».")
+    update_indoor(
+        db, row,
+        light_power_pct=command.power_pct,
+        light_schedule=command.schedule,
+        light_height_cm=command.height_cm,
+    )
+
+    changes = []
+    if command.power_pct is not None:
+        changes.append("luz apagada" if command.power_pct == 0 else f"potencia al {command.power_pct}%")
+    if command.schedule is not None:
+        changes.append(f"fotoperiodo {command.schedule}")
+    if command.height_cm is not None:
+        changes.append(f"altura a {command.height_cm:g} cm")
+    return Reply("light", f"Listo, en {indoor.name}: {', '.join(changes)}.", True, [indoor])
+
+
+def _schedule(db: Session, user, command: Command) -> Reply:
+    today = user_today(user)
+    if command.targets:
+        plants, problems = _resolve_plants(db, user, command.targets)
+        by_id = {row.id: row for row in fetch_plants_schedule(db, user.id)} if plants else {}
+        lines = [
+            f"• {plant.name}: {_when(by_id[plant.id].next_water_at, today)}" for plant in plants if plant.id in by_id
+        ]
+        return Reply("schedule", "\n".join(lines + problems), entities=plants)
+
+    until = today + timedelta(days=command.horizon_days)
+    due = sorted(
+        (row for row in fetch_plants_schedule(db, user.id) if row.next_water_at and row.next_water_at <= until),
+        key=lambda row: (row.next_water_at, row.name),
+    )
+    period = {0: "hoy", 1: "hasta mañana", 2: "hasta pasado mañana", 7: "esta semana"}[command.horizon_days]
+    if not due:
+        return Reply("schedule", f"No hay riegos pendientes {period}.")
+    lines = [f"• {row.name}: {_when(row.next_water_at, today)}" for row in due]
+    return Reply(
+        "schedule", f"Para regar {period}:\n" + "\n".join(lines), entities=[Entity("plant", row.id, row.name) for row in due]
+    )
+
+
+ACTIONS = {"water": _water, "light": _light, "schedule": _schedule}
+
+intents = Counter()
+
+
+def handle(db: Session, user, text: str) -> Reply:
+    """Parse a message, resolve its names and run it"""
+    command = parse(text)
+    intents[command.intent] += 1
+    action = ACTIONS.get(command.intent)
+    if action is not None:
+        return action(db, user, command)
+    if command.intent == "help":
+        return Reply("help", HELP_TEXT)
+    return Reply("unknown", "No te entendí. " + HELP_TEXT)
+
+
+def stats() -> dict:
+    return {"intents": dict(intents), "indoor_users": len(indoor_names.entries), "indoor_loads": indoor_names.loads}
+
+
+# ============ CORPUS ============
+
+def load_corpus(path: Path = CORPUS_PATH) -> list[dict]:
+    with open(path, encoding="utf-8") as corpus:
+        return json.load(corpus)
+
+
+def check_corpus(corpus: list[dict]) -> list[str]:
+    """Differences between parse() and the expected intent and slots"""
+    failures = []
+    for case in corpus:
+        command = parse(case["text"])
+        expected = {"intent": case["intent"], **case.get("slots", {})}
+        got = {"intent": command.intent, **command.slots()}
+        if got != expected:
+            failures.append(f"{case['text']!r}\n  expected {expected}\n  got      {got}")
+    return failures
+
+
+if __name__ == "__main__":
+    import argparse
+    import sys
+
+    parser = argparse.ArgumentParser(description="Chat bot command parser")
+    sub = parser.add_subparsers(dest="command", required=True)
+    sub.add_parser("check", help="parse the golden corpus and report differences")
+    sub.add_parser("parse", help="show how a message is read").add_argument("text")
+    args = parser.parse_args()
+
+    if args.command == "parse":
+        command = parse(args.text)
+        print(json.dumps({"intent": command.intent, "slots": command.slots()}, ensure_ascii=False))
+    else:
+        corpus = load_corpus()
+        failures = check_corpus(corpus)
+        for failure in failures:
+            print(failure)
+        print(f"{len(corpus) - len(failures)}/{len(corpus)} messages parsed as expected")
+        sys.exit(1 if failures else 0)
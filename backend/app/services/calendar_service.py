@@ -0,0 +1,64 @@
+"""
+Watering calendar: projected watering dates of all of a user's plants.
+
+Dates are not walked day by day. A plant's first date in the range comes
+from one division, and plants with the same interval and first date share
+every later date, so they are grouped and each group is stepped with
+range(first, end, interval). The work grows with the number of groups
+(bounded by the distinct interval/phase pairs) times the dates in the
+range, not with plants times days.
+"""
+from collections import defaultdict
+from datetime import date
+
+from app.read_models import PlantCalendarEntry
+
+
+def project(
+    plants: list[PlantCalendarEntry], today: date, start: date, end: date
+) -> tuple[list[list[int]], list[tuple[date, list[int], int]]]:
+    """
+    Returns (groups, days): `groups` holds lists of indexes into `plants`
+    that water on the same dates; `days` is (date, group indexes, plants
+    due) for every day with waterings, in order. Overdue plants are
+    projected from today.
+    """
+    start_o, end_o, today_o = start.toordinal(), end.toordinal(), today.toordinal()
+
+    by_phase = defaultdict(list)
+    for index, plant in enumerate(plants):
+        if plant.next_water_at is None:
+            continue
+        interval = max(plant.watering_interval_days, 1)
+        first = max(plant.next_water_at.toordinal(), today_o)
+        if first < start_o:
+            first += -(-(start_o - first) // interval) * interval
+        if first <= end_o:
+            by_phase[(interval, first)].append(index)
+
+    groups = list(by_phase.values())
+    day_groups = defaultdict(list)
+    day_counts = defaultdict(int)
+    for group_index, ((interval, first), members) in enumerate(by_phase.items()):
+        for day in range(first, end_o + 1, interval):
+            day_groups[day].append(group_index)
+            day_counts[day] += len(members)
+
+    days = [(date.fromordinal(day), day_groups[day], day_counts[day]) for day in sorted(day_groups)]
+    return groups, days
+
+
+def project_naive(plants: list[PlantCalendarEntry], today: date, start: date, end: date) -> dict:
+    """Per-plant stepping with compute_next_water_at, kept as the bench baseline"""
+    from app.services import compute_next_water_at
+
+    days = defaultdict(list)
+    for index, plant in enumerate(plants):
+        if plant.next_water_at is None:
+            continue
+        day = max(plant.next_water_at, today)
+        while day <= end:
+            if day >= start:
+                days[day].append(index)
+            day = compute_next_water_at(day, max(plant.watering_interval_days, 1))
+    return days
@@ -0,0 +1,384 @@
+"""
+Fertilizer catalog and normalized fertilizer amounts.
+
+Waterings keep the client's `ferts` JSONB as sent, and every fertilizer
+whose amount can be read ("5 ml", "2,5ml/L", "1 g") also gets a
+`watering_fertilizers` row with a numeric amount, so usage reports are a
+plain SUM over one table.
+
+    python -m app.services.fertilizer_service backfill [--batch-size 1000]
+"""
+import re
+from collections import namedtuple
+from datetime import date, datetime, time, timedelta, timezone as dt_timezone
+from decimal import Decimal, InvalidOperation
+from uuid import UUID, uuid4
+
+from sqlalchemy import exists, func, insert, select
+from sqlalchemy.exc import IntegrityError
+
+from app.models import Fertilizer, WateringFertilizer, WateringHistory, Plant
+from app.services import get_zone
+
+AMOUNT = re.compile(r"^\s*(\d+(?:[.,]\d+)?)\s*([^\d\s/]+)?\s*(?:/\s*([^\d\s]+))?\s*$")
+
+# unit as written -> (base unit, factor)
+UNITS = {
+    "ml": ("ml", 1), "cc": ("ml", 1), "cm3": ("ml", 1),
+    "l": ("ml", 1000), "lt": ("ml", 1000), "litro": ("ml", 1000), "litros": ("ml", 1000),
+    "g": ("g", 1), "gr": ("g", 1), "grs": ("g", 1), "gramos": ("g", 1),
+    "mg": ("g", Decimal("0.001")), "kg": ("g", 1000),
+}
+PER_LITER = {"l", "lt", "litro", "litros"}
+DEFAULT_UNIT = "ml"
+
+# Legacy shape written by the seed: {"type": "NPK", "ratio": "10-10-10", "ml_per_liter": 5}
+LEGACY_PER_LITER_KEYS = {"ml_per_liter": "ml/l", "g_per_liter": "g/l"}
+
+
+def name_key(name: str) -> str:
+    return " ".join(name.lower().split())
+
+
+def parse_amount(value, unit: str | None = None) -> tuple[Decimal, str] | None:
+    """
+    Read an amount such as "5", "5 ml", "2,5ml/L", "1.5 g" or 3.
+    Returns (amount, unit) with unit in ml, g, ml/l or g/l, or None if it
+    can't be read.
+    """
+    text = f"{value} {unit}" if unit else str(value)
+    match = AMOUNT.match(text)
+    if not match:
+        return None
+    number, written_unit, per = match.groups()
+    try:
+        amount = Decimal(number.replace(",", "."))
+    except InvalidOperation:
+        return None
+
+    base, factor = UNITS.get((written_unit or DEFAULT_UNIT).lower(), (None, None))
+    if base is None:
+        return None
+    if per is not None:
+        if per.lower() not in PER_LITER:
+            return None
+        return amount * factor, f"{base}/l"
+    return amount * factor, base
+
+
+def total_amount(amount: Decimal, unit: str, liters) -> tuple[Decimal, str]:
+    """Amount actually applied: per-liter amounts are multiplied by the liters watered"""
+    if unit.endswith("/l"):
+        return amount * Decimal(str(liters)), unit[:-2]
+    return amount, unit
+
+
+def ferts_names(ferts: dict | None) -> list[str]:
+    """Fertilizers a `ferts` JSONB value names, whether their amounts can be read or not"""
+    if not ferts:
+        return []
+    if "type" in ferts and any(key in ferts for key in LEGACY_PER_LITER_KEYS):
+        return [str(ferts["type"])]
+    return [name.strip() for name in ferts if name.strip()]
+
+
+def ferts_items(ferts: dict | None) -> list[tuple[str, Decimal, str]]:
+    """Readable (name, amount, unit) items of a `ferts` JSONB value"""
+    if not ferts:
+        return []
+    if "type" in ferts and any(key in ferts for key in LEGACY_PER_LITER_KEYS):
+        for key, unit in LEGACY_PER_LITER_KEYS.items():
+            parsed = parse_amount(ferts.get(key), unit) if key in ferts else None
+            if parsed:
+                return [(str(ferts["type"]), *parsed)]
+        return []
+
+    items = []
+    for name, value in ferts.items():
+        parsed = parse_amount(value)
+        if parsed and name.strip():
+            items.append((name.strip(), *parsed))
+    return items
+
+
+def get_or_create_fertilizer(db, user_id: UUID, name: str, unit: str) -> UUID:
+    """Catalog id of a fertilizer by name; `db` may be a Session or a Connection"""
+    key = name_key(name)
+    lookup = select(Fertilizer.id).where(Fertilizer.user_id == user_id, Fertilizer.name_key == key)
+    fertilizer_id = db.execute(lookup).scalar()
+    if fertilizer_id:
+        return fertilizer_id
+    try:
+        with db.begin_nested():
+            return db.execute(
+                insert(Fertilizer)
+                .values(id=uuid4(), user_id=user_id, name=name, name_key=key, default_unit=unit.split("/")[0])
+                .returning(Fertilizer.id)
+            ).scalar_one()
+    except IntegrityError:
+        # Created concurrently by another request
+        return db.execute(lookup).scalar_one()
+
+
+def record_fertilizers(
+    db,
+    watering_id: UUID | None,
+    user_id: UUID,
+    indoor_id: UUID | None,
+    event_ts: datetime,
+    liters,
+    items: list[tuple[str, Decimal, str]],
+    session_id: UUID | None = None,
+) -> int:
+    """
+    Insert the normalized rows of one watering, or of a whole session
+    (watering_id None, liters = all the liters of the session).
+    Returns the number of rows.
+    """
+    rows = []
+    for name, amount, unit in items:
+        total, total_unit = total_amount(amount, unit, liters)
+        rows.append({
+            "id": uuid4(),
+            "watering_id": watering_id,
+            "session_id": session_id,
+            "fertilizer_id": get_or_create_fertilizer(db, user_id, name, unit),
+            "user_id": user_id,
+            "indoor_id": indoor_id,
+            "event_ts": event_ts,
+            "amount": amount,
+            "unit": unit,
+            "total_amount": total,
+            "total_unit": total_unit,
+        })
+    if rows:
+        db.execute(insert(WateringFertilizer), rows)
+    return len(rows)
+
+
+def backfill(connection, batch_size: int = 1000, commit=None, progress=None) -> int:
+    """
+    Normalize `ferts` of waterings that have no watering_fertilizers rows yet.
+    Walks watering_history by id in batches, so memory stays flat and it can
+    be stopped and re-run. `commit()` and `progress(done, created)` are
+    called after each batch. Returns the number of rows created.
+    """
+    pending = (
+        select(
+            WateringHistory.id,
+            WateringHistory.event_ts,
+            WateringHistory.liters,
+            WateringHistory.ferts,
+            Plant.user_id,
+            Plant.indoor_id,
+        )
+        .join(Plant, Plant.id == WateringHistory.plant_id)
+        .where(
+            WateringHistory.ferts.isnot(None),
+            ~exists().where(WateringFertilizer.watering_id == WateringHistory.id),
+        )
+        .order_by(WateringHistory.id)
+        .limit(batch_size)
+    )
+
+    last_id = None
+    done = created = 0
+    while True:
+        query = pending if last_id is None else pending.where(WateringHistory.id > last_id)
+        batch = connection.execute(query).all()
+        if not batch:
+            break
+        for row in batch:
+            created += record_fertilizers(
+                connection, row.id, row.user_id, row.indoor_id, row.event_ts, row.liters, ferts_items(row.ferts)
+            )
+        last_id = batch[-1].id
+        done += len(batch)
+        if commit:
+            commit()
+        if progress:
+            progress(done, created)
+    return created
+
+
+# ============ REPORTS ============
+
+PERIODS = ("day", "week", "month", "year")
+
+
+def catalog(db, user_id: UUID):
+    """User's fertilizers with how many waterings used them and when last"""
+    return db.execute(
+        select(
+            Fertilizer.id,
+            Fertilizer.name,
+            Fertilizer.default_unit,
+            func.count(WateringFertilizer.id).label("waterings"),
+            func.max(WateringFertilizer.event_ts).label("last_used_at"),
+        )
+        .outerjoin(WateringFertilizer, WateringFertilizer.fertilizer_id == Fertilizer.id)
+        .where(Fertilizer.user_id == user_id)
+        .group_by(Fertilizer.id, Fertilizer.name, Fertilizer.default_unit)
+        .order_by(Fertilizer.name_key)
+    ).all()
+
+
+UsageRow = namedtuple("UsageRow", "fertilizer_id fertilizer indoor_id period total unit waterings")
+
+
+def _period_start(ts: datetime, period: str) -> datetime:
+    """date_trunc() of a naive timestamp"""
+    day = ts.date()
+    if period == "week":
+        day -= timedelta(days=day.weekday())
+    elif period == "month":
+        day = day.replace(day=1)
+    elif period == "year":
+        day = date(day.year, 1, 1)
+    return datetime.combine(day, time())
+
+
+def usage(
+    db,
+    user_id: UUID,
+    timezone: str | None,
+    period: str = "month",
+    fertilizer_id: UUID | None = None,
+    indoor_id: UUID | None = None,
+    date_from: datetime | None = None,
+    date_to: datetime | None = None,
+):
+    """Total applied per fertilizer, indoor and period (in the user's local time)"""
+    filters = [WateringFertilizer.user_id == user_id]
+    if fertilizer_id:
+        filters.append(WateringFertilizer.fertilizer_id == fertilizer_id)
+    if indoor_id:
+        filters.append(WateringFertilizer.indoor_id == indoor_id)
+    if date_from:
+        filters.append(WateringFertilizer.event_ts >= date_from)
+    if date_to:
+        filters.append(WateringFertilizer.event_ts < date_to)
+
+    if db.get_bind().dialect.name != "postgresql":
+        return _usage_by_rows(db, filters, get_zone(timezone), period)
+
+    ts = func.timezone(timezone, WateringFertilizer.event_ts) if timezone else WateringFertilizer.event_ts
+    bucket = func.date_trunc(period, ts).label("period")
+
+    query = (
+        select(
+            WateringFertilizer.fertilizer_id,
+            Fertilizer.name.label("fertilizer"),
+            WateringFertilizer.indoor_id,
+            bucket,
+            func.sum(WateringFertilizer.total_amount).label("total"),
+            WateringFertilizer.total_unit.label("unit"),
+            func.count(func.distinct(
+                func.coalesce(WateringFertilizer.watering_id, WateringFertilizer.session_id)
+            )).label("waterings"),
+        )
+        .join(Fertilizer, Fertilizer.id == WateringFertilizer.fertilizer_id)
+        .where(*filters)
+        .group_by(
+            WateringFertilizer.fertilizer_id, Fertilizer.name, WateringFertilizer.indoor_id,
+            bucket, WateringFertilizer.total_unit,
+        )
+        .order_by(bucket, Fertilizer.name)
+    )
+    return db.execute(query).all()
+
+
+def _usage_by_rows(db, filters: list, zone, period: str) -> list[UsageRow]:
+    """
+    Same totals where the database has no time zones nor date_trunc()
+    (SQLite): rows are bucketed here. Timestamps are stored in UTC.
+    """
+    rows = db.execute(
+        select(
+            WateringFertilizer.fertilizer_id,
+            Fertilizer.name,
+            WateringFertilizer.indoor_id,
+            WateringFertilizer.event_ts,
+            WateringFertilizer.total_amount,
+            WateringFertilizer.total_unit,
+            func.coalesce(WateringFertilizer.watering_id, WateringFertilizer.session_id),
+        )
+        .join(Fertilizer, Fertilizer.id == WateringFertilizer.fertilizer_id)
+        .where(*filters)
+    ).all()
+
+    totals: dict[tuple, list] = {}
+    for fertilizer_id, name, indoor, event_ts, amount, unit, watering in rows:
+        if event_ts.tzinfo is None:
+            event_ts = event_ts.replace(tzinfo=dt_timezone.utc)
+        local = event_ts.astimezone(zone or dt_timezone.utc).replace(tzinfo=None)
+        key = (fertilizer_id, name, indoor, _period_start(local, period), unit)
+        entry = totals.setdefault(key, [Decimal(0), set()])
+        entry[0] += amount
+        entry[1].add(watering)
+    return sorted(
+        (UsageRow(*key[:4], total, key[4], len(waterings)) for key, (total, waterings) in totals.items()),
+        key=lambda row: (row.period, row.fertilizer),
+    )
+
+
+def fertilizer_name(db, user_id: UUID, fertilizer_id: UUID) -> str | None:
+    """Catalog name of one of the user's fertilizers"""
+    return db.execute(
+        select(Fertilizer.name).where(Fertilizer.id == fertilizer_id, Fertilizer.user_id == user_id)
+    ).scalar()
+
+
+def unparsed_waterings(db, user_id: UUID, fertilizer_name: str | None = None) -> int:
+    """
+    Waterings naming a fertilizer in `ferts` that got no normalized row (its
+    amount couldn't be read), including partly read ones such as
+    {"Grow": "2,5 ml/L", "Bloom": "abc"}. With a name, only that fertilizer
+    is checked. Names are compared like the catalog does (name_key).
+    """
+    rows = db.execute(
+        select(WateringHistory.id, WateringHistory.ferts, Fertilizer.name_key)
+        .join(Plant, Plant.id == WateringHistory.plant_id)
+        .outerjoin(WateringFertilizer, WateringFertilizer.watering_id == WateringHistory.id)
+        .outerjoin(Fertilizer, Fertilizer.id == WateringFertilizer.fertilizer_id)
+        .where(Plant.user_id == user_id, WateringHistory.ferts.isnot(None))
+    ).all()
+
+    ferts: dict[UUID, dict] = {}
+    parsed: dict[UUID, set[str]] = {}
+    for watering_id, value, key in rows:
+        ferts[watering_id] = value
+        keys = parsed.setdefault(watering_id, set())
+        if key:
+            keys.add(key)
+
+    wanted = name_key(fertilizer_name) if fertilizer_name else None
+    unparsed = 0
+    for watering_id, value in ferts.items():
+        names = {name_key(name) for name in ferts_names(value)}
+        if wanted:
+            names &= {wanted}
+        if names - parsed[watering_id]:
+            unparsed += 1
+    return unparsed
+
+
+if __name__ == "__main__":
+    import argparse
+    from app.database import SessionLocal
+
+    parser = argparse.ArgumentParser(description="Fertilizer data tools")
+    sub = parser.add_subparsers(dest="command", required=True)
+    backfill_parser = sub.add_parser("backfill", help="normalize ferts of existing waterings")
+    backfill_parser.add_argument("--batch-size", type=int, default=1000)
+    args = parser.parse_args()
+
+    db = SessionLocal()
+    try:
+        created = backfill(
+            db, args.batch_size, commit=db.commit,
+            progress=lambda done, rows: print(f"  {done} waterings, {rows} fertilizer rows", flush=True)
+        )
+        print(f"Backfill done: {created} fertilizer rows")
+    finally:
+        db.close()
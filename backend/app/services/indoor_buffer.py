@@ -0,0 +1,357 @@
+"""
+Write-behind buffer for indoor parameter updates.
+
+Sliders and sensors send many small PATCHes per minute. With
+INDOOR_WRITE_BEHIND_MS > 0, updates are merged per indoor in memory and
+written as a single UPDATE once the window has passed since the first
+pending change. A light history entry (and light period) is only created
+for the net change over the window.
+
+Every accepted update is appended and fsynced to a local journal before
+the request returns, so pending updates survive a worker restart or a
+power loss: on startup each worker replays journals that no live worker
+holds a lock on. After a flush the journal is compacted into a new file
+that replaces it atomically. A replay compares with the indoor's current
+values, not the journaled baseline, so entries whose flush committed right
+before a crash don't write their history twice.
+
+Pending updates are only visible to the worker that buffered them, so
+write-behind needs a single worker (see app.server.unshared_state).
+"""
+import asyncio
+import glob
+import json
+import logging
+import os
+import threading
+import time
+from datetime import datetime, timezone
+from decimal import Decimal
+from uuid import UUID, uuid4
+
+from sqlalchemy import select, update
+from sqlalchemy.orm import Session
+
+from app.cache import cache
+from app.changefeed import emit_change
+from app.config import settings
+from app.database import SessionLocal, shard_engines
+from app.events import broker, indoor_channel
+from app.models import Indoor, IndoorHistory
+from app.services.light_service import LIGHT_FIELDS, light_change, record_period
+
+try:
+    import fcntl
+except ImportError:  # Windows: journals are not shared between workers there
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+NUMERIC_FIELDS = ("temp_c", "humidity", "light_height_cm")
+
+# Relative journal paths start here (the backend directory), whatever the working directory
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+class PendingUpdate:
+    __slots__ = ("user_id", "shard", "baseline", "fields", "first_at")
+
+    def __init__(self, user_id: UUID, baseline: dict, shard: int = 0):
+        self.user_id = user_id
+        self.shard = shard  # app.sharding: database holding the indoor
+        self.baseline = baseline  # light fields before the first pending change
+        self.fields: dict = {}
+        self.first_at = time.monotonic()
+
+
+class IndoorWriteBuffer:
+    def __init__(self, window_seconds: float, journal_path: str):
+        self.window_seconds = window_seconds
+        self.journal_path = os.path.join(BASE_DIR, journal_path)
+        self.pending: dict[UUID, PendingUpdate] = {}
+        # PATCH handlers run in the threadpool, flushes in a thread of their own
+        self._lock = threading.RLock()
+        self._journal = None
+        self._task: asyncio.Task | None = None
+        self.flushed_updates = 0
+        self.coalesced_updates = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.window_seconds > 0
+
+    # ---- request path ----
+
+    def add(self, db: Session, indoor: Indoor, fields: dict) -> Indoor:
+        """
+        Buffer an update and return the indoor as the client should see it.
+        The returned object is detached, so the change is never written
+        through the request session.
+        """
+        with self._lock:
+            entry = self.pending.get(indoor.id)
+            if entry is None:
+                baseline = {name: getattr(indoor, name) for name in LIGHT_FIELDS}
+                entry = self.pending[indoor.id] = PendingUpdate(indoor.user_id, baseline, db.info.get("shard", 0))
+            else:
+                self.coalesced_updates += 1
+            entry.fields.update(fields)
+            self._append({
+                "indoor_id": str(indoor.id),
+                "user_id": str(entry.user_id),
+                "shard": entry.shard,
+                "baseline": entry.baseline,
+                "fields": fields
+            })
+            merged = dict(entry.fields)
+
+        db.expunge(indoor)
+        for name, value in merged.items():
+            setattr(indoor, name, value)
+        cache.invalidate_user(entry.user_id)
+        return indoor
+
+    def overlay(self, indoor_id: UUID) -> dict:
+        """Pending field values of an indoor (empty if nothing is buffered)"""
+        with self._lock:
+            entry = self.pending.get(indoor_id)
+            return dict(entry.fields) if entry else {}
+
+    # ---- journal ----
+
+    def _journal_file(self) -> str:
+        """This worker's journal"""
+        return f"{self.journal_path}.{os.getpid()}"
+
+    def _open_journal(self) -> None:
+        self._journal = _open_locked(self._journal_file(), "a")
+
+    def _append(self, record: dict) -> None:
+        if self._journal is None:
+            self._open_journal()
+        self._journal.write(json.dumps(record, default=str) + "\n")
+        self._journal.flush()
+        os.fsync(self._journal.fileno())
+
+    def _rewrite_journal(self) -> None:
+        """
+        Compact the journal down to what is still pending. The new journal is
+        written and synced next to the old one, then renamed over it, so a
+        crash at any point leaves one complete journal. It is locked before
+        the rename: recover() never sees it unlocked.
+        """
+        if self._journal is None:
+            return
+        path = self._journal_file()
+        compacted = _open_locked(f"{path}.tmp", "w")
+        try:
+            for indoor_id, entry in self.pending.items():
+                compacted.write(json.dumps({
+                    "indoor_id": str(indoor_id),
+                    "user_id": str(entry.user_id),
+                    "shard": entry.shard,
+                    "baseline": entry.baseline,
+                    "fields": entry.fields
+                }, default=str) + "\n")
+            compacted.flush()
+            os.fsync(compacted.fileno())
+            os.replace(compacted.name, path)
+        except BaseException:
+            compacted.close()
+            raise
+        self._journal.close()
+        self._journal = compacted
+        _fsync_dir(path)
+
+    def recover(self) -> int:
+        """Replay journals left by dead workers. Returns the number of indoors flushed."""
+        recovered = 0
+        for path in glob.glob(f"{self.journal_path}.*"):
+            if path.endswith(".tmp"):
+                continue  # compaction in progress, or left by a crash before the rename
+            with open(path, "r+", encoding="utf-8") as journal:
+                if fcntl:
+                    try:
+                        fcntl.flock(journal, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                    except OSError:
+                        continue  # still owned by a live worker
+                if os.path.exists(f"{path}.tmp"):
+                    os.remove(f"{path}.tmp")
+                pending: dict[UUID, PendingUpdate] = {}
+                for line in journal:
+                    try:
+                        record = json.loads(line)
+                    except ValueError:
+                        continue  # torn last line after a crash
+                    indoor_id = UUID(record["indoor_id"])
+                    entry = pending.get(indoor_id)
+                    if entry is None:
+                        # Journals written before light fields were tracked only have the power
+                        baseline = record.get("baseline") or {"light_power_pct": record.get("baseline_power")}
+                        entry = pending[indoor_id] = PendingUpdate(UUID(record["user_id"]), baseline, record.get("shard", 0))
+                    entry.fields.update(record["fields"])
+                self._write(pending, replay=True)
+                recovered += len(pending)
+                if fcntl:
+                    os.remove(path)  # while still locked, or another worker could replay it again
+            if not fcntl:
+                os.remove(path)  # Windows can't remove an open file
+        return recovered
+
+    # ---- flushing ----
+
+    def flush(self, force: bool = False) -> int:
+        """Write indoors whose window has passed (all of them with force=True)"""
+        now = time.monotonic()
+        with self._lock:
+            due = {
+                indoor_id: entry for indoor_id, entry in self.pending.items()
+                if force or now - entry.first_at >= self.window_seconds
+            }
+            if not due:
+                return 0
+            for indoor_id in due:
+                del self.pending[indoor_id]
+        try:
+            self._write(due)
+        except Exception:
+            # Keep them for the next round; the journal still has them
+            with self._lock:
+                for indoor_id, entry in due.items():
+                    newer = self.pending.get(indoor_id)
+                    if newer is not None:
+                        entry.fields.update(newer.fields)
+                    self.pending[indoor_id] = entry
+            raise
+        with self._lock:
+            self._rewrite_journal()
+        return len(due)
+
+    def _write(self, entries: dict[UUID, PendingUpdate], replay: bool = False) -> None:
+        if not entries:
+            return
+        by_shard: dict[int, dict[UUID, PendingUpdate]] = {}
+        for indoor_id, entry in entries.items():
+            by_shard.setdefault(entry.shard, {})[indoor_id] = entry
+        written = []
+        try:
+            for shard, shard_entries in by_shard.items():
+                self._write_shard(shard, shard_entries, replay)
+                written.extend(shard_entries)
+        except Exception:
+            # The caller retries what is left in `entries`
+            for indoor_id in written:
+                del entries[indoor_id]
+            raise
+
+    def _write_shard(self, shard: int, entries: dict[UUID, PendingUpdate], replay: bool = False) -> None:
+        db = SessionLocal(bind=shard_engines[shard])
+        try:
+            history_events = {}
+            # By user, so the change_log row locks of concurrent flushes are taken in the same order
+            for indoor_id, entry in sorted(entries.items(), key=lambda item: str(item[1].user_id)):
+                if replay:
+                    # The flush may have committed before the crash: only what still differs is a change
+                    current = db.execute(
+                        select(*(getattr(Indoor, name) for name in LIGHT_FIELDS))
+                        .where(Indoor.id == indoor_id).with_for_update()
+                    ).first()
+                    if current is not None:
+                        entry.baseline = dict(zip(LIGHT_FIELDS, current))
+                values = {
+                    name: Decimal(str(value)) if name in NUMERIC_FIELDS and value is not None else value
+                    for name, value in entry.fields.items()
+                }
+                light = db.execute(
+                    update(Indoor).where(Indoor.id == indoor_id).values(**values)
+                    .returning(Indoor.light_schedule, Indoor.light_power_pct)
+                ).first()
+
+                # History only for the net change over the whole window
+                change = light_change(entry.baseline, entry.fields)
+                if change:
+                    message, payload = change
+                    event_ts = datetime.now(timezone.utc)
+                    history_id = uuid4()
+                    db.add(IndoorHistory(id=history_id, indoor_id=indoor_id, event_ts=event_ts, message=message, payload=payload))
+                    history_events[indoor_id] = {"event_ts": event_ts, "message": message, "payload": payload}
+                    emit_change(db, "indoor_history", entry.user_id, history_id)
+                    if light and ("power_pct" in payload["light"] or "schedule" in payload["light"]):
+                        record_period(db, indoor_id, entry.user_id, light.light_schedule, light.light_power_pct, event_ts)
+                emit_change(db, "indoors", entry.user_id, indoor_id)
+            db.commit()
+        finally:
+            db.close()
+
+        self.flushed_updates += len(entries)
+        for indoor_id, entry in entries.items():
+            cache.invalidate_user(entry.user_id)
+            channel = indoor_channel(indoor_id)
+            broker.publish(channel, "indoor_updated", entry.fields)
+            if indoor_id in history_events:
+                broker.publish(channel, "history", history_events[indoor_id])
+
+    # ---- lifecycle ----
+
+    async def start(self) -> None:
+        recovered = await asyncio.to_thread(self.recover)
+        if recovered:
+            logger.info("Recovered %d buffered indoor updates from journals", recovered)
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+        await asyncio.to_thread(self.flush, True)
+        if self._journal is not None:
+            self._journal.close()
+            self._journal = None
+            if not self.pending:
+                os.remove(self._journal_file())
+
+    async def _run(self) -> None:
+        interval = max(self.window_seconds / 4, 0.05)
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                # The writes block: keep them off the event loop
+                await asyncio.to_thread(self.flush)
+            except Exception:
+                logger.exception("Could not flush buffered indoor updates")
+
+    def stats(self) -> dict:
+        return {
+            "pending": len(self.pending),
+            "flushed": self.flushed_updates,
+            "coalesced": self.coalesced_updates,
+        }
+
+
+def _open_locked(path: str, mode: str):
+    """Open a journal file holding its lock (a live worker's journal is never replayed)"""
+    journal = open(path, mode, encoding="utf-8")
+    if fcntl:
+        fcntl.flock(journal, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    return journal
+
+
+def _fsync_dir(path: str) -> None:
+    """Make a rename in the directory of path durable"""
+    try:
+        fd = os.open(os.path.dirname(path) or ".", os.O_RDONLY)
+    except OSError:
+        return  # Windows: directories can't be opened
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+indoor_buffer = IndoorWriteBuffer(
+    window_seconds=settings.indoor_write_behind_ms / 1000,
+    journal_path=settings.indoor_write_journal,
+)
@@ -1,30 +1,31 @@
 """
 Indoor-related services
 """
-from datetime import datetime, date
+from datetime import datetime, date, timezone
 from sqlalchemy.orm import Session
-from sqlalchemy import desc
-from app.models import Indoor, Plant, IndoorHistory
-from uuid import UUID
+from sqlalchemy import inspect
+from app.models import Indoor, IndoorHistory
+from app.queries import fetch_indoor, fetch_indoor_plants, fetch_indoor_history
+from app.cache import cache
+from app.events import broker, indoor_channel
+from app.changefeed import emit_change
+from app.services.light_service import LIGHT_FIELDS, light_change, record_period
+from app.services.indoor_buffer import indoor_buffer
+from uuid import UUID, uuid4
 
 
-def get_indoor_with_plants(db: Session, user_id: UUID, indoor_id: UUID) -> tuple[Indoor, list[Plant], list[IndoorHistory]]:
+def get_indoor_with_plants(db: Session, user_id: UUID, indoor_id: UUID) -> tuple:
     """
-    Get indoor with its plants and history.
+    Get indoor with its plants and history, as column rows (no ORM entities).
     Returns None if indoor doesn't belong to user.
     """
-    indoor = db.query(Indoor).filter(
-        Indoor.id == indoor_id,
-        Indoor.user_id == user_id
-    ).first()
+    indoor = fetch_indoor(db, user_id, indoor_id)
     
     if not indoor:
         return None, None, None
     
-    plants = db.query(Plant).filter(Plant.indoor_id == indoor_id).all()
-    history = db.query(IndoorHistory).filter(
-        IndoorHistory.indoor_id == indoor_id
-    ).order_by(desc(IndoorHistory.event_ts)).all()
+    plants = fetch_indoor_plants(db, indoor_id)
+    history = fetch_indoor_history(db, indoor_id)
     
     return indoor, plants, history
 
@@ -43,9 +44,30 @@ def update_indoor(
     light_schedule: str | None = None,
 ) -> Indoor:
     """
-    Update indoor fields and create history if light_power_pct changes.
+    Update indoor fields. Light changes (power, height, schedule) get a
+    history entry with a structured payload, and power or schedule changes
+    open a new light period. With write-behind enabled the update is
+    buffered and flushed later.
     """
-    old_light_power = indoor.light_power_pct
+    if indoor_buffer.enabled:
+        fields = {
+            name: value for name, value in (
+                ("temp_c", temp_c),
+                ("humidity", humidity),
+                ("fan_location", fan_location),
+                ("extractor_top", extractor_top),
+                ("extractor_bottom", extractor_bottom),
+                ("fan", fan),
+                ("light_height_cm", light_height_cm),
+                ("light_power_pct", light_power_pct),
+                ("light_schedule", light_schedule),
+            )
+            if value is not None
+        }
+        return indoor_buffer.add(db, indoor, fields)
+    
+    old_light = {name: getattr(indoor, name) for name in LIGHT_FIELDS}
+    history_event = None
     
     # Update fields
     if temp_c is not None:
@@ -67,21 +89,46 @@ def update_indoor(
     if light_schedule is not None:
         indoor.light_schedule = light_schedule
     
-    # Create history if light_power_pct changed
-    if light_power_pct is not None and old_light_power != light_power_pct:
-        if light_power_pct > old_light_power:
-            message = f"Se aumentó la potencia de la luz a {light_power_pct}%."
-        else:
-            message = f"Se ajustó la potencia de la luz a {light_power_pct}%."
-        
+    # Field changes for live subscribers, captured before a flush resets them
+    changes = {
+        attr.key: attr.history.added[0]
+        for attr in inspect(indoor).attrs
+        if attr.history.has_changes() and attr.history.added
+    }
+
+    # Create history if the light changed
+    change = light_change(old_light, {
+        "light_power_pct": light_power_pct,
+        "light_height_cm": light_height_cm,
+        "light_schedule": light_schedule,
+    })
+    if change:
+        message, payload = change
+        now = datetime.now(timezone.utc)
         history = IndoorHistory(
+            id=uuid4(),
             indoor_id=indoor.id,
-            event_ts=datetime.now(),
+            event_ts=now,
             message=message,
-            payload=None
+            payload=payload
         )
         db.add(history)
+        history_event = {"event_ts": history.event_ts, "message": message, "payload": payload}
+        if "power_pct" in payload["light"] or "schedule" in payload["light"]:
+            db.flush()  # the indoor's row lock orders writers of its light periods
+            record_period(db, indoor.id, indoor.user_id, indoor.light_schedule, indoor.light_power_pct, now)
+    
+    emit_change(db, "indoors", indoor.user_id, indoor.id)
+    if history_event:
+        emit_change(db, "indoor_history", indoor.user_id, history.id)
     
     db.commit()
     db.refresh(indoor)
+    cache.invalidate_user(indoor.user_id)
+    
+    channel = indoor_channel(indoor.id)
+    if changes:
+        broker.publish(channel, "indoor_updated", changes)
+    if history_event is not None:
+        broker.publish(channel, "history", history_event)
     return indoor
@@ -0,0 +1,339 @@
+"""
+Light schedules: parsed photoperiods and cumulative light tracking.
+
+`Indoor.light_schedule` stays free text ("18/6", "12/12 08:00",
+"06:00-00:00"); `parse_schedule()` reads it into on/off minutes and the
+local time lights go on. Every change of schedule or power opens a
+`light_periods` row that stores, besides the new settings, the light hours
+and relative DLI accumulated up to its start. Inside a period lights follow
+a fixed cycle, so the hours lit up to any instant are one division from the
+cycle start; totals over a range are the difference of two such values,
+each found by bisecting the periods, not by replaying the changes.
+
+Relative DLI is counted in full-power hours (hours x power / 100): without
+the fixture's PPFD the absolute mol/m2/day can't be known, but two ranges
+or two indoors can be compared.
+
+    python -m app.services.light_service backfill
+"""
+import re
+from bisect import bisect_right
+from dataclasses import dataclass
+from datetime import date, datetime, time, timedelta, timezone
+from uuid import UUID
+
+from sqlalchemy import func, insert, select
+from sqlalchemy.orm import Session
+
+from app.models import User, Indoor, IndoorHistory, LightPeriod
+from app.queries import as_float
+from app.read_models import LightPeriodView, load
+from app.services import get_zone, light_power_message
+
+# "18/6", "18-6", "20h/4h", "18.5/5.5", optionally followed by the time lights go on
+# ("18/6 06:00", "18/6 desde las 6", "12/12 @ 8:30hs")
+HOURS_SCHEDULE = re.compile(
+    r"^\s*(\d{1,2}(?:[.,]\d+)?)\s*h?\s*[/-]\s*(\d{1,2}(?:[.,]\d+)?)\s*h?"
+    r"(?:\s*(?:desde|de|a|on|@)?\s*(?:las\s*)?(\d{1,2})(?::(\d{2}))?\s*(?:hs|h)?)?\s*$",
+    re.IGNORECASE,
+)
+# "06:00-00:00", "6:00 a 24:00"
+TIMES_SCHEDULE = re.compile(r"^\s*(\d{1,2}):(\d{2})\s*(?:-|a|to)\s*(\d{1,2}):(\d{2})\s*$", re.IGNORECASE)
+
+DEFAULT_ON_AT = time(0, 0)
+FULL_POWER_PCT = 100
+
+LIGHT_FIELDS = ("light_power_pct", "light_height_cm", "light_schedule")
+
+
+@dataclass(slots=True, frozen=True)
+class LightSchedule:
+    on_minutes: int
+    off_minutes: int
+    on_at: time
+
+    @property
+    def cycle_minutes(self) -> int:
+        return self.on_minutes + self.off_minutes
+
+    @property
+    def on_hours(self) -> float:
+        return self.on_minutes / 60
+
+    @property
+    def off_hours(self) -> float:
+        return self.off_minutes / 60
+
+
+def _minutes(hours: str) -> int:
+    return round(float(hours.replace(",", ".")) * 60)
+
+
+def parse_schedule(text: str | None) -> LightSchedule | None:
+    """Read a schedule as written by the user; None if it can't be read"""
+    if not text:
+        return None
+
+    match = TIMES_SCHEDULE.match(text)
+    if match:
+        on_h, on_m, off_h, off_m = (int(group) for group in match.groups())
+        if on_h > 24 or off_h > 24 or on_m > 59 or off_m > 59:
+            return None
+        on_at, off_at = (on_h % 24) * 60 + on_m, (off_h % 24) * 60 + off_m
+        on_minutes = (off_at - on_at) % 1440 or 1440
+        return LightSchedule(on_minutes, 1440 - on_minutes, time(on_at // 60, on_at % 60))
+
+    match = HOURS_SCHEDULE.match(text)
+    if not match:
+        return None
+    on, off, hour, minute = match.groups()
+    on_minutes, off_minutes = _minutes(on), _minutes(off)
+    if on_minutes + off_minutes == 0 or on_minutes > 1440 * 2 or off_minutes > 1440 * 2:
+        return None
+    on_at = DEFAULT_ON_AT
+    if hour is not None:
+        hour, minute = int(hour), int(minute or 0)
+        if hour > 24 or minute > 59:
+            return None
+        on_at = time(hour % 24, minute)
+    return LightSchedule(on_minutes, off_minutes, on_at)
+
+
+def _aware(ts: datetime) -> datetime:
+    # SQLite gives naive timestamps back; they were written in UTC
+    return ts if ts.tzinfo is not None else ts.replace(tzinfo=timezone.utc)
+
+
+def cycle_start(schedule: LightSchedule, at: datetime, tz: str | None) -> datetime:
+    """Last lights-on instant at or before `at`, in UTC (local on_at; server time without timezone)"""
+    local = _aware(at).astimezone(get_zone(tz))
+    anchor = datetime.combine(local.date(), schedule.on_at, local.tzinfo)
+    if anchor > local:
+        cycle = timedelta(minutes=schedule.cycle_minutes)
+        anchor -= cycle * -(-(anchor - local) // cycle)
+    return anchor.astimezone(timezone.utc)
+
+
+# ============ ENGINE ============
+
+LIGHT_PERIOD_COLUMNS = (
+    LightPeriod.starts_at,
+    LightPeriod.schedule,
+    LightPeriod.on_minutes,
+    LightPeriod.off_minutes,
+    LightPeriod.cycle_start,
+    LightPeriod.power_pct,
+    as_float(LightPeriod.light_hours),
+    as_float(LightPeriod.light_dli),
+)
+
+
+def _lit_seconds(period: LightPeriodView, at: datetime) -> float:
+    """Seconds lit between the period's cycle start and `at`"""
+    cycle = (period.on_minutes + period.off_minutes) * 60
+    full, rest = divmod((at - _aware(period.cycle_start)).total_seconds(), cycle)
+    return full * period.on_minutes * 60 + min(rest, period.on_minutes * 60)
+
+
+def _accumulated(period: LightPeriodView, at: datetime) -> tuple[float, float]:
+    """(light hours, full-power hours) from the first period up to `at`, inside `period`"""
+    if period.on_minutes is None:
+        return period.light_hours, period.light_dli
+    hours = (_lit_seconds(period, at) - _lit_seconds(period, _aware(period.starts_at))) / 3600
+    weight = (period.power_pct if period.power_pct is not None else FULL_POWER_PCT) / 100
+    return period.light_hours + hours, period.light_dli + hours * weight
+
+
+class LightCurve:
+    """Cumulative light of one indoor over a sorted run of its periods"""
+
+    def __init__(self, periods: list[LightPeriodView]):
+        self.periods = periods
+        self._starts = [_aware(period.starts_at) for period in periods]
+
+    def at(self, ts: datetime) -> tuple[float, float]:
+        """(light hours, full-power hours) accumulated up to `ts`"""
+        ts = _aware(ts)
+        index = bisect_right(self._starts, ts) - 1
+        if index < 0:
+            return (self.periods[0].light_hours, self.periods[0].light_dli) if self.periods else (0.0, 0.0)
+        return _accumulated(self.periods[index], ts)
+
+    def between(self, start: datetime, end: datetime) -> tuple[float, float]:
+        start_hours, start_dli = self.at(start)
+        end_hours, end_dli = self.at(end)
+        return end_hours - start_hours, end_dli - start_dli
+
+
+def load_curve(db: Session, indoor_id: UUID, start: datetime, end: datetime) -> LightCurve:
+    """Periods covering [start, end]: the one open at `start` and those starting up to `end`"""
+    opening = (
+        select(func.max(LightPeriod.starts_at))
+        .where(LightPeriod.indoor_id == indoor_id, LightPeriod.starts_at <= start)
+        .scalar_subquery()
+    )
+    rows = db.execute(
+        select(*LIGHT_PERIOD_COLUMNS)
+        .where(
+            LightPeriod.indoor_id == indoor_id,
+            LightPeriod.starts_at >= func.coalesce(opening, start),
+            LightPeriod.starts_at <= end,
+        )
+        .order_by(LightPeriod.starts_at)
+    )
+    return LightCurve(load(LightPeriodView, rows))
+
+
+def daily(curve: LightCurve, first: date, last: date, tz: str | None, until: datetime) -> list[tuple]:
+    """(day, light hours, full-power hours) per local day, counted up to `until`"""
+    zone = get_zone(tz)
+    until = _aware(until)
+    boundaries = []
+    for ordinal in range(first.toordinal(), last.toordinal() + 2):
+        day = date.fromordinal(ordinal)
+        midnight = datetime.combine(day, time(0, 0), zone) if zone else datetime.combine(day, time(0, 0)).astimezone()
+        boundaries.append(curve.at(min(midnight, until)))
+    return [
+        (date.fromordinal(first.toordinal() + i), end[0] - start[0], end[1] - start[1])
+        for i, (start, end) in enumerate(zip(boundaries, boundaries[1:]))
+    ]
+
+
+# ============ WRITES ============
+
+def record_period(
+    db,
+    indoor_id: UUID,
+    user_id: UUID,
+    schedule: str | None,
+    power_pct: int | None,
+    at: datetime,
+) -> bool:
+    """
+    Open a period with the indoor's light settings from `at`, closing the
+    previous one. Call it after the indoor's UPDATE in the same transaction:
+    that row lock orders concurrent writers. `db` may be a Session or a
+    Connection. Returns False if the settings didn't change.
+    """
+    last = db.execute(
+        select(*LIGHT_PERIOD_COLUMNS)
+        .where(LightPeriod.indoor_id == indoor_id)
+        .order_by(LightPeriod.starts_at.desc())
+        .limit(1)
+    ).first()
+    if last is not None:
+        last = LightPeriodView(*last)
+        if last.schedule == schedule and last.power_pct == power_pct:
+            return False
+        # Clock skew between workers: never open a period before the previous one
+        at = max(_aware(at), _aware(last.starts_at) + timedelta(microseconds=1))
+        light_hours, light_dli = _accumulated(last, at)
+    else:
+        light_hours = light_dli = 0.0
+
+    tz = db.execute(select(User.timezone).where(User.id == user_id)).scalar()
+    parsed = parse_schedule(schedule)
+    db.execute(insert(LightPeriod).values(
+        indoor_id=indoor_id,
+        starts_at=at,
+        schedule=schedule,
+        on_minutes=parsed.on_minutes if parsed else None,
+        off_minutes=parsed.off_minutes if parsed else None,
+        cycle_start=cycle_start(parsed, at, tz) if parsed else None,
+        power_pct=power_pct,
+        light_hours=round(light_hours, 4),
+        light_dli=round(light_dli, 4),
+    ))
+    return True
+
+
+def _height(value) -> float | None:
+    return float(value) if value is not None else None
+
+
+def light_change(old: dict, new: dict) -> tuple[str, dict] | None:
+    """
+    History message and structured payload for a change of the LIGHT_FIELDS
+    between two states of an indoor, or None if none of them changed.
+    """
+    changes = {}
+    messages = []
+    if new.get("light_power_pct") is not None and new["light_power_pct"] != old.get("light_power_pct"):
+        changes["power_pct"] = {"from": old.get("light_power_pct"), "to": new["light_power_pct"]}
+        messages.append(light_power_message(old.get("light_power_pct"), new["light_power_pct"]))
+    if new.get("light_height_cm") is not None and _height(new["light_height_cm"]) != _height(old.get("light_height_cm")):
+        height = _height(new["light_height_cm"])
+        changes["height_cm"] = {"from": _height(old.get("light_height_cm")), "to": height}
+        messages.append(f"Se ajustó la altura de la luz a {height:g} cm.")
+    if new.get("light_schedule") is not None and new["light_schedule"] != old.get("light_schedule"):
+        change = {"from": old.get("light_schedule"), "to": new["light_schedule"]}
+        parsed = parse_schedule(new["light_schedule"])
+        if parsed:
+            change.update(on_hours=parsed.on_hours, off_hours=parsed.off_hours, on_at=parsed.on_at.strftime("%H:%M"))
+        changes["schedule"] = change
+        messages.append(f"Se cambió el fotoperiodo a {new['light_schedule']}.")
+    if not changes:
+        return None
+    return " ".join(messages), {"light": changes}
+
+
+def backfill(connection, commit=None) -> int:
+    """
+    Open the first period of indoors that have none: from their creation,
+    with the current schedule and the power of each light power change
+    still in indoor_history. Returns the number of periods created.
+    """
+    indoors = connection.execute(
+        select(Indoor.id, Indoor.user_id, Indoor.created_at, Indoor.light_schedule, Indoor.light_power_pct)
+        .where(~select(LightPeriod.indoor_id).where(LightPeriod.indoor_id == Indoor.id).exists())
+        .order_by(Indoor.id)
+    ).all()
+
+    created = 0
+    for indoor in indoors:
+        # Power changes only left a message ("... potencia de la luz a 80%."), parsed back here.
+        # Those rows were written with the server's naive local time: astimezone() reads them so
+        changes = [
+            (row.event_ts.astimezone(timezone.utc), int(match.group(1)))
+            for row in connection.execute(
+                select(IndoorHistory.event_ts, IndoorHistory.message)
+                .where(IndoorHistory.indoor_id == indoor.id, IndoorHistory.message.like("%potencia de la luz a %"))
+                .order_by(IndoorHistory.event_ts)
+            )
+            if (match := re.search(r"(\d+)%", row.message))
+        ]
+        if not indoor.light_schedule and not changes and indoor.light_power_pct is None:
+            continue
+        # Before the first recorded change the power is unknown: counted as full power
+        power = None if changes else indoor.light_power_pct
+        created += record_period(
+            connection, indoor.id, indoor.user_id, indoor.light_schedule, power, indoor.created_at
+        )
+        for event_ts, power in changes:
+            created += record_period(
+                connection, indoor.id, indoor.user_id, indoor.light_schedule, power, event_ts
+            )
+        if commit:
+            commit()
+    return created
+
+
+if __name__ == "__main__":
+    import argparse
+    from app.database import SessionLocal
+
+    parser = argparse.ArgumentParser(description="Light schedule tools")
+    sub = parser.add_subparsers(dest="command", required=True)
+    sub.add_parser("backfill", help="open the first light period of existing indoors")
+    sub.add_parser("parse", help="show how a schedule is read").add_argument("schedule")
+    args = parser.parse_args()
+
+    if args.command == "parse":
+        parsed = parse_schedule(args.schedule)
+        print(parsed and f"{parsed.on_hours:g}h on / {parsed.off_hours:g}h off, lights on at {parsed.on_at:%H:%M}")
+    else:
+        db = SessionLocal()
+        try:
+            print(f"Backfill done: {backfill(db, commit=db.commit)} light periods")
+        finally:
+            db.close()
@@ -4,9 +4,28 @@ Plant-related services
 from datetime import date, datetime
 from decimal import Decimal
 from sqlalchemy.orm import Session
-from app.models import Plant, WateringHistory
+from app.queries import (
+    PLANT_FOR_WATERING, INSERT_WATERING, UPDATE_PLANT_WATERED,
+    PLANTS_FOR_SESSION, INSERT_SESSION, INSERT_SESSION_WATERING, MARK_PLANT_WATERED, PLANTS_BY_IDS,
+)
+from app.read_models import PlantView, WateringView, WateringSessionView, load, load_one
 from app.services import compute_next_water_at
-from uuid import UUID
+from app.services.fertilizer_service import ferts_items, record_fertilizers
+from app.cache import cache
+from app.events import broker, indoor_channel
+from app.changefeed import emit_change
+from app.services.sync_service import log_changes
+from uuid import UUID, uuid4
+
+
+def _ferts_dict(ferts: list | None) -> dict | None:
+    """Convert ferts list to dict for JSONB (kept as sent; amounts are normalized apart)"""
+    if not ferts:
+        return None
+    return {
+        item["name"]: f"{item['amount']} {item['unit']}" if item.get("unit") else item["amount"]
+        for item in ferts
+    }
 
 
 def register_watering(
@@ -17,19 +36,17 @@ def register_watering(
     event_date: date | None = None,
     note: str | None = None,
     ferts: list | None = None,
-) -> tuple[Plant, WateringHistory]:
+) -> tuple:
     """
     Register a watering event and update plant next_water_at.
-    Returns (plant, watering_history).
+    Returns (PlantView, WateringView), (None, None) if the
+    plant doesn't belong to the user.
     """
     if event_date is None:
         event_date = date.today()
     
     # Get plant and verify it belongs to user
-    plant = db.query(Plant).filter(
-        Plant.id == plant_id,
-        Plant.user_id == user_id
-    ).first()
+    plant = db.execute(PLANT_FOR_WATERING, {"plant_id": plant_id, "user_id": user_id}).first()
     
     if not plant:
         return None, None
@@ -37,29 +54,125 @@ def register_watering(
     # Create watering history
     event_ts = datetime.combine(event_date, datetime.now().time())
     
-    # Convert ferts list to dict for JSONB
-    ferts_dict = None
-    if ferts:
-        ferts_dict = {item["name"]: item["amount"] for item in ferts}
+    ferts_dict = _ferts_dict(ferts)
     
-    watering_history = WateringHistory(
-        plant_id=plant.id,
-        event_ts=event_ts,
-        liters=Decimal(str(liters)),
-        note=note,
-        ferts=ferts_dict
-    )
-    db.add(watering_history)
+    watering_history = load_one(WateringView, db.execute(INSERT_WATERING, {
+        "plant_id": plant.id,
+        "event_ts": event_ts,
+        "liters": Decimal(str(liters)),
+        "note": note,
+        "ferts": ferts_dict
+    }).one())
     
-    # Update plant
-    plant.last_watered_at = event_date
-    plant.next_water_at = compute_next_water_at(
-        event_date,
-        plant.watering_interval_days
+    record_fertilizers(
+        db, watering_history.id, user_id, plant.indoor_id, event_ts, liters, ferts_items(ferts_dict)
     )
+
+    # Update plant; RETURNING gives the response columns without a refresh
+    plant = load_one(PlantView, db.execute(UPDATE_PLANT_WATERED, {
+        "plant_id": plant.id,
+        "new_last_watered_at": event_date,
+        "new_next_water_at": compute_next_water_at(event_date, plant.watering_interval_days)
+    }).one())
+    emit_change(db, "watering_history", user_id, watering_history.id)
+    emit_change(db, "plants", user_id, plant.id)
     
     db.commit()
-    db.refresh(plant)
-    db.refresh(watering_history)
+    cache.invalidate_user(user_id)
+    
+    if plant.indoor_id:
+        broker.publish(indoor_channel(plant.indoor_id), "watering", {
+            "plant_id": plant.id,
+            "event_ts": watering_history.event_ts,
+            "liters": watering_history.liters,
+            "last_watered_at": plant.last_watered_at,
+            "next_water_at": plant.next_water_at
+        })
     
     return plant, watering_history
+
+
+def register_watering_session(
+    db: Session,
+    user_id: UUID,
+    plants: list[tuple[UUID, float | None]],
+    event_date: date | None = None,
+    note: str | None = None,
+    ferts: list | None = None,
+) -> tuple:
+    """
+    Register one mix used on several plants: a single watering_sessions row
+    holds the note and ferts, and each plant gets a compact watering_history
+    row (plant, liters) pointing to it. `plants` is (plant_id, liters), with
+    None liters meaning the plant's default_liters.
+    Returns (WateringSessionView, [PlantView]), (None, None) if any plant
+    doesn't belong to the user.
+    """
+    if event_date is None:
+        event_date = date.today()
+
+    plant_ids = [plant_id for plant_id, _ in plants]
+    owned = {row.id: row for row in db.execute(PLANTS_FOR_SESSION, {"plant_ids": plant_ids, "user_id": user_id})}
+    if len(owned) != len(set(plant_ids)):
+        return None, None
+
+    event_ts = datetime.combine(event_date, datetime.now().time())
+    liters_by_plant = {
+        plant_id: Decimal(str(liters if liters is not None else owned[plant_id].default_liters))
+        for plant_id, liters in plants
+    }
+    indoor_ids = {owned[plant_id].indoor_id for plant_id in liters_by_plant}
+    ferts_dict = _ferts_dict(ferts)
+
+    session = load_one(WateringSessionView, db.execute(INSERT_SESSION, {
+        "id": uuid4(),
+        "user_id": user_id,
+        "indoor_id": next(iter(indoor_ids)) if len(indoor_ids) == 1 else None,
+        "event_ts": event_ts,
+        "total_liters": sum(liters_by_plant.values()),
+        "note": note,
+        "ferts": ferts_dict,
+    }).one())
+
+    waterings = [
+        {"id": uuid4(), "plant_id": plant_id, "event_ts": event_ts, "liters": liters, "session_id": session.id}
+        for plant_id, liters in liters_by_plant.items()
+    ]
+    db.execute(INSERT_SESSION_WATERING, waterings)
+    db.execute(MARK_PLANT_WATERED, [
+        {
+            "plant_id": plant_id,
+            "new_last_watered_at": event_date,
+            "new_next_water_at": compute_next_water_at(event_date, owned[plant_id].watering_interval_days),
+        }
+        for plant_id in liters_by_plant
+    ])
+
+    # Fertilizer totals per indoor, so usage by indoor stays exact for mixed sessions
+    items = ferts_items(ferts_dict)
+    if items:
+        for indoor_id in indoor_ids:
+            liters = sum(l for p, l in liters_by_plant.items() if owned[p].indoor_id == indoor_id)
+            record_fertilizers(db, None, user_id, indoor_id, event_ts, liters, items, session_id=session.id)
+
+    plants_view = load(PlantView, db.execute(PLANTS_BY_IDS, {"plant_ids": list(liters_by_plant)}))
+    emit_change(db, "watering_sessions", user_id, session.id)
+    emit_change(db, "watering_history", user_id)
+    emit_change(db, "plants", user_id)
+    log_changes(db, "watering_history", user_id, [row["id"] for row in waterings])
+    log_changes(db, "plants", user_id, list(liters_by_plant))
+
+    db.commit()
+    cache.invalidate_user(user_id)
+
+    for plant in plants_view:
+        if plant.indoor_id:
+            broker.publish(indoor_channel(plant.indoor_id), "watering", {
+                "plant_id": plant.id,
+                "event_ts": session.event_ts,
+                "liters": float(liters_by_plant[plant.id]),
+                "last_watered_at": plant.last_watered_at,
+                "next_water_at": plant.next_water_at
+            })
+
+    return session, plants_view
@@ -0,0 +1,321 @@
+"""
+Fuzzy plant search over name, species and notes.
+
+Each worker keeps a trigram index of the plants of recently active users
+(at most SEARCH_INDEX_MAX_USERS, least recently used dropped first). An
+index remembers the user's change_seq when it was last brought up to date;
+the user row read by every request carries the current one, so a search on
+an up-to-date index touches no table. When they differ, only the plants
+logged in change_log since then are read again, whichever worker wrote
+them. Users with more than SEARCH_INDEX_MAX_PLANTS plants are searched in
+Postgres through the pg_trgm GIN indexes on the same columns, unaccented
+with search_unaccent() as normalize() does here.
+
+Scores follow pg_trgm: similarity is shared trigrams over all trigrams of
+both strings, word similarity is shared trigrams over the query's. The
+name counts more than the species and the species more than the notes.
+"""
+import heapq
+import re
+import threading
+import unicodedata
+from collections import Counter, OrderedDict
+from dataclasses import dataclass
+from uuid import UUID
+
+from sqlalchemy import func, literal, or_, select
+from sqlalchemy.orm import Session
+
+from app.config import settings
+from app.models import ChangeLog, Plant
+
+# Field weights (word similarity; the name also by full similarity)
+NAME_WEIGHT = 1.0
+SPECIES_WEIGHT = 0.7
+NOTES_WEIGHT = 0.4
+# A name word starting with the query (typing "mon" for "Monstera")
+PREFIX_BONUS = 0.3
+# Same default as pg_trgm.similarity_threshold
+MIN_SCORE = 0.3
+
+NON_WORD = re.compile(r"[^a-z0-9]+")
+
+
+def normalize(text: str | None) -> str:
+    """Lowercase words without accents: "Regué la Monstera" -> "regue la monstera" """
+    if not text:
+        return ""
+    decomposed = unicodedata.normalize("NFKD", text.lower())
+    stripped = "".join(char for char in decomposed if not unicodedata.combining(char))
+    return " ".join(NON_WORD.sub(" ", stripped).split())
+
+
+def trigrams(normalized: str) -> set[str]:
+    """pg_trgm trigrams: each word padded with two spaces before and one after"""
+    grams = set()
+    for word in normalized.split():
+        padded = f"  {word} "
+        grams.update(padded[i:i + 3] for i in range(len(padded) - 2))
+    return grams
+
+
+@dataclass(slots=True)
+class PlantDoc:
+    id: UUID
+    name: str
+    species: str | None
+    indoor_id: UUID | None
+    name_words: tuple[str, ...]
+    name_grams: set[str]
+    species_grams: set[str]
+    notes_grams: set[str]
+
+
+@dataclass(slots=True, frozen=True)
+class SearchHit:
+    id: UUID
+    name: str
+    species: str | None
+    indoor_id: UUID | None
+    score: float
+
+
+def _doc(row) -> PlantDoc:
+    name = normalize(row.name)
+    return PlantDoc(
+        row.id, row.name, row.species, row.indoor_id, tuple(name.split()),
+        trigrams(name), trigrams(normalize(row.species)), trigrams(normalize(row.notes)),
+    )
+
+
+def _score(query: str, query_grams: set[str], doc: PlantDoc) -> float:
+    """Score of one plant for a query (what the index computes from its postings)"""
+    def word_similarity(grams: set[str]) -> float:
+        return len(query_grams & grams) / len(query_grams) if grams else 0.0
+
+    similarity = len(query_grams & doc.name_grams) / len(query_grams | doc.name_grams)
+    score = max(
+        NAME_WEIGHT * max(similarity, word_similarity(doc.name_grams)),
+        SPECIES_WEIGHT * word_similarity(doc.species_grams),
+        NOTES_WEIGHT * word_similarity(doc.notes_grams),
+    )
+    if _name_starts_with(doc, query):
+        score += PREFIX_BONUS
+    return score
+
+
+def _name_starts_with(doc: PlantDoc, query: str) -> bool:
+    return any(word.startswith(query) for word in doc.name_words) or " ".join(doc.name_words).startswith(query)
+
+
+class UserIndex:
+    """Trigram postings of one user's plants, one per field"""
+
+    FIELDS = ("name_grams", "species_grams", "notes_grams")
+
+    def __init__(self, seq: int):
+        self.seq = seq
+        # Refreshes mutate the postings a concurrent search iterates
+        self.lock = threading.Lock()
+        self.docs: dict[UUID, PlantDoc] = {}
+        self.postings: dict[str, dict[str, set[UUID]]] = {field: {} for field in self.FIELDS}
+
+    def upsert(self, row) -> None:
+        self.remove(row.id)
+        doc = self.docs[row.id] = _doc(row)
+        for field, postings in self.postings.items():
+            for gram in getattr(doc, field):
+                postings.setdefault(gram, set()).add(doc.id)
+
+    def remove(self, plant_id: UUID) -> None:
+        doc = self.docs.pop(plant_id, None)
+        if doc is None:
+            return
+        for field, postings in self.postings.items():
+            for gram in getattr(doc, field):
+                ids = postings.get(gram)
+                if ids is not None:
+                    ids.discard(plant_id)
+                    if not ids:
+                        del postings[gram]
+
+    def _shared(self, field: str, query_grams: set[str]) -> Counter:
+        """Trigrams each plant shares with the query in one field"""
+        postings = self.postings[field]
+        shared = Counter()
+        for gram in query_grams:
+            shared.update(postings.get(gram, ()))
+        return shared
+
+    def search(self, query: str, limit: int) -> list[SearchHit]:
+        query = normalize(query)
+        query_grams = trigrams(query)
+        if not query_grams:
+            return []
+        size = len(query_grams)
+        names = self._shared("name_grams", query_grams)
+        species = self._shared("species_grams", query_grams)
+        notes = self._shared("notes_grams", query_grams)
+        # A name starting with the query shares all its trigrams but the last one of each word
+        prefix_shared = size - len(query.split())
+        # Plants sharing too few trigrams can't reach MIN_SCORE in any field: skipped unscored
+        candidates = {plant_id for plant_id, shared in names.items() if shared >= min(MIN_SCORE * size, prefix_shared)}
+        candidates.update(plant_id for plant_id, shared in species.items() if shared >= MIN_SCORE / SPECIES_WEIGHT * size)
+        candidates.update(plant_id for plant_id, shared in notes.items() if shared >= MIN_SCORE / NOTES_WEIGHT * size)
+
+        hits = []
+        for plant_id in candidates:
+            doc = self.docs[plant_id]
+            shared = names.get(plant_id, 0)
+            score = max(
+                NAME_WEIGHT * max(shared / (size + len(doc.name_grams) - shared), shared / size),
+                SPECIES_WEIGHT * species.get(plant_id, 0) / size,
+                NOTES_WEIGHT * notes.get(plant_id, 0) / size,
+            )
+            if shared >= prefix_shared and _name_starts_with(doc, query):
+                score += PREFIX_BONUS
+            if score >= MIN_SCORE:
+                hits.append((score, doc))
+        best = heapq.nsmallest(limit, hits, key=lambda hit: (-hit[0], hit[1].name))
+        return [SearchHit(doc.id, doc.name, doc.species, doc.indoor_id, round(score, 3)) for score, doc in best]
+
+
+SEARCH_COLUMNS = (Plant.id, Plant.name, Plant.species, Plant.indoor_id, Plant.notes)
+
+
+class PlantSearch:
+    def __init__(self, max_users: int, max_plants: int):
+        self.max_users = max_users
+        self.max_plants = max_plants
+        self.indexes: OrderedDict[UUID, UserIndex] = OrderedDict()
+        # Sync handlers run in the threadpool
+        self._lock = threading.Lock()
+        self.builds = 0
+        self.refreshes = 0
+        self.db_searches = 0
+
+    def _build(self, db: Session, user_id: UUID, seq: int) -> UserIndex | None:
+        rows = db.execute(
+            select(*SEARCH_COLUMNS).where(Plant.user_id == user_id).limit(self.max_plants + 1)
+        ).all()
+        if len(rows) > self.max_plants:
+            return None
+        index = UserIndex(seq)
+        for row in rows:
+            index.upsert(row)
+        self.builds += 1
+        return index
+
+    def _refresh(self, db: Session, user_id: UUID, index: UserIndex, seq: int) -> bool:
+        """Apply plant changes logged after index.seq; False if the log no longer has them"""
+        log = db.execute(
+            select(ChangeLog.seq, ChangeLog.table_name, ChangeLog.entity_id)
+            .where(ChangeLog.user_id == user_id, ChangeLog.seq > index.seq, ChangeLog.seq <= seq)
+            .order_by(ChangeLog.seq)
+        ).all()
+        if not log or log[0].seq != index.seq + 1:
+            return False
+        changed = {entry.entity_id for entry in log if entry.table_name == "plants"}
+        if changed:
+            rows = {row.id: row for row in db.execute(select(*SEARCH_COLUMNS).where(Plant.id.in_(changed)))}
+            for plant_id in changed:
+                if plant_id in rows:
+                    index.upsert(rows[plant_id])
+                else:
+                    index.remove(plant_id)
+            if len(index.docs) > self.max_plants:
+                return False
+        index.seq = seq
+        self.refreshes += 1
+        return True
+
+    def index_for(self, db: Session, user) -> UserIndex | None:
+        """
+        The user's index, at least at user.change_seq (a replica may be
+        behind the index); None if the user has too many plants for memory.
+        Returned with its lock held: release it after searching.
+        """
+        with self._lock:
+            index = self.indexes.get(user.id)
+            if index is not None:
+                self.indexes.move_to_end(user.id)
+
+        if index is not None:
+            index.lock.acquire()
+            if index.seq >= user.change_seq or self._refresh(db, user.id, index, user.change_seq):
+                return index
+            index.lock.release()
+
+        # Built outside the locks; if two requests race, the last one stays
+        index = self._build(db, user.id, user.change_seq)
+        with self._lock:
+            if index is None:
+                self.indexes.pop(user.id, None)
+                return None
+            self.indexes[user.id] = index
+            while len(self.indexes) > self.max_users:
+                self.indexes.popitem(last=False)
+        index.lock.acquire()
+        return index
+
+    def search(self, db: Session, user, query: str, limit: int = 10) -> list[SearchHit]:
+        index = self.index_for(db, user)
+        if index is not None:
+            try:
+                return index.search(query, limit)
+            finally:
+                index.lock.release()
+        self.db_searches += 1
+        return search_db(db, user.id, query, limit)
+
+    def stats(self) -> dict:
+        return {
+            "users": len(self.indexes),
+            "builds": self.builds,
+            "refreshes": self.refreshes,
+            "db_searches": self.db_searches,
+        }
+
+
+def search_db(db: Session, user_id: UUID, query: str, limit: int = 10) -> list[SearchHit]:
+    """Same ranking computed by Postgres with pg_trgm (GIN indexes); ILIKE elsewhere"""
+    query = normalize(query)
+    if not query:
+        return []
+    base = select(Plant.id, Plant.name, Plant.species, Plant.indoor_id).where(Plant.user_id == user_id)
+
+    if db.get_bind().dialect.name != "postgresql":
+        pattern = f"%{query}%"
+        rows = db.execute(
+            base.where(or_(Plant.name.ilike(pattern), Plant.species.ilike(pattern), Plant.notes.ilike(pattern)))
+            .order_by(Plant.name).limit(limit)
+        ).all()
+        return [SearchHit(*row, 1.0) for row in rows]
+
+    # `<%` keeps word similarities over pg_trgm.word_similarity_threshold (0.6 by
+    # default): lowered to MIN_SCORE for this transaction, the weights are applied below
+    db.execute(select(func.set_config("pg_trgm.word_similarity_threshold", str(MIN_SCORE), True)))
+
+    # pg_trgm ignores case and the expressions match the indexes; greatest() skips
+    # the NULLs of missing species or notes
+    q = func.search_unaccent(literal(query))
+    name, species, notes = (func.search_unaccent(column) for column in (Plant.name, Plant.species, Plant.notes))
+    score = func.greatest(
+        NAME_WEIGHT * func.greatest(func.similarity(q, name), func.word_similarity(q, name)),
+        SPECIES_WEIGHT * func.word_similarity(q, species),
+        NOTES_WEIGHT * func.word_similarity(q, notes),
+    ).label("score")
+    rows = db.execute(
+        base.add_columns(score)
+        # `<%` (word similarity) is what the gin_trgm_ops indexes can answer
+        .where(or_(q.op("<%")(name), q.op("<%")(species), q.op("<%")(notes)), score >= MIN_SCORE)
+        .order_by(score.desc(), Plant.name)
+        .limit(limit)
+    ).all()
+    return [SearchHit(row.id, row.name, row.species, row.indoor_id, round(float(row.score), 3)) for row in rows]
+
+
+plant_search = PlantSearch(
+    max_users=settings.search_index_max_users,
+    max_plants=settings.search_index_max_plants,
+)
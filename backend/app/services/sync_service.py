@@ -0,0 +1,149 @@
+"""
+Delta sync for offline-capable clients.
+
+Every write path logs the entities it touched in change_log through
+`emit_change()`. A client keeps the token of its last sync and asks for
+what changed after it: the work is a range scan of its own change_log rows
+plus one IN query per table, so it grows with the changes, not with the
+data. Deleted entities come back as tombstones.
+"""
+from typing import Iterable
+
+from sqlalchemy import delete, insert, select, update
+from sqlalchemy.orm import Session
+
+from app.models import User, ChangeLog, Indoor, IndoorHistory, Plant, WateringHistory, WateringSession
+from app.queries import as_float
+
+# Tables clients can sync, with the columns they get
+SYNC_COLUMNS = {
+    "indoors": (
+        Indoor.id, Indoor.name, as_float(Indoor.temp_c), as_float(Indoor.humidity), Indoor.fan_location,
+        Indoor.extractor_top, Indoor.extractor_bottom, Indoor.fan, as_float(Indoor.light_height_cm),
+        Indoor.light_power_pct, Indoor.light_schedule,
+    ),
+    "plants": (
+        Plant.id, Plant.indoor_id, Plant.name, Plant.species, Plant.planted_at, Plant.notes,
+        Plant.last_watered_at, Plant.next_water_at, Plant.watering_interval_days, as_float(Plant.default_liters),
+    ),
+    "watering_history": (
+        WateringHistory.id, WateringHistory.plant_id, WateringHistory.event_ts, as_float(WateringHistory.liters),
+        WateringHistory.note, WateringHistory.ferts, WateringHistory.session_id,
+    ),
+    "watering_sessions": (
+        WateringSession.id, WateringSession.indoor_id, WateringSession.event_ts,
+        as_float(WateringSession.total_liters), WateringSession.note, WateringSession.ferts,
+    ),
+    "indoor_history": (
+        IndoorHistory.id, IndoorHistory.indoor_id, IndoorHistory.event_ts, IndoorHistory.message,
+    ),
+}
+SYNC_TABLES = tuple(SYNC_COLUMNS)
+
+# Tables returned in full when a client syncs without a token
+SNAPSHOT_TABLES = {
+    "indoors": Indoor.user_id,
+    "plants": Plant.user_id,
+}
+
+
+class SyncTokenExpired(Exception):
+    """Changes after the token were pruned from change_log; a full sync is needed"""
+
+
+def log_changes(db: Session, table: str, user_id, entity_ids: Iterable, op: str = "upsert") -> None:
+    """
+    Append changes to the user's change_log in the current transaction.
+    Takes the user's row lock until commit, so concurrent writers of the
+    same user get consecutive seqs in commit order. That serializes one
+    user's writes from their first change to commit (other users' don't
+    contend); it stays on without sync clients, since the read-model caches
+    and the search index go by change_seq too.
+    """
+    entity_ids = [entity_id for entity_id in entity_ids if entity_id is not None]
+    if table not in SYNC_COLUMNS or not entity_ids:
+        return
+    last = db.execute(
+        update(User.__table__)
+        .where(User.__table__.c.id == user_id)
+        .values(change_seq=User.__table__.c.change_seq + len(entity_ids))
+        .returning(User.__table__.c.change_seq)
+    ).scalar_one()
+    first = last - len(entity_ids) + 1
+    db.execute(insert(ChangeLog), [
+        {"user_id": user_id, "seq": first + i, "table_name": table, "entity_id": entity_id, "op": op}
+        for i, entity_id in enumerate(entity_ids)
+    ])
+
+
+def _rows(db: Session, table: str, condition) -> list:
+    columns = SYNC_COLUMNS[table]
+    return db.execute(select(*columns).where(condition)).all()
+
+
+def snapshot(db: Session, user_id) -> dict:
+    """Current indoors and plants plus the token to sync from afterwards"""
+    # The token is read first: anything committed in between comes again as a delta
+    token = db.execute(select(User.change_seq).where(User.id == user_id)).scalar_one()
+    result = {"token": token, "reset": True, "has_more": False, "changes": {}, "deleted": []}
+    for table, owner in SNAPSHOT_TABLES.items():
+        result["changes"][table] = _rows(db, table, owner == user_id)
+    return result
+
+
+def changes_since(db: Session, user_id, since: int, limit: int) -> dict:
+    """
+    Entities changed after `since`, at most `limit` change_log entries.
+    Raises SyncTokenExpired if some of those entries were already pruned, or
+    if the token is ahead of the user's change_seq (it wasn't issued for
+    this data, e.g. after a restore).
+    """
+    log = db.execute(
+        select(ChangeLog.seq, ChangeLog.table_name, ChangeLog.entity_id, ChangeLog.op)
+        .where(ChangeLog.user_id == user_id, ChangeLog.seq > since)
+        .order_by(ChangeLog.seq)
+        .limit(limit + 1)
+    ).all()
+
+    # Sequences are gapless per user: a missing first entry means it was pruned
+    if log and log[0].seq != since + 1:
+        raise SyncTokenExpired()
+    if not log:
+        current = db.execute(select(User.change_seq).where(User.id == user_id)).scalar_one()
+        if current != since:
+            raise SyncTokenExpired()
+        return {"token": since, "reset": False, "has_more": False, "changes": {}, "deleted": []}
+
+    has_more = len(log) > limit
+    log = log[:limit]
+
+    # Last operation per entity wins
+    latest = {}
+    for entry in log:
+        latest[(entry.table_name, entry.entity_id)] = entry.op
+
+    upserts = {}
+    deleted = []
+    for (table, entity_id), op in latest.items():
+        if op == "delete":
+            deleted.append({"table": table, "id": entity_id})
+        else:
+            upserts.setdefault(table, []).append(entity_id)
+
+    changes = {}
+    for table, ids in upserts.items():
+        model_id = SYNC_COLUMNS[table][0]
+        rows = _rows(db, table, model_id.in_(ids))
+        changes[table] = rows
+        # Logged but gone (e.g. archived): the client should drop it too
+        found = {row.id for row in rows}
+        deleted.extend({"table": table, "id": entity_id} for entity_id in ids if entity_id not in found)
+
+    return {"token": log[-1].seq, "reset": False, "has_more": has_more, "changes": changes, "deleted": deleted}
+
+
+def prune(db: Session, older_than) -> int:
+    """Delete change_log entries older than a datetime (tokens before them expire)"""
+    result = db.execute(delete(ChangeLog.__table__).where(ChangeLog.__table__.c.changed_at < older_than))
+    db.commit()
+    return result.rowcount
@@ -0,0 +1,426 @@
+"""
+Horizontal sharding of user data by telegram_user_id.
+
+DATABASE_URL is shard 0 and DATABASE_SHARDS lists the others (append only:
+a shard is its position in the list). Every row belongs to one user,
+through user_id or the user's indoors and plants, so a user lives entirely
+on one shard and requests only need the session of that shard
+(app.database.get_db / get_read_db).
+
+The directory (`user_shards`, in shard 0) records the shard of each user.
+New users are placed by a jump consistent hash of their telegram_user_id:
+adding a shard only sends new users there, and `rebalance` moves the
+existing users the hash now places on it. Users created before sharding
+was enabled have no entry yet and are looked up on every shard once.
+
+Workers cache directory entries for SHARD_DIRECTORY_TTL_SECONDS. A move
+marks the user as moving (their requests get 503 with Retry-After), waits
+until every worker has seen it and in-flight requests are over, copies the
+rows in one transaction, checks them, points the directory at the new
+shard and deletes the old rows. An interrupted move is finished by
+running it again.
+
+While a user is moved, all their requests get 503 for
+SHARD_DIRECTORY_TTL_SECONDS + the longest request deadline (30 s without
+deadlines) + the write-behind window (INDOOR_WRITE_BEHIND_MS) + 1 s
+(`freeze_seconds()`), plus the copy; about 36 s with the defaults, 16 s
+with REQUEST_DEADLINE_SECONDS=10. Clients retry after Retry-After. A rebalance
+freezes --batch users at a time for that long.
+
+    python -m app.sharding where TELEGRAM_USER_ID
+    python -m app.sharding move TELEGRAM_USER_ID SHARD
+    python -m app.sharding rebalance [--dry-run] [--limit N]
+    python -m app.sharding verify
+"""
+import hashlib
+import logging
+import threading
+import time
+from collections import OrderedDict
+
+from sqlalchemy import delete, func, select, update
+from sqlalchemy.orm import Session
+
+from app import counters
+from app.admission import longest_request_seconds
+from app.config import settings
+from app.database import Base, SessionLocal, shard_engines, shards
+from app.models import User, UserShard
+from app.portable import insert
+
+logger = logging.getLogger(__name__)
+
+COPY_BATCH = 1000
+
+
+class ShardMoving(Exception):
+    """The user's rows are being moved to another shard"""
+
+
+def jump_hash(key: int, buckets: int) -> int:
+    """Jump consistent hash (Lamping & Veach): going from n to n + 1 buckets moves 1/(n + 1) of the keys"""
+    bucket, candidate = -1, 0
+    while candidate < buckets:
+        bucket = candidate
+        key = (key * 2862933555777941757 + 1) & 0xFFFFFFFFFFFFFFFF
+        candidate = int((bucket + 1) * ((1 << 31) / ((key >> 33) + 1)))
+    return bucket
+
+
+def placement(telegram_user_id: int, count: int) -> int:
+    """Shard a new user goes to (ids are sequential, so they are hashed first)"""
+    digest = hashlib.blake2b(telegram_user_id.to_bytes(8, "big", signed=True), digest_size=8).digest()
+    return jump_hash(int.from_bytes(digest, "big"), count)
+
+
+def _read_engine(shard: int):
+    writer, reader = shards[shard]
+    return reader or writer
+
+
+def locate(telegram_user_id: int) -> list[int]:
+    """
+    Shards holding a users row for telegram_user_id (more than one after an
+    interrupted move). Placement and moves go by it: read on the primaries.
+    """
+    found = []
+    for shard, bind in enumerate(shard_engines):
+        with bind.connect() as conn:
+            if conn.execute(select(User.id).where(User.telegram_user_id == telegram_user_id)).first():
+                found.append(shard)
+    return found
+
+
+class ShardMap:
+    """Per-worker cache of the shard directory"""
+
+    def __init__(self, count: int, ttl_seconds: float, max_users: int):
+        self.count = count
+        self.ttl_seconds = ttl_seconds
+        self.max_users = max_users
+        # telegram_user_id -> (shard, moving_to, expires_at)
+        self._entries: OrderedDict[int, tuple[int, int | None, float]] = OrderedDict()
+        # Dependencies run in the threadpool
+        self._lock = threading.Lock()
+        self.lookups = 0
+        self.placed = 0
+        self.rejected = 0
+
+    def shard_of(self, telegram_user_id: int) -> int:
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(telegram_user_id)
+            if entry is not None and entry[2] > now:
+                self._entries.move_to_end(telegram_user_id)
+            else:
+                entry = None
+        if entry is None:
+            shard, moving_to = self.resolve(telegram_user_id)
+            entry = (shard, moving_to, now + self.ttl_seconds)
+            with self._lock:
+                self._entries[telegram_user_id] = entry
+                while len(self._entries) > self.max_users:
+                    self._entries.popitem(last=False)
+        if entry[1] is not None:
+            self.rejected += 1
+            raise ShardMoving()
+        return entry[0]
+
+    def resolve(self, telegram_user_id: int) -> tuple[int, int | None]:
+        """(shard, moving_to) from the directory, placing the user on first sight"""
+        self.lookups += 1
+        row = self._entry(telegram_user_id)
+        if row is not None:
+            return row.shard, row.moving_to
+
+        found = locate(telegram_user_id)
+        shard = found[0] if found else placement(telegram_user_id, self.count)
+        db = SessionLocal()
+        try:
+            db.execute(
+                insert(db, UserShard)
+                .values(telegram_user_id=telegram_user_id, shard=shard)
+                .on_conflict_do_nothing(index_elements=[UserShard.telegram_user_id])
+            )
+            db.commit()
+        finally:
+            db.close()
+        self.placed += 1
+        # Another worker may have placed the user first
+        row = self._entry(telegram_user_id)
+        return row.shard, row.moving_to
+
+    def _entry(self, telegram_user_id: int):
+        db = SessionLocal()
+        try:
+            return db.execute(
+                select(UserShard.shard, UserShard.moving_to).where(UserShard.telegram_user_id == telegram_user_id)
+            ).first()
+        finally:
+            db.close()
+
+    def stats(self) -> dict:
+        return {
+            "shards": self.count,
+            "cached": len(self._entries),
+            "lookups": self.lookups,
+            "placed": self.placed,
+            "rejected": self.rejected,
+        }
+
+
+shard_map = ShardMap(
+    count=len(shards),
+    ttl_seconds=settings.shard_directory_ttl_seconds,
+    max_users=settings.shard_directory_max_users,
+)
+
+
+# ============ MOVES ============
+
+def _owned(table, user_id):
+    """Where clause selecting the user's rows of a table; None if it holds no user data"""
+    if table.name == "users":
+        return table.c.id == user_id
+    if "user_id" in table.c:
+        return table.c.user_id == user_id
+    for fk in table.foreign_keys:
+        parent = fk.column.table
+        # Through a mandatory reference to an owned row (plant_id, indoor_id)
+        if not fk.parent.nullable and "user_id" in parent.c:
+            return fk.parent.in_(select(fk.column).where(parent.c.user_id == user_id))
+    return None  # idempotency keys, the directory
+
+
+def copy_user(source: Session, target: Session, user_id) -> dict[str, int]:
+    """Insert the user's rows from source into target's transaction; rows copied per table"""
+    copied = {}
+    for table in Base.metadata.sorted_tables:
+        owned = _owned(table, user_id)
+        if owned is None:
+            continue
+        # The counter triggers count the copied rows again
+        zeroed = dict.fromkeys(counters.COLUMNS.get(table.name, ()), 0)
+        count = 0
+        batch = []
+        for row in source.execute(select(table).where(owned)).mappings():
+            batch.append({**row, **zeroed})
+            if len(batch) == COPY_BATCH:
+                target.execute(table.insert(), batch)
+                count += len(batch)
+                batch = []
+        if batch:
+            target.execute(table.insert(), batch)
+            count += len(batch)
+        copied[table.name] = count
+    return copied
+
+
+def check_copy(source: Session, target: Session, user_id, copied: dict[str, int]) -> None:
+    """Row counts and trigger-maintained counters must match the source"""
+    for table in Base.metadata.sorted_tables:
+        if table.name not in copied:
+            continue
+        owned = _owned(table, user_id)
+        count = target.execute(select(func.count()).select_from(table).where(owned)).scalar_one()
+        if count != copied[table.name]:
+            raise RuntimeError(f"{table.name}: copied {copied[table.name]} rows, found {count}")
+        columns = counters.COLUMNS.get(table.name)
+        if columns:
+            query = select(table.c.id, *(table.c[name] for name in columns)).where(owned).order_by(table.c.id)
+            if source.execute(query).all() != target.execute(query).all():
+                raise RuntimeError(f"{table.name}: counters differ after the copy")
+
+
+def _copy(telegram_user_id: int, source: int, target: int) -> dict[str, int]:
+    # From the primary: a copy checked against a lagging reader could miss the last writes
+    src = SessionLocal(bind=shard_engines[source])
+    dst = SessionLocal(bind=shard_engines[target])
+    try:
+        if src.get_bind().dialect.name == "postgresql":
+            # One snapshot for every table (on SQLite, BEGIN IMMEDIATE gives it)
+            src.connection(execution_options={"isolation_level": "REPEATABLE READ"})
+        user_id = src.execute(select(User.id).where(User.telegram_user_id == telegram_user_id)).scalar_one_or_none()
+        # Left by an interrupted move to this shard
+        dst.execute(delete(User).where(User.telegram_user_id == telegram_user_id))
+        copied = {}
+        if user_id is not None:
+            copied = copy_user(src, dst, user_id)
+            check_copy(src, dst, user_id, copied)
+        dst.commit()
+        return copied
+    finally:
+        src.close()
+        dst.close()
+
+
+def _delete(telegram_user_id: int, shard: int) -> None:
+    """Drop a user's rows from a shard (the foreign keys cascade from users)"""
+    db = SessionLocal(bind=shard_engines[shard])
+    try:
+        db.execute(delete(User).where(User.telegram_user_id == telegram_user_id))
+        db.commit()
+    finally:
+        db.close()
+
+
+def _set_entry(db: Session, telegram_user_id: int, **values) -> None:
+    db.execute(update(UserShard).where(UserShard.telegram_user_id == telegram_user_id).values(**values))
+    db.commit()
+
+
+def freeze_seconds() -> float:
+    """Until every worker has seen a move and requests routed before it are over"""
+    return (
+        settings.shard_directory_ttl_seconds + longest_request_seconds()
+        + settings.indoor_write_behind_ms / 1000 + 1
+    )
+
+
+def move_users(moves: dict[int, int], wait_seconds: float | None = None) -> tuple[int, int]:
+    """
+    Move users (telegram_user_id -> shard) online, freezing them together.
+    Returns (moved, failed); a failed user stays where it was.
+    """
+    pending = {}
+    for telegram_user_id, target in moves.items():
+        shard, _ = shard_map.resolve(telegram_user_id)
+        if shard == target:
+            # Already there: drop copies an interrupted move left behind
+            for leftover in locate(telegram_user_id):
+                if leftover != target:
+                    _delete(telegram_user_id, leftover)
+            continue
+        pending[telegram_user_id] = (shard, target)
+    if not pending:
+        return 0, 0
+
+    wait_seconds = freeze_seconds() if wait_seconds is None else wait_seconds
+    directory = SessionLocal()
+    moved = failed = 0
+    try:
+        for telegram_user_id, (_, target) in pending.items():
+            directory.execute(
+                update(UserShard).where(UserShard.telegram_user_id == telegram_user_id).values(moving_to=target)
+            )
+        directory.commit()
+        print(f"{len(pending)} users frozen, waiting {wait_seconds:.0f}s for workers and in-flight requests")
+        time.sleep(wait_seconds)
+
+        for telegram_user_id, (source, target) in pending.items():
+            try:
+                copied = _copy(telegram_user_id, source, target)
+            except Exception:
+                logger.exception("Could not copy user %s to shard %s", telegram_user_id, target)
+                _set_entry(directory, telegram_user_id, moving_to=None)
+                failed += 1
+                continue
+            _set_entry(directory, telegram_user_id, shard=target, moving_to=None)
+            _delete(telegram_user_id, source)
+            moved += 1
+            print(f"{telegram_user_id}: shard {source} -> {target}, {sum(copied.values())} rows")
+    finally:
+        # Unfreeze whatever an error left behind
+        directory.rollback()
+        directory.execute(
+            update(UserShard).where(UserShard.telegram_user_id.in_(list(pending)), UserShard.moving_to.isnot(None))
+            .values(moving_to=None)
+        )
+        directory.commit()
+        directory.close()
+    return moved, failed
+
+
+def plan_rebalance() -> dict[int, int]:
+    """Users whose shard differs from their hash placement -> the shard it gives"""
+    plan = {}
+    for shard in range(len(shards)):
+        with _read_engine(shard).connect() as conn:
+            for (telegram_user_id,) in conn.execute(select(User.telegram_user_id)):
+                target = placement(telegram_user_id, len(shards))
+                if target != shard:
+                    plan[telegram_user_id] = target
+    return plan
+
+
+def verify() -> list[str]:
+    """Users on more than one shard, or not on the shard the directory says"""
+    located: dict[int, list[int]] = {}
+    for shard in range(len(shards)):
+        with _read_engine(shard).connect() as conn:
+            ids = conn.execute(select(User.telegram_user_id)).scalars().all()
+        print(f"shard {shard}: {len(ids)} users")
+        for telegram_user_id in ids:
+            located.setdefault(telegram_user_id, []).append(shard)
+
+    db = SessionLocal(bind=_read_engine(0))
+    try:
+        directory = {
+            row.telegram_user_id: row
+            for row in db.execute(select(UserShard.telegram_user_id, UserShard.shard, UserShard.moving_to))
+        }
+    finally:
+        db.close()
+
+    problems = []
+    for telegram_user_id, found in sorted(located.items()):
+        entry = directory.get(telegram_user_id)
+        if len(found) > 1:
+            problems.append(f"{telegram_user_id}: on shards {found}")
+        if entry is None:
+            continue
+        if entry.shard not in found:
+            problems.append(f"{telegram_user_id}: directory says shard {entry.shard}, found on {found}")
+        if entry.moving_to is not None:
+            problems.append(f"{telegram_user_id}: move to shard {entry.moving_to} not finished")
+    return problems
+
+
+if __name__ == "__main__":
+    import argparse
+    import sys
+
+    parser = argparse.ArgumentParser(description="Shard directory and user moves")
+    sub = parser.add_subparsers(dest="command", required=True)
+    where_parser = sub.add_parser("where", help="directory entry, hash placement and shards holding a user")
+    where_parser.add_argument("telegram_user_id", type=int)
+    move_parser = sub.add_parser("move", help="move one user to a shard")
+    move_parser.add_argument("telegram_user_id", type=int)
+    move_parser.add_argument("shard", type=int)
+    move_parser.add_argument("--wait", type=float, default=None, help="freeze seconds (default: directory TTL + request deadline + write-behind window + 1)")
+    rebalance_parser = sub.add_parser("rebalance", help="move users to their hash placement")
+    rebalance_parser.add_argument("--dry-run", action="store_true")
+    rebalance_parser.add_argument("--limit", type=int, default=None, help="move at most N users")
+    rebalance_parser.add_argument("--batch", type=int, default=100, help="users frozen together")
+    rebalance_parser.add_argument("--wait", type=float, default=None)
+    sub.add_parser("verify", help="check that every user is on exactly its directory shard")
+    args = parser.parse_args()
+
+    if args.command == "where":
+        tid = args.telegram_user_id
+        entry = shard_map._entry(tid)
+        print(f"directory: {tuple(entry) if entry else None}")
+        print(f"placement: {placement(tid, len(shards))} of {len(shards)}")
+        print(f"found on:  {locate(tid)}")
+    elif args.command == "move":
+        if not 0 <= args.shard < len(shards):
+            sys.exit(f"No shard {args.shard} (there are {len(shards)})")
+        moved, failed = move_users({args.telegram_user_id: args.shard}, args.wait)
+        sys.exit(1 if failed else 0)
+    elif args.command == "rebalance":
+        plan = list(plan_rebalance().items())[:args.limit]
+        print(f"{len(plan)} users to move")
+        if args.dry_run:
+            for tid, target in plan:
+                print(f"  {tid} -> shard {target}")
+            sys.exit(0)
+        failed = 0
+        for start in range(0, len(plan), args.batch):
+            failed += move_users(dict(plan[start:start + args.batch]), args.wait)[1]
+        sys.exit(1 if failed else 0)
+    else:
+        problems = verify()
+        for problem in problems:
+            print(f"  ⚠️  {problem}")
+        print("OK" if not problems else f"{len(problems)} problems")
+        sys.exit(1 if problems else 0)
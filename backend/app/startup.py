@@ -0,0 +1,224 @@
+"""
+Startup helpers: migration check, connection pool pre-warming and a
+cold start profile.
+
+    python -m app.startup migrate   # upgrade only if the DB is behind head
+    python -m app.startup profile   # import timings and time to first request
+"""
+import asyncio
+import logging
+import re
+import subprocess
+import sys
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+logger = logging.getLogger(__name__)
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+
+
+# ============ MIGRATIONS ============
+
+def _alembic_config():
+    from alembic.config import Config
+
+    return Config(str(BACKEND_DIR / "alembic.ini"))
+
+
+def migrate() -> None:
+    """
+    Run `alembic upgrade head` only when needed. The current revision is read
+    with one query; the full Alembic environment (which imports every model)
+    is only loaded when the database is actually behind. With sharding, every
+    shard is checked and upgraded the same way.
+    """
+    from alembic import command
+    from alembic.script import ScriptDirectory
+    from sqlalchemy import text
+    from sqlalchemy.exc import ProgrammingError, OperationalError
+    from app.database import shard_engines
+
+    config = _alembic_config()
+    heads = set(ScriptDirectory.from_config(config).get_heads())
+
+    for shard, bind in enumerate(shard_engines):
+        label = f"Shard {shard}" if len(shard_engines) > 1 else "Database"
+        try:
+            with bind.connect() as conn:
+                current = {row[0] for row in conn.execute(text("SELECT version_num FROM alembic_version"))}
+        except (ProgrammingError, OperationalError):
+            current = set()  # fresh database without alembic_version
+
+        if current == heads:
+            print(f"[startup] {label} already at head ({', '.join(sorted(heads))}), skipping migrations")
+            continue
+
+        print(f"[startup] {label} at {sorted(current) or 'base'}, upgrading to {sorted(heads)}")
+        config.attributes["database_url"] = bind.url.render_as_string(hide_password=False)
+        command.upgrade(config, "head")
+
+
+# ============ PRE-WARMING ============
+
+def prewarm(connections: int) -> None:
+    """
+    Open `connections` pooled connections in parallel and run the hot queries
+    once, so the first requests don't pay for TCP/TLS/auth handshakes or for
+    SQL compilation (SQLAlchemy caches compiled statements per engine).
+    """
+    from app.config import settings
+    from app.database import SessionLocal, engine, sqlite_reader
+
+    # On SQLite the writer is a single connection: the reads pool is warmed
+    pool_engine = sqlite_reader if sqlite_reader is not None else engine
+    if sqlite_reader is not None:
+        connections = min(connections, settings.sqlite_read_pool_size)
+
+    def open_connection(_):
+        conn = pool_engine.connect()
+        return conn
+
+    if connections > 0:
+        with ThreadPoolExecutor(max_workers=connections) as executor:
+            opened = list(executor.map(open_connection, range(connections)))
+        for conn in opened:
+            conn.close()
+
+    for bind in {engine, pool_engine}:
+        db = SessionLocal(bind=bind)
+        try:
+            warm_statement_cache(db)
+        finally:
+            db.close()
+
+
+def warm_statement_cache(db) -> None:
+    """Execute the hot request queries with values that match nothing"""
+    from app import queries
+
+    nil = uuid.UUID(int=0)
+    queries.fetch_user(db, -1)
+    queries.fetch_user_counters(db, nil)
+    queries.fetch_plants_schedule(db, nil)
+    queries.fetch_indoor_list(db, nil)
+    queries.fetch_indoor(db, nil, nil)
+    queries.fetch_indoor_plants(db, nil)
+    queries.fetch_indoor_history(db, nil)
+    queries.indoor_belongs_to(db, nil, nil)
+    db.execute(queries.PLANT_FOR_WATERING, {"plant_id": nil, "user_id": nil}).first()
+
+
+# ============ PROFILE ============
+
+IMPORT_LINE = re.compile(r"import time:\s+(\d+) \|\s+(\d+) \|(\s+)(\S+)")
+
+
+def _import_timings() -> list[tuple[str, int, int]]:
+    """(module, self_us, cumulative_us) for `import app.main`, via -X importtime"""
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import app.main"],
+        cwd=BACKEND_DIR, capture_output=True, text=True, check=True
+    )
+    timings = []
+    for line in result.stderr.splitlines():
+        match = IMPORT_LINE.match(line)
+        if match:
+            timings.append((match.group(4), int(match.group(1)), int(match.group(2))))
+    return timings
+
+
+async def _first_request() -> dict:
+    """Import the app, run its startup and serve /api/health in-process"""
+    started = time.perf_counter()
+    from app.main import app
+    imported = time.perf_counter()
+
+    async with app.router.lifespan_context(app):
+        ready = time.perf_counter()
+        messages = []
+
+        async def receive():
+            return {"type": "http.request", "body": b"", "more_body": False}
+
+        async def send(message):
+            messages.append(message)
+
+        scope = {
+            "type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1",
+            "method": "GET", "scheme": "http", "path": "/api/health", "raw_path": b"/api/health",
+            "query_string": b"", "root_path": "", "headers": [],
+            "client": ("127.0.0.1", 0), "server": ("127.0.0.1", 8000),
+        }
+        await app(scope, receive, send)
+        answered = time.perf_counter()
+
+    return {
+        "import_ms": (imported - started) * 1000,
+        "startup_ms": (ready - imported) * 1000,
+        "first_request_ms": (answered - ready) * 1000,
+        "status": messages[0]["status"] if messages else None,
+    }
+
+
+# Libraries every request needs: their import time is a floor for app.main
+FRAMEWORK_IMPORTS = "import fastapi, fastapi.routing, pydantic, pydantic_settings, sqlalchemy.orm"
+
+
+def _import_ms(statement: str) -> float:
+    """Wall time of `statement` in a fresh interpreter"""
+    code = f"import time; t = time.perf_counter(); {statement}; print(time.perf_counter() - t)"
+    result = subprocess.run([sys.executable, "-c", code], cwd=BACKEND_DIR, capture_output=True, text=True, check=True)
+    return float(result.stdout) * 1000
+
+
+def profile(top: int) -> None:
+    timings = _import_timings()
+    app_modules = [t for t in timings if t[0].startswith("app.")]
+    total = next((cum for name, _, cum in timings if name == "app.main"), 0)
+
+    print(f"Import of app.main: {_import_ms('import app.main'):.0f} ms "
+          f"({total / 1000:.1f} ms under -X importtime)")
+    print(f"Framework imports alone (fastapi, pydantic, sqlalchemy): {_import_ms(FRAMEWORK_IMPORTS):.0f} ms")
+    print(f"\nSlowest imports (cumulative):")
+    for name, self_us, cum_us in sorted(timings, key=lambda t: t[2], reverse=True)[:top]:
+        print(f"  {cum_us / 1000:8.1f} ms  {self_us / 1000:7.1f} ms self  {name}")
+    print(f"\nApp modules (self time):")
+    for name, self_us, cum_us in sorted(app_modules, key=lambda t: t[1], reverse=True)[:top]:
+        print(f"  {self_us / 1000:8.1f} ms  {name}")
+
+    # Fresh interpreter, so nothing is warm: this is what a new container pays
+    started = time.perf_counter()
+    result = subprocess.run(
+        [sys.executable, "-m", "app.startup", "_first-request"],
+        cwd=BACKEND_DIR, capture_output=True, text=True
+    )
+    wall = (time.perf_counter() - started) * 1000
+    if result.returncode != 0:
+        print(f"\nFirst request failed:\n{result.stderr}")
+        return
+    print(f"\nTime to first request (new process): {wall:.0f} ms")
+    print(result.stdout.rstrip())
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="PlantulasBot startup tools")
+    sub = parser.add_subparsers(dest="command", required=True)
+    sub.add_parser("migrate", help="upgrade the database only if it is behind head")
+    profile_parser = sub.add_parser("profile", help="import timings and time to first request")
+    profile_parser.add_argument("--top", type=int, default=15)
+    sub.add_parser("_first-request")
+    args = parser.parse_args()
+
+    if args.command == "migrate":
+        migrate()
+    elif args.command == "profile":
+        profile(args.top)
+    else:
+        timings = asyncio.run(_first_request())
+        for key, value in timings.items():
+            print(f"  {key}: {value:.1f}" if isinstance(value, float) else f"  {key}: {value}")
@@ -1,11 +1,58 @@
 """
 Verification script to check database content.
+
+    python -m app.verify_db [--repair]
+
+Also checks the counter caches (app/counters.py) against real counts;
+--repair rewrites the ones that drifted.
 """
+from sqlalchemy import func, select, text, update
 from app.database import SessionLocal
 from app.models import User, Indoor, Plant, WateringHistory, IndoorHistory
 
+# (table, counter column, counted rows: model and the column pointing at the table's id)
+COUNTERS = (
+    (Indoor, Indoor.plants_count, Plant, Plant.indoor_id),
+    (User, User.indoors_total, Indoor, Indoor.user_id),
+    (User, User.plants_total, Plant, Plant.user_id),
+)
+
+
+def _actual(owner, counted, reference):
+    """Real count for each row of `owner`, as a correlated subquery"""
+    return select(func.count()).select_from(counted).where(reference == owner.__table__.c.id).scalar_subquery()
+
 
-def verify_database():
+def verify_counters(db, repair: bool = False) -> int:
+    """
+    Print counter caches that don't match the real counts and, with
+    repair=True, rewrite them. Returns the number of mismatches found.
+    """
+    if repair and db.get_bind().dialect.name == "postgresql":
+        # Hold plant and indoor writes (and their triggers) while recounting
+        db.execute(text("LOCK TABLE indoors, plants IN SHARE MODE"))
+
+    found = 0
+    for owner, column, counted, reference in COUNTERS:
+        actual = _actual(owner, counted, reference)
+        wrong = db.execute(
+            select(owner.id, column, actual.label("actual")).where(column != actual)
+        ).all()
+        found += len(wrong)
+        for row in wrong:
+            print(f"   ⚠️  {owner.__tablename__}.{column.key} of {row.id}: {row[1]}, counted {row.actual}")
+        if repair and wrong:
+            db.execute(
+                update(owner.__table__)
+                .where(owner.__table__.c.id.in_([row.id for row in wrong]))
+                .values({column.key: actual})
+            )
+    if repair:
+        db.commit()
+    return found
+
+
+def verify_database(repair: bool = False):
     """Verify database content"""
     db = SessionLocal()
     try:
@@ -55,6 +102,15 @@ def verify_database():
                 print(f"     Next water: {plant.next_water_at}")
                 print(f"     Watering records: {len(plant.watering_history)}")
         
+        print("\n🔢 Counter caches")
+        mismatches = verify_counters(db, repair)
+        if not mismatches:
+            print("   OK")
+        elif repair:
+            print(f"   {mismatches} counters repaired")
+        else:
+            print(f"   {mismatches} counters out of date, run with --repair")
+
         print("\n✅ Verification complete!")
         
     except Exception as e:
@@ -64,4 +120,9 @@ def verify_database():
 
 
 if __name__ == "__main__":
-    verify_database()
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Check database content")
+    parser.add_argument("--repair", action="store_true", help="rewrite counter caches that don't match")
+    args = parser.parse_args()
+    verify_database(args.repair)
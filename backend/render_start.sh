@@ -5,12 +5,16 @@ export PYTHONUNBUFFERED=1
 export PYTHONPATH=${PYTHONPATH:-.}
 
 echo "[render_start] Applying DB migrations..."
-alembic upgrade head
+# Skips Alembic entirely when the DB revision already matches head
+python -m app.startup migrate
 
 if [[ "${RUN_DB_SEED:-false}" == "true" ]]; then
   echo "[render_start] Seeding demo data..."
   python -m app.seed || echo "[render_start] Seed failed or skipped"
 fi
 
-echo "[render_start] Starting Uvicorn..."
-exec uvicorn app.main:app --host 0.0.0.0 --port "${PORT:-8000}"
+echo "[render_start] Starting Uvicorn workers..."
+# Worker count from CPUs and DB_MAX_CONNECTIONS; a single worker unless the
+# cache, live updates and read-your-writes are shared (see app/server.py).
+# SIGTERM drains in-flight requests
+exec python -m app.server --host 0.0.0.0 --port "${PORT:-8000}"
@@ -0,0 +1,79 @@
+"""
+Test script para verificar el cache de read models (versiones y estampidas)
+"""
+import asyncio
+import sys
+import threading
+import time
+import uuid
+
+
+def test_cache():
+    """Invalidation by namespace version, bounded versions and stampede locking"""
+    from app.cache import MemoryBackend, ReadModelCache
+
+    print("🧪 Testing read-model cache")
+    print("=" * 60)
+
+    # Test 1: Invalidating a user makes their keys unreachable, not other users'
+    print("\n1️⃣ Testing invalidation...")
+    cache = ReadModelCache(MemoryBackend(max_entries=100), ttl=60)
+    alice, bob = uuid.uuid4(), uuid.uuid4()
+    loads = []
+
+    def loader(value):
+        def load():
+            loads.append(value)
+            return value
+        return load
+
+    run = asyncio.run
+    assert run(cache.get_or_load(alice, "dashboard", int, loader(1))) == 1
+    assert run(cache.get_or_load(alice, "dashboard", int, loader(2))) == 1
+    assert run(cache.get_or_load(bob, "dashboard", int, loader(10))) == 10
+    cache.invalidate_user(alice)
+    assert run(cache.get_or_load(alice, "dashboard", int, loader(3))) == 3
+    assert run(cache.get_or_load(bob, "dashboard", int, loader(11))) == 10
+    assert loads == [1, 10, 3], loads
+    print(f"✅ Loads: {loads}")
+
+    # Test 2: An evicted version never brings back keys stored under an older one
+    print("\n2️⃣ Testing version eviction...")
+    backend = MemoryBackend(max_entries=3)
+    cache = ReadModelCache(backend, ttl=60)
+    assert run(cache.get_or_load(alice, "dashboard", int, loader(4))) == 4
+    old_key = f"{cache._namespace(alice)}:dashboard"
+    for _ in range(5):
+        backend.incr(f"plantulas:u:{uuid.uuid4()}:ver")  # pushes alice's version out
+    assert len(backend._counters) <= 3, len(backend._counters)
+    backend.set(old_key, "99")  # still stored under the evicted version
+    backend.set("plantulas:u:%s:v0:dashboard" % alice, "98")  # where a version reset to 0 would look
+    assert run(cache.get_or_load(alice, "dashboard", int, loader(5))) == 5
+    print(f"✅ {len(backend._counters)} versions kept, fresh key after eviction")
+
+    # Test 3: Concurrent misses of the same key run the loader once
+    print("\n3️⃣ Testing stampede locking...")
+    cache = ReadModelCache(MemoryBackend(max_entries=100), ttl=60, lock_wait=2.0)
+    calls = []
+
+    def slow_loader():
+        calls.append(threading.get_ident())
+        time.sleep(0.2)
+        return 42
+
+    async def burst():
+        return await asyncio.gather(*(cache.get_or_load(alice, "calendar", int, slow_loader) for _ in range(10)))
+
+    results = run(burst())
+    assert results == [42] * 10, results
+    assert len(calls) == 1, calls
+    assert cache.stampede_coalesced == 9, cache.stats()
+    print(f"✅ 10 callers, {len(calls)} load, {cache.stampede_coalesced} served from the first one")
+
+    print("\n" + "=" * 60)
+    print("✅ All cache tests passed!")
+
+
+if __name__ == "__main__":
+    test_cache()
+    sys.exit(0)
@@ -0,0 +1,150 @@
+"""
+Test script para verificar el sharding con tres bases SQLite temporales
+"""
+import os
+import shutil
+import tempfile
+import time
+
+USERS = range(5000, 5030)
+WAIT_SECONDS = 0.3  # instead of freeze_seconds(): nothing else is running
+
+
+def headers(telegram_user_id: int) -> dict:
+    return {"X-Telegram-UserId": str(telegram_user_id)}
+
+
+def configure(shards_dir: str) -> None:
+    """Three SQLite shards in shards_dir; must run before app.config is imported"""
+    os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(shards_dir, 'shard0.db')}"
+    os.environ["DATABASE_SHARDS"] = ",".join(
+        f"sqlite:///{os.path.join(shards_dir, f'shard{shard}.db')}" for shard in (1, 2)
+    )
+    os.environ["DATABASE_READ_URL"] = ""
+    os.environ["CACHE_BACKEND"] = "none"
+    os.environ["DB_POOL_PREWARM"] = "0"
+    os.environ["SHARD_DIRECTORY_TTL_SECONDS"] = "0.2"
+    os.environ["INDOOR_WRITE_BEHIND_MS"] = "0"
+
+
+def test_sharding():
+    """Place users, move one, finish interrupted moves and verify"""
+    from fastapi.testclient import TestClient
+    from app.database import Base, SessionLocal, shard_engines
+    from app.main import app
+    from app.models import UserShard
+    from app.sharding import _copy, _set_entry, locate, move_users, placement, verify
+
+    if len(shard_engines) != 3:
+        import pytest
+        pytest.skip("needs the scratch shards: python test_sharding.py")
+
+    print("🧪 Testing sharding (3 SQLite shards)")
+    print("=" * 60)
+
+    for bind in shard_engines:
+        Base.metadata.create_all(bind)
+
+    try:
+        with TestClient(app) as client:
+            # Test 1: New users land on their hash placement
+            print("\n1️⃣ Testing placement of new users...")
+            for telegram_user_id in USERS:
+                response = client.post("/api/indoors", json={"name": "Carpa"}, headers=headers(telegram_user_id))
+                assert response.status_code == 201, response.text
+                indoor_id = response.json()["id"]
+                response = client.post(
+                    "/api/plants", json={"name": "Monstera", "indoor_id": indoor_id}, headers=headers(telegram_user_id)
+                )
+                assert response.status_code == 201, response.text
+                response = client.post(
+                    f"/api/plants/{response.json()['id']}/water", json={"liters": 1.0}, headers=headers(telegram_user_id)
+                )
+                assert response.status_code == 200, response.text
+                assert locate(telegram_user_id) == [placement(telegram_user_id, 3)], telegram_user_id
+            per_shard = [sum(locate(t) == [shard] for t in USERS) for shard in range(3)]
+            print(f"✅ {len(USERS)} users placed: {per_shard} per shard")
+
+            # Test 2: Move a user; reads are the same on the new shard
+            print("\n2️⃣ Testing a move...")
+            mover = USERS[0]
+            source = locate(mover)[0]
+            target = (source + 1) % 3
+            before = {path: client.get(path, headers=headers(mover)).json() for path in ("/api/dashboard", "/api/indoors")}
+            moved, failed = move_users({mover: target}, wait_seconds=WAIT_SECONDS)
+            assert (moved, failed) == (1, 0), (moved, failed)
+            assert locate(mover) == [target], locate(mover)
+            time.sleep(WAIT_SECONDS)
+            for path, body in before.items():
+                assert client.get(path, headers=headers(mover)).json() == body, path
+            print(f"✅ User {mover}: shard {source} → {target}, same dashboard and indoors")
+
+            # Test 3: Requests of a user being moved get 503 + Retry-After
+            print("\n3️⃣ Testing requests during a move...")
+            frozen = USERS[1]
+            db = SessionLocal()
+            try:
+                _set_entry(db, frozen, moving_to=(locate(frozen)[0] + 1) % 3)
+                time.sleep(WAIT_SECONDS)
+                response = client.get("/api/dashboard", headers=headers(frozen))
+                assert response.status_code == 503 and response.headers.get("retry-after"), response.status_code
+                _set_entry(db, frozen, moving_to=None)
+            finally:
+                db.close()
+            print(f"✅ User {frozen}: 503, Retry-After {response.headers['retry-after']}")
+
+            # Test 4: A move interrupted after the copy is finished by running it again
+            print("\n4️⃣ Testing a move interrupted after the copy...")
+            interrupted = USERS[2]
+            source = locate(interrupted)[0]
+            target = (source + 1) % 3
+            db = SessionLocal()
+            try:
+                _set_entry(db, interrupted, moving_to=target)
+                _copy(interrupted, source, target)
+            finally:
+                db.close()
+            problems = verify()
+            assert problems, "verify() should report the unfinished move"
+            print(f"   - verify: {problems}")
+            assert move_users({interrupted: target}, wait_seconds=WAIT_SECONDS) == (1, 0)
+            assert locate(interrupted) == [target], locate(interrupted)
+            print(f"✅ User {interrupted}: finished on shard {target}")
+
+            # Test 5: A move interrupted after switching the directory drops the old copy
+            print("\n5️⃣ Testing a move interrupted before deleting the old rows...")
+            interrupted = USERS[3]
+            source = locate(interrupted)[0]
+            target = (source + 1) % 3
+            _copy(interrupted, source, target)
+            db = SessionLocal()
+            try:
+                db.query(UserShard).filter(UserShard.telegram_user_id == interrupted).update({"shard": target})
+                db.commit()
+            finally:
+                db.close()
+            assert sorted(locate(interrupted)) == sorted([source, target])
+            assert move_users({interrupted: target}, wait_seconds=WAIT_SECONDS) == (0, 0)
+            assert locate(interrupted) == [target], locate(interrupted)
+            print(f"✅ User {interrupted}: leftover on shard {source} removed")
+
+            # Test 6: Every user is on exactly its directory shard
+            print("\n6️⃣ Testing verify...")
+            problems = verify()
+            assert not problems, problems
+            print("✅ No users on more than one shard or off their directory entry")
+
+        print("\n" + "=" * 60)
+        print("✅ All sharding tests passed!")
+    finally:
+        for bind in shard_engines:
+            bind.dispose()
+
+
+if __name__ == "__main__":
+    shards_dir = tempfile.mkdtemp(prefix="plantulas-shards-")
+    configure(shards_dir)
+    try:
+        test_sharding()
+    finally:
+        shutil.rmtree(shards_dir, ignore_errors=True)
@@ -32,10 +32,15 @@ class ApiClient {
     return url.toString();
   }
 
+  private getTimezone(): string {
+    return Intl.DateTimeFormat().resolvedOptions().timeZone || "";
+  }
+
   private getHeaders(): HeadersInit {
     return {
       "Content-Type": "application/json",
       "X-Telegram-UserId": this.getTelegramUserId(),
+      "X-User-Timezone": this.getTimezone(),
     };
   }
 
@@ -109,6 +114,14 @@ class ApiClient {
     });
   }
 
+  /**
+   * Abre un stream SSE. EventSource no admite headers, así que el usuario va como query param.
+   */
+  events(endpoint: string): EventSource {
+    const url = this.buildUrl(endpoint, { telegram_user_id: this.getTelegramUserId() });
+    return new EventSource(url);
+  }
+
   delete<T>(endpoint: string, options: RequestOptions = {}): Promise<T> {
     return this.request<T>(endpoint, {
       ...options,
@@ -38,6 +38,19 @@ export interface IndoorHistory {
   message: string;
 }
 
+export interface IndoorPlantsPage {
+  indoor_id: string;
+  plants: Plant[];
+  plants_total: number;
+}
+
+/** GET /api/bootstrap: solo vienen las secciones pedidas con include= */
+export interface BootstrapResponse {
+  dashboard?: DashboardResponse;
+  indoors?: IndoorListItem[];
+  plants?: IndoorPlantsPage[];
+}
+
 export interface IndoorDetailResponse {
   indoor: IndoorDetail;
   plants: Plant[];
@@ -1,6 +1,7 @@
 import { useState, useEffect, useCallback } from "react";
 import { apiClient } from "../api/client";
 import {
+  BootstrapResponse,
   DashboardResponse,
   IndoorListItem,
   IndoorDetailResponse,
@@ -20,6 +21,33 @@ interface UseState<T> {
   refetch: () => void;
 }
 
+// Pasado este tiempo desde la carga, las secciones se piden a su endpoint
+const BOOTSTRAP_MAX_AGE_MS = 10000;
+const startedAt = Date.now();
+let bootstrapRequest: Promise<BootstrapResponse> | null = null;
+const bootstrapUsed = new Set<keyof BootstrapResponse>();
+
+/**
+ * La primera carga de cada sección sale de un único GET /api/bootstrap
+ * compartido; los refetch posteriores van a su endpoint.
+ */
+async function fromBootstrap<K extends keyof BootstrapResponse>(
+  section: K
+): Promise<BootstrapResponse[K] | undefined> {
+  if (bootstrapUsed.has(section) || Date.now() - startedAt > BOOTSTRAP_MAX_AGE_MS) return undefined;
+  bootstrapUsed.add(section);
+  if (!bootstrapRequest) {
+    bootstrapRequest = apiClient.get<BootstrapResponse>("/api/bootstrap", {
+      params: { include: "dashboard,indoors" },
+    });
+  }
+  try {
+    return (await bootstrapRequest)[section];
+  } catch {
+    return undefined;
+  }
+}
+
 /**
  * Hook para obtener el dashboard (resumen y próximos riegos)
  */
@@ -32,7 +60,9 @@ export function useDashboard(): UseState<DashboardResponse> {
     try {
       setLoading(true);
       setError(null);
-      const result = await apiClient.get<DashboardResponse>("/api/dashboard");
+      const result =
+        (await fromBootstrap("dashboard")) ??
+        (await apiClient.get<DashboardResponse>("/api/dashboard"));
       setData(result);
     } catch (err) {
       setError(err instanceof Error ? err : new Error("Failed to fetch dashboard"));
@@ -60,7 +90,9 @@ export function useIndoors(): UseState<IndoorListItem[]> {
     try {
       setLoading(true);
       setError(null);
-      const result = await apiClient.get<IndoorListItem[]>("/api/indoors");
+      const result =
+        (await fromBootstrap("indoors")) ??
+        (await apiClient.get<IndoorListItem[]>("/api/indoors"));
       setData(result);
     } catch (err) {
       setError(err instanceof Error ? err : new Error("Failed to fetch indoors"));
@@ -105,6 +137,19 @@ export function useIndoorDetail(indoorId: string): UseState<IndoorDetailResponse
   return { data, loading, error, refetch: fetchData };
 }
 
+/**
+ * Hook para escuchar cambios en vivo de un indoor (SSE) en lugar de hacer polling
+ */
+export function useIndoorEvents(indoorId: string, onChange: () => void) {
+  useEffect(() => {
+    if (!indoorId) return;
+    const source = apiClient.events(`/api/indoors/${indoorId}/events`);
+    const events = ["history", "watering", "indoor_updated", "resync"];
+    events.forEach((name) => source.addEventListener(name, onChange));
+    return () => source.close();
+  }, [indoorId, onChange]);
+}
+
 /**
  * Hook para regar una planta
  */
@@ -1,6 +1,6 @@
 import { useState } from "react";
 import { useParams, useNavigate } from "react-router-dom";
-import { useIndoorDetail, useUpdateIndoor, useToast } from "../hooks";
+import { useIndoorDetail, useIndoorEvents, useUpdateIndoor, useToast } from "../hooks";
 import { WaterModal, ToastContainer, EmptyState, CreatePlantModal } from "../components/Modals";
 import { IndoorUpdateRequest } from "../api/types";
 
@@ -8,6 +8,7 @@ export default function IndoorDetail() {
   const { id } = useParams<{ id: string }>();
   const navigate = useNavigate();
   const { data, loading, error, refetch } = useIndoorDetail(id || "");
+  useIndoorEvents(id || "", refetch);
   const { updateIndoor, loading: updating } = useUpdateIndoor();
   const { toasts, showToast, removeToast } = useToast();
 